@@ -0,0 +1,80 @@
+"""Measure decoding frames into the grayscale frames flow algorithms use.
+
+Frames of a video are read with ``VideoSource`` and passed through an
+algorithm's ``preprocess``, as ``FlowPipe`` does, decoding them as:
+
+- ``bgr``: BGR frames, which ``preprocess`` converts to gray.
+- ``gray``: ``color="gray"`` frames, which ``preprocess`` uses as is. Luma is
+  read from raw YUV frames with GStreamer, other backends (e.g. FFmpeg) decode
+  to BGR which is converted once.
+
+For each the mean time per frame, including ``preprocess``, and the size of the
+frames held by ``FlowPipe`` are reported, e.g.::
+
+    $ python benchmarks/gray_decode.py video.mp4 --frames 300
+    $ python benchmarks/gray_decode.py video.mp4 --backend gstreamer
+"""
+import argparse
+import time
+
+from flowty.cv import mat_to_array
+from flowty.cv.optflow import FarnebackOpticalFlow
+from flowty.cv.videoio import VideoSource
+
+COLORS = ["bgr", "gray"]
+
+
+def time_decoding(args, color):
+    """Return the duration of decoding and preprocessing each frame, and the size
+    of a decoded frame in bytes."""
+    algorithm = FarnebackOpticalFlow()
+    src = VideoSource(args.video, backend=args.backend, color=color)
+    durations = []
+    frame_nbytes = 0
+    for _ in range(args.frames):
+        t = time.perf_counter()
+        frame = next(src, None)
+        if frame is None:
+            break
+        algorithm.preprocess(frame)
+        durations.append(time.perf_counter() - t)
+        frame_nbytes = mat_to_array(frame).nbytes
+    return durations, frame_nbytes
+
+
+def main(args):
+    results = {color: {"duration": 0.0, "frame_count": 0} for color in COLORS}
+    # Alternate between colors so both see the same page cache and CPU state.
+    for _ in range(args.repeats):
+        for color in COLORS:
+            durations, frame_nbytes = time_decoding(args, color)
+            results[color]["duration"] += sum(durations)
+            results[color]["frame_count"] += len(durations)
+            results[color]["frame_nbytes"] = frame_nbytes
+
+    print("{:<8}{:>12}{:>10}{:>12}".format("color", "ms/frame", "speedup",
+                                           "KB/frame"))
+    bgr_ms = results["bgr"]["duration"] / results["bgr"]["frame_count"] * 1e3
+    for color, result in results.items():
+        ms = result["duration"] / result["frame_count"] * 1e3
+        print("{:<8}{:>12.3f}{:>10.2f}{:>12.1f}".format(
+                color, ms, bgr_ms / ms, result["frame_nbytes"] / 2 ** 10))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+            description=__doc__.split("\n")[0],
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("video", help="Video to decode.")
+    parser.add_argument("--backend", default="ffmpeg",
+                        help="Backend to decode the video with.")
+    parser.add_argument("--frames", type=int, default=300,
+                        help="Number of frames to decode.")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Number of times the frames are decoded in each color.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,232 @@
+"""Sweep flow algorithm parameters and report the speed/accuracy Pareto frontier.
+
+Flow is computed for each frame pair in a Middlebury or Sintel style dataset and
+compared against its ground truth ``.flo`` file. Ground truth files are found
+recursively under ``FLOW_ROOT``; the frames for ``<dir>/<prefix><n>.flo`` are the
+images numbered ``n`` and ``n + 1`` in the same ``<dir>`` relative to
+``--image-root``, e.g.::
+
+    other-gt-flow/Dimetrodon/flow10.flo
+    other-data/Dimetrodon/frame10.png
+    other-data/Dimetrodon/frame11.png
+
+    $ python benchmarks/pareto.py other-gt-flow --image-root other-data
+
+For each setting the mean end point error (EPE), ms/pair and peak RSS are
+recorded. Settings on the Pareto frontier (no other setting is both faster and
+more accurate) are marked with ``*`` and ``--max-epe`` reports the fastest
+setting meeting that quality bar. Each setting runs in a fresh process so its
+peak RSS is measured in isolation.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from suite import peak_rss_mb
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".ppm", ".bmp"}
+FRAME_NUMBER_PATTERN = re.compile(r"^\D*(\d+)$")
+# Middlebury marks pixels without ground truth with flow of 1e9.
+UNKNOWN_FLOW_THRESHOLD = 1e9
+
+PARAMETER_GRIDS = {
+    "tvl1": {
+        "scale_count": [3, 5],
+        "warp_count": [2, 5],
+        "outer_iterations": [3, 10],
+        "inner_iterations": [10, 30],
+    },
+    "dis": {
+        "preset": ["ultrafast", "fast", "medium"],
+    },
+    "farneback": {
+        "scale_count": [1, 3, 5],
+        "window_size": [9, 15],
+        "iterations": [3, 10],
+    },
+    "vr": {
+        "fixed_point_iterations": [5, 10],
+        "sor_iterations": [5, 10],
+        "alpha": [10.0, 20.0],
+    },
+}
+
+
+def make_algorithm(method: str, params: Dict):
+    from flowty.cv.optflow import DenseInverseSearchOpticalFlow, \
+        FarnebackOpticalFlow, TvL1OpticalFlow, VariationalRefinementOpticalFlow
+    return {
+        "tvl1": TvL1OpticalFlow,
+        "dis": DenseInverseSearchOpticalFlow,
+        "farneback": FarnebackOpticalFlow,
+        "vr": VariationalRefinementOpticalFlow,
+    }[method](**params)
+
+
+def list_settings(methods: List[str]) -> List[Tuple[str, Dict]]:
+    settings = []
+    for method in methods:
+        grid = PARAMETER_GRIDS[method]
+        for values in itertools.product(*grid.values()):
+            settings.append((method, dict(zip(grid.keys(), values))))
+    return settings
+
+
+def index_frames(image_dir: Path) -> Dict[int, Path]:
+    frames = {}
+    for path in image_dir.iterdir():
+        match = FRAME_NUMBER_PATTERN.match(path.stem)
+        if path.suffix.lower() in IMAGE_EXTENSIONS and match is not None:
+            frames[int(match.group(1))] = path
+    return frames
+
+
+def find_samples(flow_root: Path, image_root: Path) -> List[Tuple[Path, Path, Path]]:
+    """Find ``(reference, target, ground truth flow)`` paths in a dataset."""
+    samples = []
+    frame_indices = {}
+    for flow_path in sorted(flow_root.rglob("*.flo")):
+        match = FRAME_NUMBER_PATTERN.match(flow_path.stem)
+        if match is None:
+            continue
+        image_dir = image_root / flow_path.parent.relative_to(flow_root)
+        if image_dir not in frame_indices:
+            frame_indices[image_dir] = index_frames(image_dir)
+        frames = frame_indices[image_dir]
+        frame_number = int(match.group(1))
+        if frame_number in frames and frame_number + 1 in frames:
+            samples.append((frames[frame_number], frames[frame_number + 1], flow_path))
+    return samples
+
+
+def end_point_error(flow: np.ndarray, gt_flow: np.ndarray) -> float:
+    known = (np.abs(gt_flow) < UNKNOWN_FLOW_THRESHOLD).all(axis=-1)
+    return float(np.linalg.norm(flow - gt_flow, axis=-1)[known].mean())
+
+
+def evaluate(method: str, params: Dict, samples: List[Tuple[Path, Path, Path]]) -> Dict:
+    from flowty.cv import Mat, mat_to_array
+    from flowty.cv.imgcodecs import imread
+    from flowty.cv.optflow import read_flo
+    algorithm = make_algorithm(method, params)
+    pairs = [
+        (algorithm.preprocess(Mat.fromarray(imread(reference_path))),
+         algorithm.preprocess(Mat.fromarray(imread(target_path))),
+         mat_to_array(read_flo(flow_path)))
+        for reference_path, target_path, flow_path in samples
+    ]
+    rss_before = peak_rss_mb()
+    durations = []
+    epes = []
+    for reference, target, gt_flow in pairs:
+        t = time.perf_counter()
+        flow = algorithm(reference, target)
+        durations.append(time.perf_counter() - t)
+        epes.append(end_point_error(mat_to_array(flow), gt_flow))
+    rss_after = peak_rss_mb()
+    return {
+        "method": method,
+        "params": params,
+        "epe": float(np.mean(epes)),
+        "ms_per_pair": float(np.mean(durations) * 1e3),
+        "peak_rss_mb": rss_after,
+        "algorithm_rss_mb": rss_after - rss_before,
+    }
+
+
+def pareto_frontier(results: List[Dict]) -> List[Dict]:
+    """Return results not dominated in both ms/pair and EPE, fastest first."""
+    frontier = []
+    for result in sorted(results, key=lambda r: (r["ms_per_pair"], r["epe"])):
+        if not frontier or result["epe"] < frontier[-1]["epe"]:
+            frontier.append(result)
+    return frontier
+
+
+def cheapest_meeting(results: List[Dict], max_epe: float) -> Optional[Dict]:
+    candidates = [result for result in results if result["epe"] <= max_epe]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda r: r["ms_per_pair"])
+
+
+def format_setting(result: Dict) -> str:
+    return "{} {}".format(result["method"], " ".join(
+            "{}={}".format(name, value) for name, value in result["params"].items()))
+
+
+def main(args) -> int:
+    image_root = args.image_root if args.image_root is not None else args.flow_root
+    samples = find_samples(args.flow_root, image_root)
+    if not samples:
+        print("No frame pairs with ground truth flow found under {}".format(
+                args.flow_root), file=sys.stderr)
+        return 1
+    samples = samples[:args.max_pairs]
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for method, params in list_settings(args.methods):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(executor.submit(evaluate, method, params, samples).result())
+    frontier = pareto_frontier(results)
+    for result in results:
+        result["pareto"] = any(result is frontier_result
+                               for frontier_result in frontier)
+
+    print("{:<2}{:<70}{:>10}{:>10}{:>10}".format(
+            "", "setting", "ms/pair", "EPE", "RSS MB"))
+    for result in sorted(results, key=lambda r: r["ms_per_pair"]):
+        print("{:<2}{:<70}{:>10.2f}{:>10.3f}{:>10.1f}".format(
+                "*" if result["pareto"] else "", format_setting(result),
+                result["ms_per_pair"], result["epe"], result["peak_rss_mb"]))
+    if args.max_epe is not None:
+        cheapest = cheapest_meeting(results, args.max_epe)
+        if cheapest is None:
+            print("No setting has EPE <= {}".format(args.max_epe))
+        else:
+            print("Fastest setting with EPE <= {}: {}".format(
+                    args.max_epe, format_setting(cheapest)))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({
+                "samples": len(samples),
+                "results": results,
+                "frontier": frontier,
+            }, f, indent=2)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+            description=__doc__.split("\n")[0],
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("flow_root", type=Path,
+                        help="Directory searched recursively for ground truth .flo "
+                             "files.")
+    parser.add_argument("--image-root", type=Path,
+                        help="Directory mirroring FLOW_ROOT's layout containing the "
+                             "frames. Defaults to FLOW_ROOT.")
+    parser.add_argument("--methods", nargs="+", choices=list(PARAMETER_GRIDS),
+                        default=list(PARAMETER_GRIDS))
+    parser.add_argument("--max-pairs", type=int,
+                        help="Only evaluate the first N frame pairs.")
+    parser.add_argument("--max-epe", type=float,
+                        help="Report the fastest setting with at most this mean EPE.")
+    parser.add_argument("--output", type=Path,
+                        help="Path to write all results and the frontier as JSON.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,445 @@
+"""Throughput benchmarks for flow algorithms, FlowPipe and flow writers.
+
+Benchmarks run on synthetic frames generated locally: a random texture
+translating by a few pixels per frame. Each benchmark runs in a fresh process
+so its peak RSS is measured in isolation. Results are written as JSON, e.g.::
+
+    $ python benchmarks/suite.py run --output results.json
+    $ python benchmarks/suite.py run --quick --filter 'algorithm/dis*'
+    $ python benchmarks/suite.py compare baseline.json results.json
+
+A benchmark that fails records its error in place of results, the others
+still run and ``run`` exits with a non-zero status once they're written.
+``compare`` exits with a non-zero status if any benchmark's throughput dropped
+(or its peak RSS grew) by more than the given thresholds relative to the
+baseline, or it failed only in the current results, and lists baseline
+benchmarks missing from the current results.
+"""
+import argparse
+import fnmatch
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+
+RESOLUTIONS = {
+    "qvga": (240, 320),
+    "vga": (480, 640),
+    "hd": (720, 1280),
+}
+QUICK_RESOLUTIONS = ["qvga"]
+WRITER_EXTENSIONS = ["jpg", "png", "npy", "flo", "tar", "mp4"]
+PIPE_MODES = {
+    "serial": {},
+    "pipelined": {"pipelined": True},
+    "workers-4": {"workers": 4},
+}
+
+
+class SyntheticVideo:
+    """In-memory video of a random texture translating by ``motion`` pixels per
+    frame, with the properties of ``VideoSource`` used by FlowPipe and writers."""
+
+    def __init__(self, frame_count: int, height: int, width: int, motion=(1, 2),
+                 fps: float = 30, seed: int = 0):
+        from flowty.cv import Mat
+        rng = np.random.RandomState(seed)
+        max_y = motion[0] * frame_count
+        max_x = motion[1] * frame_count
+        texture = rng.randint(0, 256, size=(height + max_y, width + max_x, 3),
+                              dtype=np.uint8)
+        # Smooth the texture so it has gradients flow algorithms can track.
+        texture = ((texture.astype(np.uint16)
+                    + np.roll(texture, 1, axis=0)
+                    + np.roll(texture, 1, axis=1)
+                    + np.roll(texture, (1, 1), axis=(0, 1))) // 4).astype(np.uint8)
+        self.frames = [
+            Mat.fromarray(np.ascontiguousarray(
+                    texture[i * motion[0]:i * motion[0] + height,
+                            i * motion[1]:i * motion[1] + width]), copy=True)
+            for i in range(frame_count)
+        ]
+        self.frame_count = frame_count
+        self.frame_height = height
+        self.frame_width = width
+        self.fps = fps
+
+    def __iter__(self):
+        return iter(self.frames)
+
+
+class NullSink:
+    def write(self, flow) -> None:
+        pass
+
+
+class TimedCallable:
+    """Wrap ``fn`` recording the duration of each call in ``durations``."""
+
+    def __init__(self, fn: Callable):
+        self.fn = fn
+        self.durations = []
+        self.preprocess = getattr(fn, "preprocess", None)
+
+    def __call__(self, *args, **kwargs):
+        t = time.perf_counter()
+        result = self.fn(*args, **kwargs)
+        self.durations.append(time.perf_counter() - t)
+        return result
+
+
+class TimedIterable:
+    """Wrap ``iterable`` recording the duration of reading each item in
+    ``durations``."""
+
+    def __init__(self, iterable: Iterable):
+        self.iterable = iterable
+        self.durations = []
+
+    def __iter__(self):
+        iterator = iter(self.iterable)
+        while True:
+            t = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.durations.append(time.perf_counter() - t)
+            yield item
+
+
+def latency_summary(durations: List[float]) -> Dict[str, float]:
+    """Summarise durations in seconds as latency percentiles in milliseconds."""
+    durations_ms = np.asarray(durations) * 1e3
+    return {
+        "mean": float(durations_ms.mean()),
+        "p50": float(np.percentile(durations_ms, 50)),
+        "p90": float(np.percentile(durations_ms, 90)),
+        "p99": float(np.percentile(durations_ms, 99)),
+    }
+
+
+def peak_rss_mb() -> float:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS.
+    if sys.platform == "darwin":
+        return peak_rss / 2 ** 20
+    return peak_rss / 2 ** 10
+
+
+def get_algorithm_factories() -> Dict[str, Callable]:
+    import flowty
+    from flowty.cv.optflow import CascadeOpticalFlow, DenseInverseSearchOpticalFlow, \
+        FarnebackOpticalFlow, TvL1OpticalFlow, VariationalRefinementOpticalFlow
+    factories = {
+        "tvl1": TvL1OpticalFlow,
+        "farneback": FarnebackOpticalFlow,
+        "dis-ultrafast": lambda: DenseInverseSearchOpticalFlow(preset="ultrafast"),
+        "dis-medium": lambda: DenseInverseSearchOpticalFlow(preset="medium"),
+        "vr": VariationalRefinementOpticalFlow,
+        "cascade": lambda: CascadeOpticalFlow(
+                DenseInverseSearchOpticalFlow(preset="ultrafast"),
+                TvL1OpticalFlow(scale_count=2, warp_count=3, outer_iterations=5,
+                                use_initial_flow=True),
+        ),
+    }
+    if flowty.cuda_available():
+        from flowty.cv.cuda_optflow import CudaBroxOpticalFlow, \
+            CudaFarnebackOpticalFlow, CudaPyramidalLucasKanade, CudaTvL1OpticalFlow
+        factories.update({
+            "cuda-tvl1": CudaTvL1OpticalFlow,
+            "cuda-brox": CudaBroxOpticalFlow,
+            "cuda-pyrlk": CudaPyramidalLucasKanade,
+            "cuda-farneback": CudaFarnebackOpticalFlow,
+        })
+    return factories
+
+
+def benchmark_algorithm(algorithm: str, resolution: str, frame_count: int) -> Dict:
+    """Time computing flow between consecutive preprocessed frames."""
+    algorithm = get_algorithm_factories()[algorithm]()
+    video = SyntheticVideo(frame_count, *RESOLUTIONS[resolution])
+    frames = [algorithm.preprocess(frame) for frame in video]
+    # The first pair pays for allocating scratch buffers so isn't timed.
+    algorithm(frames[0], frames[1])
+    durations = []
+    for reference, target in zip(frames[:-1], frames[1:]):
+        t = time.perf_counter()
+        algorithm(reference, target)
+        durations.append(time.perf_counter() - t)
+    return {
+        "frames_per_second": len(durations) / sum(durations),
+        "latency_ms": latency_summary(durations),
+    }
+
+
+def benchmark_pipe(mode: str, resolution: str, frame_count: int) -> Dict:
+    """Time FlowPipe with an algorithm returning precomputed flow and a sink
+    discarding it, measuring the pipe's own overhead."""
+    from flowty.cv import Mat, mat_to_array
+    from flowty.flow_pipe import FlowPipe
+    height, width = RESOLUTIONS[resolution]
+    video = TimedIterable(SyntheticVideo(frame_count, height, width))
+    flow = Mat.fromarray(np.zeros((height, width, 2), dtype=np.float32))
+
+    def make_algorithm():
+        return TimedCallable(lambda reference, target: flow)
+
+    algorithm = make_algorithm()
+    algorithms = [algorithm]
+
+    def algorithm_factory():
+        algorithms.append(make_algorithm())
+        return algorithms[-1]
+
+    dest = NullSink()
+    dest.write = sink = TimedCallable(dest.write)
+    pipe = FlowPipe(video, algorithm, dest, output_transforms=[mat_to_array],
+                    flow_algorithm_factory=algorithm_factory, **PIPE_MODES[mode])
+    t = time.perf_counter()
+    pipe.run()
+    duration = time.perf_counter() - t
+    # frame_count frames make frame_count - 1 pairs, count the flows written.
+    return {
+        "frames_per_second": len(sink.durations) / duration,
+        "stage_latency_ms": {
+            "read": latency_summary(video.durations),
+            "compute": latency_summary([d for alg in algorithms
+                                        for d in alg.durations]),
+            "write": latency_summary(sink.durations),
+        },
+    }
+
+
+def benchmark_writer(extension: str, resolution: str, frame_count: int) -> Dict:
+    """Time writing synthetic flow with the writer for ``extension``."""
+    from flowty.videoio import get_flow_writer
+    height, width = RESOLUTIONS[resolution]
+    video = SyntheticVideo(frame_count + 1, height, width)
+    rng = np.random.RandomState(0)
+    flows = [(rng.randn(height, width, 2) * 5).astype(np.float32)
+             for _ in range(min(frame_count, 10))]
+    with tempfile.TemporaryDirectory() as output_dir:
+        dest = str(Path(output_dir) / "flow.{}".format(extension))
+        if extension in ("jpg", "png"):
+            dest = str(Path(output_dir) / "{axis}" / ("{index:06d}." + extension))
+        elif extension == "flo":
+            dest = str(Path(output_dir) / "{index:06d}.flo")
+        elif extension == "tar":
+            dest = str(Path(output_dir) / "flow-{shard:05d}.tar")
+        args = argparse.Namespace(dest=dest, bound=20, video_stride=1,
+                                  video_dilation=1)
+        writer = get_flow_writer(args, src=video)
+        durations = []
+        t = time.perf_counter()
+        for i in range(frame_count):
+            write_start = time.perf_counter()
+            writer.write(flows[i % len(flows)])
+            durations.append(time.perf_counter() - write_start)
+        writer.close()
+        duration = time.perf_counter() - t
+    return {
+        "frames_per_second": frame_count / duration,
+        "latency_ms": latency_summary(durations),
+    }
+
+
+def list_benchmarks(quick: bool) -> Dict[str, Dict]:
+    """Return the parameters of each benchmark keyed by name."""
+    resolutions = QUICK_RESOLUTIONS if quick else list(RESOLUTIONS)
+    frame_count = 10 if quick else 50
+    benchmarks = {}
+    for algorithm in get_algorithm_factories():
+        for resolution in resolutions:
+            benchmarks["algorithm/{}/{}".format(algorithm, resolution)] = dict(
+                    kind="algorithm", algorithm=algorithm, resolution=resolution,
+                    frame_count=frame_count)
+    for mode in PIPE_MODES:
+        for resolution in resolutions:
+            benchmarks["pipe/{}/{}".format(mode, resolution)] = dict(
+                    kind="pipe", mode=mode, resolution=resolution,
+                    frame_count=frame_count * 10)
+    for extension in WRITER_EXTENSIONS:
+        for resolution in resolutions:
+            benchmarks["writer/{}/{}".format(extension, resolution)] = dict(
+                    kind="writer", extension=extension, resolution=resolution,
+                    frame_count=frame_count * 2)
+    return benchmarks
+
+
+def run_benchmark(params: Dict) -> Dict:
+    params = dict(params)
+    kind = params.pop("kind")
+    benchmark = {
+        "algorithm": benchmark_algorithm,
+        "pipe": benchmark_pipe,
+        "writer": benchmark_writer,
+    }[kind]
+    result = benchmark(**params)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def get_metadata() -> Dict:
+    import flowty
+    from flowty.__version__ import __version__
+    return {
+        "flowty_version": __version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "cuda_available": flowty.cuda_available(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run(args) -> int:
+    benchmarks = {name: params for name, params in list_benchmarks(args.quick).items()
+                  if fnmatch.fnmatch(name, args.filter)}
+    results = {"metadata": get_metadata(), "benchmarks": {}}
+    context = multiprocessing.get_context("spawn")
+    error_count = 0
+    for name, params in benchmarks.items():
+        # Each benchmark runs in its own process so peak RSS isn't inflated by
+        # earlier benchmarks.
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_benchmark, params).result()
+        except Exception as e:
+            # A benchmark failing (e.g. the mp4 writer without FFmpeg) shouldn't
+            # lose the results of the others.
+            result = {"error": repr(e)}
+            error_count += 1
+            print("{:<40}  ERROR {!r}".format(name, e), file=sys.stderr)
+        else:
+            print("{:<40}{:>10.1f} frames/s{:>10.1f} MB".format(
+                    name, result["frames_per_second"], result["peak_rss_mb"]),
+                  file=sys.stderr)
+        result["params"] = params
+        results["benchmarks"][name] = result
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if error_count > 0:
+        print("{} of {} benchmarks failed".format(error_count, len(benchmarks)),
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+def compare_results(baseline: Dict, current: Dict, throughput_threshold: float,
+                    rss_threshold: float) -> List[Dict]:
+    """Compare each benchmark in ``baseline`` against ``current`` results.
+
+    Returns:
+        A row per benchmark with the relative change in throughput and peak RSS
+        and whether either is a regression beyond its threshold. Benchmarks in
+        ``baseline`` that are missing from ``current`` are marked ``missing``,
+        those that failed in either are marked ``failed`` and are a regression
+        if they only failed in ``current``.
+    """
+    rows = []
+    for name, baseline_result in baseline["benchmarks"].items():
+        current_result = current["benchmarks"].get(name)
+        if current_result is None:
+            rows.append({"name": name, "missing": True, "failed": False,
+                         "regression": False})
+            continue
+        if "error" in baseline_result or "error" in current_result:
+            rows.append({"name": name, "missing": False, "failed": True,
+                         "regression": "error" not in baseline_result})
+            continue
+        throughput_change = (current_result["frames_per_second"]
+                             / baseline_result["frames_per_second"] - 1)
+        rss_change = current_result["peak_rss_mb"] / baseline_result["peak_rss_mb"] - 1
+        rows.append({
+            "name": name,
+            "missing": False,
+            "failed": False,
+            "throughput_change": throughput_change,
+            "rss_change": rss_change,
+            "regression": (throughput_change < -throughput_threshold
+                           or rss_change > rss_threshold),
+        })
+    return rows
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare_results(baseline, current, args.throughput_threshold,
+                           args.rss_threshold)
+    print("{:<40}{:>14}{:>12}".format("benchmark", "throughput", "peak RSS"))
+    for row in rows:
+        if row["missing"]:
+            print("{:<40}{:>14}{:>12}  MISSING".format(row["name"], "-", "-"))
+            continue
+        if row["failed"]:
+            print("{:<40}{:>14}{:>12}  FAILED{}".format(
+                    row["name"], "-", "-", "  REGRESSION" if row["regression"] else ""))
+            continue
+        print("{:<40}{:>+13.1%} {:>+11.1%}{}".format(
+                row["name"], row["throughput_change"], row["rss_change"],
+                "  REGRESSION" if row["regression"] else ""))
+    missing_count = sum(row["missing"] for row in rows)
+    if missing_count > 0:
+        print("{} of {} baseline benchmarks are missing from {}".format(
+                missing_count, len(rows), args.current), file=sys.stderr)
+    regression_count = sum(row["regression"] for row in rows)
+    if regression_count > 0:
+        print("{} of {} benchmarks regressed".format(
+                regression_count, len(rows) - missing_count), file=sys.stderr)
+        return 1
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+            description=__doc__.split("\n")[0],
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    command_parsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = command_parsers.add_parser(
+            "run", help="Run benchmarks and write results as JSON.",
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    run_parser.set_defaults(main=run)
+    run_parser.add_argument("--output", type=Path, default=Path("benchmark.json"),
+                            help="Path to write JSON results to.")
+    run_parser.add_argument("--filter", type=str, default="*",
+                            help="Glob pattern of benchmark names to run, e.g. "
+                                 "'writer/*'.")
+    run_parser.add_argument("--quick", action="store_true",
+                            help="Run fewer frames at the smallest resolution only.")
+
+    compare_parser = command_parsers.add_parser(
+            "compare", help="Compare results against a baseline.",
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    compare_parser.set_defaults(main=compare)
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument("--throughput-threshold", type=float, default=0.1,
+                                help="Relative drop in frames/s flagged as a "
+                                     "regression.")
+    compare_parser.add_argument("--rss-threshold", type=float, default=0.2,
+                                help="Relative increase in peak RSS flagged as a "
+                                     "regression.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(args.main(args))
@@ -0,0 +1,112 @@
+"""Measure the speed/accuracy trade-off of warm starting flow from the previous pair.
+
+Flow is computed between consecutive frames of a video with:
+
+- ``cold``: the default schedule, used as the reference flow.
+- ``cold-reduced``: the reduced schedule computed from scratch.
+- ``warm-reduced``: the reduced schedule initialised with the previous pair's
+  flow, as ``--warm-start`` does.
+
+For each the mean time per pair and the mean end point error (EPE) against the
+reference flow are reported, e.g.::
+
+    $ python benchmarks/warm_start.py video.mp4 --pairs 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from flowty.cv import mat_to_array
+from flowty.cv.optflow import FarnebackOpticalFlow, TvL1OpticalFlow
+from flowty.cv.videoio import VideoSource
+
+
+def make_algorithms(args):
+    if args.method == "tvl1":
+        reduced = dict(scale_count=args.scale_count, warp_count=args.warp_count,
+                       outer_iterations=args.outer_iterations)
+        return (TvL1OpticalFlow(), TvL1OpticalFlow(**reduced),
+                TvL1OpticalFlow(use_initial_flow=True, **reduced))
+    reduced = dict(scale_count=args.scale_count, iterations=args.iterations)
+    return (FarnebackOpticalFlow(), FarnebackOpticalFlow(**reduced),
+            FarnebackOpticalFlow(use_initial_flow=True, **reduced))
+
+
+def read_frames(video_path, frame_count):
+    frames = []
+    for frame in VideoSource(video_path, color="gray"):
+        frames.append(frame)
+        if len(frames) == frame_count:
+            break
+    return frames
+
+
+def end_point_error(flow, reference_flow):
+    return float(np.linalg.norm(flow - reference_flow, axis=-1).mean())
+
+
+def main(args):
+    frames = read_frames(args.video, args.pairs + 1)
+    cold, cold_reduced, warm_reduced = make_algorithms(args)
+    pairs = list(zip(frames[:-1], frames[1:]))
+
+    results = {name: {"duration": 0.0, "epe": 0.0}
+               for name in ["cold", "cold-reduced", "warm-reduced"]}
+    previous_flow = None
+    for reference, target in pairs:
+        t = time.perf_counter()
+        reference_flow = cold(reference, target)
+        results["cold"]["duration"] += time.perf_counter() - t
+        reference_flow = mat_to_array(reference_flow)
+
+        t = time.perf_counter()
+        flow = cold_reduced(reference, target)
+        results["cold-reduced"]["duration"] += time.perf_counter() - t
+        results["cold-reduced"]["epe"] += end_point_error(mat_to_array(flow),
+                                                          reference_flow)
+
+        # The first pair has no previous flow so starts cold, as in FlowPipe.
+        t = time.perf_counter()
+        if previous_flow is None:
+            flow = cold(reference, target)
+        else:
+            flow = warm_reduced(reference, target, initial_flow=previous_flow)
+        results["warm-reduced"]["duration"] += time.perf_counter() - t
+        results["warm-reduced"]["epe"] += end_point_error(mat_to_array(flow),
+                                                          reference_flow)
+        previous_flow = flow
+
+    print("{:<14}{:>12}{:>10}{:>10}".format("schedule", "ms/pair", "speedup", "EPE"))
+    cold_duration = results["cold"]["duration"]
+    for name, result in results.items():
+        print("{:<14}{:>12.2f}{:>10.2f}{:>10.3f}".format(
+                name,
+                result["duration"] / len(pairs) * 1e3,
+                cold_duration / result["duration"],
+                result["epe"] / len(pairs),
+        ))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+            description=__doc__.split("\n")[0],
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("video", help="Video to compute flow for.")
+    parser.add_argument("--method", choices=["tvl1", "farneback"], default="tvl1")
+    parser.add_argument("--pairs", type=int, default=30,
+                        help="Number of consecutive frame pairs to compute flow for.")
+    parser.add_argument("--scale-count", type=int, default=2,
+                        help="Number of scales in the reduced schedule.")
+    parser.add_argument("--warp-count", type=int, default=3,
+                        help="Number of warps per scale in the reduced TV-L1 schedule.")
+    parser.add_argument("--outer-iterations", type=int, default=5,
+                        help="Outer iterations in the reduced TV-L1 schedule.")
+    parser.add_argument("--iterations", type=int, default=3,
+                        help="Iterations per level in the reduced Farneback schedule.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -57,6 +57,7 @@ extensions = [
         "src/flowty/cv/core.pyx",
         "src/flowty/cv/videoio.pyx",
         "src/flowty/cv/imgcodecs.pyx",
+        "src/flowty/cv/imgproc.pyx",
         "src/flowty/cv/cuda.pyx",
         "src/flowty/cv/optflow.pyx",
         "src/flowty/cv/cuda_optflow.pyx",
@@ -1,9 +1,15 @@
+from functools import lru_cache
+
 from .__version__ import *
-from .cv import cuda
 
-try:
-    cv.cuda.get_device()
-    cuda_available = True
-except RuntimeError:
-    cuda_available = False
 
+@lru_cache(maxsize=None)
+def cuda_available() -> bool:
+    """Whether a CUDA device can be used. Probing for one initialises the CUDA
+    runtime, so this is only done on the first call."""
+    from .cv import cuda
+    try:
+        cuda.get_device()
+        return True
+    except RuntimeError:
+        return False
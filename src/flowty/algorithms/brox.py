@@ -8,7 +8,7 @@ from flowty.flow_command import AbstractFlowCommand
 
 class BroxCommand(AbstractFlowCommand):
     def get_flow_algorithm(self, args):
-        if not flowty.cuda_available:
+        if not flowty.cuda_available():
             raise RuntimeError("CUDA-accelerated device not available. Brox is not "
                                "implemented on the CPU.")
         return CudaBroxOpticalFlow(
@@ -0,0 +1,87 @@
+import argparse
+
+from flowty.cli import flow_method_base_parser
+from flowty.cv.optflow import CascadeOpticalFlow, DenseInverseSearchOpticalFlow, \
+    TvL1OpticalFlow, VariationalRefinementOpticalFlow
+from flowty.flow_command import AbstractFlowCommand
+
+
+class CascadeCommand(AbstractFlowCommand):
+    def get_flow_algorithm(self, args):
+        initial_flow_algorithm = DenseInverseSearchOpticalFlow(preset=args.preset)
+        if args.refinement == "tvl1":
+            refinement_algorithm = TvL1OpticalFlow(
+                scale_count=args.scale_count,
+                warp_count=args.warp_count,
+                outer_iterations=args.outer_iterations,
+                inner_iterations=args.inner_iterations,
+                use_initial_flow=True,
+            )
+        else:
+            refinement_algorithm = VariationalRefinementOpticalFlow(
+                fixed_point_iterations=args.fixed_point_iterations,
+                sor_iterations=args.sor_iterations,
+            )
+        return CascadeOpticalFlow(initial_flow_algorithm, refinement_algorithm)
+
+    @staticmethod
+    def register_command(command_parsers):
+        parser = command_parsers.add_parser(
+            "cascade",
+            parents=[flow_method_base_parser],
+            description="Compute Dense Inverse Search optical flow and refine it with "
+                        "a reduced schedule TV-L1 or variational refinement",
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        )
+        parser.set_defaults(command=CascadeCommand)
+        parser.add_argument(
+            "--preset",
+            type=str,
+            choices=["ultrafast", "fast", "medium"],
+            default="ultrafast",
+            help="Dense Inverse Search preset used to compute the initial flow.",
+        )
+        parser.add_argument(
+            "--refinement",
+            type=str,
+            choices=["tvl1", "vr"],
+            default="tvl1",
+            help="Algorithm refining the initial flow.",
+        )
+        parser.add_argument(
+            "--scale-count",
+            type=int,
+            default=2,
+            help="Number of scales used by TV-L1 refinement.",
+        )
+        parser.add_argument(
+            "--warp-count",
+            type=int,
+            default=3,
+            help="Number of warpings per scale used by TV-L1 refinement.",
+        )
+        parser.add_argument(
+            "--outer-iterations",
+            type=int,
+            default=5,
+            help="Number of outer iterations used by TV-L1 refinement.",
+        )
+        parser.add_argument(
+            "--inner-iterations",
+            type=int,
+            default=30,
+            help="Number of inner iterations used by TV-L1 refinement.",
+        )
+        parser.add_argument(
+            "--fixed-point-iterations",
+            type=int,
+            default=5,
+            help="Number of outer (fixed point) iterations used by variational "
+                 "refinement.",
+        )
+        parser.add_argument(
+            "--sor-iterations",
+            type=int,
+            default=5,
+            help="Number of inner (SOR) iterations used by variational refinement.",
+        )
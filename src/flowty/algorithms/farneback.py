@@ -1,15 +1,15 @@
 import argparse
 
 from flowty.cli import flow_method_base_parser
-from flowty.cv.cuda import get_cuda_enabled_device_count
-from flowty.cv.cuda_optflow import CudaFarnebackOpticalFlow
 from flowty.cv.optflow import FarnebackOpticalFlow
 from flowty.flow_command import AbstractFlowCommand
 
 
 class FarnebackCommand(AbstractFlowCommand):
-    def get_flow_algorithm(self, args):
+    def get_flow_algorithm(self, args, use_initial_flow=False):
         if args.cuda:
+            # Only imported when needed as it loads the CUDA runtime.
+            from flowty.cv.cuda_optflow import CudaFarnebackOpticalFlow
             return CudaFarnebackOpticalFlow(
                     args.scale_count,
                     args.scale_factor,
@@ -17,7 +17,8 @@ class FarnebackCommand(AbstractFlowCommand):
                     args.window_size,
                     args.iterations,
                     args.neighborhood_size,
-                    args.poly_sigma
+                    args.poly_sigma,
+                    use_initial_flow,
             )
         else:
             return FarnebackOpticalFlow(
@@ -27,9 +28,18 @@ class FarnebackCommand(AbstractFlowCommand):
                     args.window_size,
                     args.iterations,
                     args.neighborhood_size,
-                    args.poly_sigma
+                    args.poly_sigma,
+                    use_initial_flow,
             )
 
+    def get_warm_flow_algorithm(self, args):
+        if not args.warm_start:
+            return None
+        warm_args = argparse.Namespace(**vars(args))
+        warm_args.scale_count = args.warm_scale_count
+        warm_args.iterations = args.warm_iterations
+        return self.get_flow_algorithm(warm_args, use_initial_flow=True)
+
     @staticmethod
     def register_command(command_parsers):
         parser = command_parsers.add_parser(
@@ -63,9 +73,22 @@ class FarnebackCommand(AbstractFlowCommand):
             action="store_true",
             help="Use CUDA implementation",
         )
+        parser.add_argument("--warm-start", action="store_true",
+                            help="Initialise flow for each pair after the first with "
+                                 "the previous pair's flow and compute it with the "
+                                 "--warm-* schedule. Requires --video-stride 1 and "
+                                 "--video-dilation 1, and can't be combined with "
+                                 "--segments or --resume.")
+        parser.add_argument("--warm-scale-count", type=int, default=2,
+                            help="Number of pyramid levels used for warm started "
+                                 "pairs.")
+        parser.add_argument("--warm-iterations", type=int, default=3,
+                            help="Number of iterations at each pyramid level used "
+                                 "for warm started pairs.")
 
     def main(self):
         if self.args.cuda:
+            from flowty.cv.cuda import get_cuda_enabled_device_count
             if get_cuda_enabled_device_count() < 1:
                 raise RuntimeError("No CUDA devices available")
         super().main()
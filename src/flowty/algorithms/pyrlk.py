@@ -8,7 +8,7 @@ from flowty.flow_command import AbstractFlowCommand
 
 class PyrLucasKanadeCommand(AbstractFlowCommand):
     def get_flow_algorithm(self, args):
-        if not flowty.cuda_available:
+        if not flowty.cuda_available():
             raise RuntimeError("CUDA-accelerated device not available. Pyramidal "
                                "Lucas-Kanade is not implemented on the CPU.")
         return CudaPyramidalLucasKanade(
@@ -2,21 +2,21 @@ import argparse
 
 import flowty
 from flowty.cli import flow_method_base_parser
-from flowty.cv.cuda import get_cuda_enabled_device_count
-from flowty.cv.cuda_optflow import CudaTvL1OpticalFlow
 from flowty.cv.optflow import TvL1OpticalFlow
 from flowty.flow_command import AbstractFlowCommand
 
 
 class TvL1Command(AbstractFlowCommand):
-    def get_flow_algorithm(self, args):
+    def get_flow_algorithm(self, args, use_initial_flow=False):
         if args.cuda:
-            if not flowty.cuda_available:
+            if not flowty.cuda_available():
                 raise RuntimeError("CUDA-accelerated device not available.")
             if args.median_filtering:
                 raise ValueError(
                     "Median filtering is not supported in CUDA TVL1 " "implementation"
                 )
+            # Only imported when needed as it loads the CUDA runtime.
+            from flowty.cv.cuda_optflow import CudaTvL1OpticalFlow
             return CudaTvL1OpticalFlow(
                 tau=args.tau,
                 lambda_=getattr(args, "lambda"),
@@ -27,7 +27,7 @@ class TvL1Command(AbstractFlowCommand):
                 warp_count=args.warp_count,
                 iterations=args.outer_iterations * args.inner_iterations,
                 scale_step=args.scale_step,
-                use_initial_flow=False,
+                use_initial_flow=use_initial_flow,
             )
         else:
             median_filtering = args.median_filtering
@@ -45,9 +45,18 @@ class TvL1Command(AbstractFlowCommand):
                 outer_iterations=args.outer_iterations,
                 scale_step=args.scale_step,
                 median_filtering=median_filtering,
-                use_initial_flow=False,
+                use_initial_flow=use_initial_flow,
             )
 
+    def get_warm_flow_algorithm(self, args):
+        if not args.warm_start:
+            return None
+        warm_args = argparse.Namespace(**vars(args))
+        warm_args.scale_count = args.warm_scale_count
+        warm_args.warp_count = args.warm_warp_count
+        warm_args.outer_iterations = args.warm_outer_iterations
+        return self.get_flow_algorithm(warm_args, use_initial_flow=True)
+
     @staticmethod
     def register_command(command_parsers):
         parser = command_parsers.add_parser(
@@ -141,9 +150,36 @@ class TvL1Command(AbstractFlowCommand):
             action="store_true",
             help="Use CUDA implementation",
         )
+        parser.add_argument(
+            "--warm-start",
+            action="store_true",
+            help="Initialise flow for each pair after the first with the previous "
+            "pair's flow and compute it with the --warm-* schedule. Requires "
+            "--video-stride 1 and --video-dilation 1, and can't be combined with "
+            "--segments or --resume.",
+        )
+        parser.add_argument(
+            "--warm-scale-count",
+            type=int,
+            default=2,
+            help="Number of scales used for warm started pairs.",
+        )
+        parser.add_argument(
+            "--warm-warp-count",
+            type=int,
+            default=3,
+            help="Number of warpings per scale used for warm started pairs.",
+        )
+        parser.add_argument(
+            "--warm-outer-iterations",
+            type=int,
+            default=5,
+            help="Number of outer iterations used for warm started pairs.",
+        )
 
     def main(self):
         if self.args.cuda:
+            from flowty.cv.cuda import get_cuda_enabled_device_count
             if get_cuda_enabled_device_count() < 1:
                 raise RuntimeError("No CUDA devices available")
         super().main()
@@ -0,0 +1,169 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List
+
+from tqdm import tqdm
+
+from flowty.cv.videoio import VideoSource
+from flowty.segments import count_flow_pairs, frame_range
+from flowty.videoio import get_flow_writer
+
+# Flow algorithms constructed by this worker process keyed on the arguments they
+# were constructed from, so consecutive videos using the same method and options
+# reuse a warm instance rather than paying for construction each time.
+_warm_flow_algorithms = {}
+
+
+class BatchCommand:
+    """Compute flow for every video listed in a manifest using a pool of worker
+    processes.
+
+    Manifests are either JSONL files with one object per line, or CSV files with
+    a header row. Each entry has ``src`` and ``dest`` fields, an optional
+    ``method`` field (defaulting to ``--method``) and any other field is passed
+    to the method as a command line option, e.g. ``{"src": "video.mp4", "dest":
+    "flow/{axis}/{index:05d}.jpg", "method": "tvl1", "cuda": true}``.
+    """
+
+    def __init__(self, args):
+        self.args = args
+
+    @staticmethod
+    def register_command(command_parsers):
+        parser = command_parsers.add_parser(
+            "batch",
+            description="Compute optical flow for a manifest of videos",
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        )
+        parser.set_defaults(command=BatchCommand)
+        parser.add_argument("manifest", type=Path,
+                            help="Path to a JSONL or CSV manifest of videos.")
+        parser.add_argument("--method", type=str, default=None,
+                            help="Flow method used for entries without a 'method' "
+                                 "field, e.g. tvl1.")
+        parser.add_argument("--processes", type=int, default=1,
+                            help="Number of worker processes, each keeping warm "
+                                 "algorithm instances between videos.")
+
+    def main(self):
+        entries = read_manifest(self.args.manifest)
+        pending = []
+        for entry in entries:
+            argv = entry_to_argv(entry, default_method=self.args.method)
+            args = _parse_args(argv)
+            pair_count = _count_flow_pairs(args)
+            if not _is_flow_complete(args, pair_count):
+                pending.append((pair_count, argv))
+        skipped_count = len(entries) - len(pending)
+        if skipped_count > 0:
+            print("Skipping {} videos with complete output".format(skipped_count),
+                  file=sys.stderr)
+        # Longest videos are started first so that they don't end up running alone
+        # at the end of the batch while the other workers sit idle.
+        pending.sort(key=lambda job: job[0], reverse=True)
+
+        failures = []
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.args.processes,
+                                 mp_context=context) as executor:
+            futures = {executor.submit(_compute_flow, argv): argv
+                       for _, argv in pending}
+            for future in tqdm(as_completed(futures), total=len(futures),
+                               dynamic_ncols=True):
+                try:
+                    future.result()
+                except Exception as e:
+                    argv = futures[future]
+                    print("Failed to compute flow for {}: {}".format(argv[1], e),
+                          file=sys.stderr)
+                    failures.append(argv)
+        if failures:
+            raise RuntimeError("Failed to compute flow for {} of {} videos".format(
+                    len(failures), len(pending)))
+
+
+def read_manifest(manifest_path: Path) -> List[Dict]:
+    """Read manifest entries from a JSONL or CSV file."""
+    with manifest_path.open(newline="") as f:
+        if manifest_path.suffix.lower() == ".csv":
+            return [dict(row) for row in csv.DictReader(f)]
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def entry_to_argv(entry: Dict, default_method: str = None) -> List[str]:
+    """Convert a manifest entry into ``flowty`` command line arguments."""
+    options = dict(entry)
+    try:
+        src = options.pop("src")
+        dest = options.pop("dest")
+    except KeyError as e:
+        raise ValueError("Manifest entry {} is missing {}".format(entry, e))
+    method = options.pop("method", None) or default_method
+    if method is None:
+        raise ValueError("Manifest entry {} has no method and no default "
+                         "--method was given".format(entry))
+    argv = [method, str(src), str(dest)]
+    for name, value in options.items():
+        if value is None or value is False or value == "":
+            continue
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            value = value.lower() == "true"
+            if not value:
+                continue
+        option = "--" + name.lstrip("-").replace("_", "-")
+        if value is True:
+            argv.append(option)
+        else:
+            argv.extend([option, str(value)])
+    return argv
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    # Imported here as flowty.flowty imports this module to register its command.
+    from flowty.flowty import parse_args
+    return parse_args(argv)
+
+
+def _count_flow_pairs(args: argparse.Namespace) -> int:
+    video_src = VideoSource(str(args.src.absolute()),
+                            backend=args.opencv_videoio_backend)
+    start, end = frame_range(args, video_src)
+    frame_count = int(video_src.frame_count)
+    if end is not None:
+        frame_count = min(frame_count, end)
+    return count_flow_pairs(frame_count - start,
+                            stride=args.video_stride, dilation=args.video_dilation)
+
+
+def _is_flow_complete(args: argparse.Namespace, pair_count: int) -> bool:
+    # Videos whose frame count is unknown are never considered complete.
+    if pair_count == 0:
+        return False
+    writer = get_flow_writer(args)
+    try:
+        return writer.exists_up_to(pair_count)
+    finally:
+        # Writers can hold resources before writing anything, e.g. the threads
+        # of an AsyncFlowWriter.
+        writer.close()
+
+
+def _flow_algorithm_key(args: argparse.Namespace):
+    return tuple(sorted(
+        (name, value) for name, value in vars(args).items()
+        if name not in ("src", "dest", "metrics_json", "metrics_prometheus",
+                        "metrics_summary", "trace")
+    ))
+
+
+def _compute_flow(argv: List[str]) -> None:
+    args = _parse_args(argv)
+    key = _flow_algorithm_key(args)
+    command = args.command(args, flow_algorithm=_warm_flow_algorithms.get(key))
+    _warm_flow_algorithms[key] = command.flow_algorithm
+    command.main()
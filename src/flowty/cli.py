@@ -10,7 +10,8 @@ flow_method_base_parser.add_argument(
 flow_method_base_parser.add_argument(
     "dest",
     type=str,
-    help="Path to video output, e.g. /data/flow/{axis}/frame_{:06d}.jpg",
+    help="Path to video output, e.g. /data/flow/{axis}/frame_{:06d}.jpg, or a "
+    "single .npy file e.g. /data/flow.npy",
 )
 flow_method_base_parser.add_argument(
     "--opencv-videoio-backend",
@@ -36,3 +37,139 @@ flow_method_base_parser.add_argument(
     "--bound", default=20, type=float,
         help="Max magnitude of flow, values above this are clipped."
 )
+flow_method_base_parser.add_argument(
+    "--pipelined",
+    action="store_true",
+    help="Decode frames, compute flow and write flow in separate threads so that "
+    "each stage overlaps with the others.",
+)
+flow_method_base_parser.add_argument(
+    "--queue-size",
+    type=int,
+    default=8,
+    help="Maximum number of flow fields waiting to be computed or written when "
+    "--pipelined. Lower values reduce memory usage.",
+)
+flow_method_base_parser.add_argument(
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of threads computing flow concurrently, each with its own "
+    "algorithm instance. Implies --pipelined. OpenCV also parallelises some "
+    "algorithms internally, so the best value depends on the algorithm.",
+)
+flow_method_base_parser.add_argument(
+    "--segments",
+    type=int,
+    default=1,
+    help="Split the video into this many segments, each processed in its own "
+    "process. Output is identical to processing the video in one go.",
+)
+flow_method_base_parser.add_argument(
+    "--writer-threads",
+    type=int,
+    default=0,
+    help="Number of background threads encoding and writing flow. "
+    "Set to 0 to write flow on the thread computing it.",
+)
+flow_method_base_parser.add_argument(
+    "--flow-dtype",
+    default="float32",
+    choices=["float32", "float16"],
+    help="Data type of flow written to .npy files.",
+)
+flow_method_base_parser.add_argument(
+    "--fourcc",
+    type=str,
+    default=None,
+    help="4 character code of the codec used when writing flow to video, "
+    "e.g. mp4v. Defaults to mp4v for .mp4, FFV1 for .mkv and MJPG for .avi.",
+)
+flow_method_base_parser.add_argument(
+    "--shard-size",
+    type=float,
+    default=1024,
+    help="Maximum size of each shard in MB when writing flow to .tar shards.",
+)
+flow_method_base_parser.add_argument(
+    "--shard-frames",
+    type=int,
+    default=None,
+    help="Maximum number of flow fields in each shard when writing flow to .tar "
+    "shards.",
+)
+flow_method_base_parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="Resume an interrupted run, computing flow from the last flow field "
+    "written onwards.",
+)
+flow_method_base_parser.add_argument(
+    "--metrics-json",
+    type=Path,
+    default=None,
+    help="Path to periodically write FlowPipe metrics to as JSON: per stage "
+    "latency percentiles, frames/s, queue depths, bytes written, Mat counters and "
+    "peak RSS.",
+)
+flow_method_base_parser.add_argument(
+    "--metrics-prometheus",
+    type=Path,
+    default=None,
+    help="Path to periodically write FlowPipe metrics to in the Prometheus text "
+    "format, e.g. a .prom file in the node exporter's textfile directory.",
+)
+flow_method_base_parser.add_argument(
+    "--metrics-summary",
+    type=Path,
+    default=None,
+    help="Path to write a JSON summary of the metrics and arguments to once flow "
+    "has been computed.",
+)
+flow_method_base_parser.add_argument(
+    "--metrics-interval",
+    type=float,
+    default=10,
+    help="Seconds between writing metrics to --metrics-json/--metrics-prometheus.",
+)
+flow_method_base_parser.add_argument(
+    "--trace",
+    type=Path,
+    default=None,
+    help="Path to write a Chrome trace-event timeline to, with spans for decoding, "
+    "preprocessing, computing, quantising and encoding each frame on each "
+    "thread. Open it in chrome://tracing or https://ui.perfetto.dev.",
+)
+flow_method_base_parser.add_argument(
+    "--trace-sample-interval",
+    type=int,
+    default=1,
+    help="Only trace every Nth frame, limiting the trace size for long videos.",
+)
+start_group = flow_method_base_parser.add_mutually_exclusive_group()
+start_group.add_argument(
+    "--start-frame",
+    type=int,
+    default=None,
+    help="Index of the first frame to compute flow from. Earlier frames are "
+    "skipped by seeking rather than decoded.",
+)
+start_group.add_argument(
+    "--start-time",
+    type=float,
+    default=None,
+    help="Time in seconds of the first frame to compute flow from.",
+)
+end_group = flow_method_base_parser.add_mutually_exclusive_group()
+end_group.add_argument(
+    "--end-frame",
+    type=int,
+    default=None,
+    help="Index of the frame to stop at (exclusive).",
+)
+end_group.add_argument(
+    "--end-time",
+    type=float,
+    default=None,
+    help="Time in seconds of the frame to stop at (exclusive).",
+)
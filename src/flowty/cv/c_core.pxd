@@ -93,6 +93,7 @@ cdef extern from "opencv2/core.hpp" namespace "cv" nogil:
         bool empty()
         int type()
         Mat clone()
+        Mat rowRange(int, int) except +
         int depth()
         int channels()
         size_t elemSize()
@@ -3,9 +3,19 @@
 from libcpp cimport bool
 from libcpp.string cimport string
 from libcpp.vector cimport vector
-from .c_core cimport InputArray
+from .c_core cimport InputArray, Mat
 
 
 cdef extern from "opencv2/imgcodecs.hpp" namespace "cv" nogil:
-    bool imwrite(string&, InputArray)
-    bool imwrite(string&, InputArray, vector[int]& params)
+    Mat imread(string&, int) except +
+    bool imwrite(string&, InputArray) except +
+    bool imwrite(string&, InputArray, vector[int]& params) except +
+    bool imencode(string&, InputArray, vector[unsigned char]&) except +
+    bool imencode(string&, InputArray, vector[unsigned char]&,
+                  vector[int]& params) except +
+    Mat imdecode(InputArray, int) except +
+
+    cdef enum ImreadModes:
+        IMREAD_UNCHANGED
+        IMREAD_GRAYSCALE
+        IMREAD_COLOR
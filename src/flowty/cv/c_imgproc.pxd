@@ -4,7 +4,10 @@ from .c_core cimport InputArray, OutputArray
 cdef extern from "opencv2/imgproc.hpp" namespace "cv" nogil:
     enum ColorConversionCodes:
         COLOR_BGR2GRAY
+        COLOR_RGB2GRAY
+        COLOR_YUV2GRAY_YUY2
+        COLOR_YUV2GRAY_UYVY
 
-    void cvtColor(InputArray, OutputArray, int, int)
-    void cvtColor(InputArray, OutputArray, int)
+    void cvtColor(InputArray, OutputArray, int, int) except +
+    void cvtColor(InputArray, OutputArray, int) except +
 
@@ -4,6 +4,9 @@ from .c_core cimport Ptr, InputArray, InputOutputArray, String, Mat
 
 
 cdef extern from "opencv2/video/tracking.hpp" namespace "cv" nogil:
+    enum:
+        OPTFLOW_USE_INITIAL_FLOW
+
     cdef cppclass DenseOpticalFlow:
         void calc(InputArray i0, InputArray i1, InputOutputArray flow) except +
         void collectGarbage() except +
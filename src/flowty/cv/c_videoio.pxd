@@ -1,7 +1,7 @@
 # cython: language_level = 3
 from libcpp cimport bool
 from libcpp.string cimport string
-from .c_core cimport Mat, OutputArray, Size
+from .c_core cimport Mat, InputArray, OutputArray, Size
 
 cdef extern from "opencv2/videoio.hpp" namespace "cv" nogil:
     cdef enum VideoCaptureAPIs:
@@ -95,16 +95,22 @@ cdef extern from "opencv2/videoio.hpp" namespace "cv" nogil:
         bool open(int, int) except +
         bool read(OutputArray)
         void release()
-        void retrieve(OutputArray, int)
-        set(int, double)
+        bool retrieve(OutputArray, int)
+        bool set(int, double)
         VideoCapture & operator>>(Mat)
 
     cdef cppclass VideoWriter:
         VideoWriter() except +
         VideoWriter(const string&, int, int, double, Size) except +
+        VideoWriter(const string&, int, int, double, Size, bool) except +
         double get(int)
+        bool set(int, double)
         string getBackendName()
         bool isOpened()
-        open(const string &, int, int, double, Size)
+        bool open(const string &, int, int, double, Size, bool) except +
         VideoWriter & operator<<(const Mat&)
-        void release()
+        void write(InputArray) except +
+        void release() except +
+
+        @staticmethod
+        int fourcc(char, char, char, char)
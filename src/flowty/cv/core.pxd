@@ -11,6 +11,7 @@ cdef class Mat:
         int view_count
         Py_ssize_t _shape[3]
         Py_ssize_t _strides[3]
+        object __weakref__
 
     @staticmethod
     cdef Mat from_mat(c_Mat mat, bool copy = *)
@@ -1,5 +1,7 @@
 # cython: language_level=3
 
+import threading
+import weakref
 from cpython cimport Py_buffer
 from libcpp cimport bool
 from .c_core cimport Mat as c_Mat, getNumThreads, setNumThreads, setUseOptimized
@@ -123,14 +125,39 @@ cdef _np_dtype_to_cv_dtype_lookup = {
      (np.dtype(np.float64), 4): CV_64FC4,
 }
 
+# Instrumentation counters reported by get_mat_stats(). They're plain C variables
+# updated in __cinit__, __dealloc__ and the buffer protocol methods. These only run
+# with the GIL held and don't release it while updating a counter, so the GIL
+# serialises the updates.
+cdef unsigned long long _mat_allocation_count = 0
+cdef long long _live_mat_count = 0
+cdef unsigned long long _buffer_export_count = 0
+cdef long long _live_buffer_export_count = 0
+# Counting the bytes referenced by live Mats means walking them, so Mats are only
+# recorded while track_live_mat_bytes() is enabled, keeping Mat creation cheap
+# otherwise. The WeakSet is iterated in Python code, where other threads could add
+# Mats to it mid-iteration, so it's guarded by a lock.
+cdef int _live_mat_bytes_tracking = 0
+cdef object _live_mats = weakref.WeakSet()
+cdef object _live_mats_lock = threading.Lock()
+
 cdef class Mat:
     def __cinit__(self, int rows=0, int cols=0, int dtype=CV_8UC3):
+        global _mat_allocation_count, _live_mat_count
+        # Counted first as __dealloc__ runs even if construction fails.
+        _mat_allocation_count += 1
+        _live_mat_count += 1
         self.c_mat = c_Mat(rows, cols, dtype)
         # view_obj holds
         self._view_obj = NULL
         self.view_count = 0
+        if _live_mat_bytes_tracking:
+            with _live_mats_lock:
+                _live_mats.add(self)
 
     def __dealloc__(self):
+        global _live_mat_count
+        _live_mat_count -= 1
         Py_XDECREF(self._view_obj)
 
     @staticmethod
@@ -199,6 +226,7 @@ cdef class Mat:
         return not self.empty
 
     def __getbuffer__(self, Py_buffer *buffer, int flags):
+        global _buffer_export_count, _live_buffer_export_count
         (byte_count, type_str, channel_count) = _mat_type_lookup[self.c_mat.type()]
 
         self._shape[0] = self.c_mat.rows
@@ -222,9 +250,13 @@ cdef class Mat:
         buffer.suboffsets = NULL
 
         self.view_count += 1
+        _buffer_export_count += 1
+        _live_buffer_export_count += 1
 
     def __releasebuffer__(self, Py_buffer *buffer):
+        global _live_buffer_export_count
         self.view_count -= 1
+        _live_buffer_export_count -= 1
 
     def __repr__(self):
         return "Mat(rows={rows}, cols={cols}, dtype={dtype})".format(
@@ -233,6 +265,57 @@ cdef class Mat:
             dtype=self.dtype
         )
 
+def track_live_mat_bytes(bint enabled):
+    """Start or stop recording Mats as they're created, so that ``get_mat_stats``
+    reports the bytes referenced by those alive. Calls nest, Mats are recorded
+    until tracking has been stopped as many times as it was started."""
+    global _live_mat_bytes_tracking
+    if enabled:
+        _live_mat_bytes_tracking += 1
+    elif _live_mat_bytes_tracking > 0:
+        _live_mat_bytes_tracking -= 1
+        if _live_mat_bytes_tracking == 0:
+            with _live_mats_lock:
+                _live_mats.clear()
+
+
+def get_mat_stats() -> dict:
+    """Count the Mats alive and allocated in this process.
+
+    Returns:
+        A dict of:
+
+        - ``live_mats``: Number of Mats alive.
+        - ``live_mat_bytes``: Bytes of pixel data referenced by live Mats created
+          while ``track_live_mat_bytes`` is enabled, counting data shared between
+          Mats once. Only present while it's enabled.
+        - ``mat_allocations``: Number of Mats created since the process started.
+        - ``buffer_exports``: Number of times Mats have been exported through the
+          buffer protocol, e.g. by ``np.asarray``, since the process started.
+        - ``live_buffer_exports``: Number of buffer exports not yet released.
+    """
+    stats = {
+        "live_mats": _live_mat_count,
+        "mat_allocations": _mat_allocation_count,
+        "buffer_exports": _buffer_export_count,
+        "live_buffer_exports": _live_buffer_export_count,
+    }
+    if not _live_mat_bytes_tracking:
+        return stats
+    cdef Mat mat
+    cdef size_t datastart
+    buffers = set()
+    live_mat_bytes = 0
+    with _live_mats_lock:
+        live_mats = list(_live_mats)
+    for mat in live_mats:
+        datastart = <size_t> mat.c_mat.datastart
+        if mat.c_mat.datastart != NULL and datastart not in buffers:
+            buffers.add(datastart)
+            live_mat_bytes += <size_t> (mat.c_mat.dataend - mat.c_mat.datastart)
+    stats["live_mat_bytes"] = live_mat_bytes
+    return stats
+
 cpdef get_num_threads():
     return getNumThreads()
 
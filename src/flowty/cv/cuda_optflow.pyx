@@ -6,10 +6,11 @@ from ..cv.c_cuda_optflow cimport OpticalFlowDual_TVL1, BroxOpticalFlow, \
     DensePyrLKOpticalFlow, FarnebackOpticalFlow
 from ..cv.core cimport Mat
 from ..cv.c_core cimport Mat as c_Mat, Size as c_Size
-from ..cv.c_core cimport InputArray, OutputArray, InputOutputArray, Ptr, CV_32FC1, \
-    CV_32FC2
-from ..cv.c_imgproc cimport cvtColor, ColorConversionCodes
+from ..cv.c_core cimport InputArray, OutputArray, InputOutputArray, Ptr, CV_32FC2
 from ..cv.c_cuda cimport GpuMat as c_GpuMat
+from ..cv.c_optflow cimport OPTFLOW_USE_INITIAL_FLOW
+from ..cv.imgproc cimport as_gray, as_gray_float, preprocess_gray, \
+    preprocess_gray_float, flow_output
 
 
 cdef class CudaTvL1OpticalFlow:
@@ -31,27 +32,37 @@ cdef class CudaTvL1OpticalFlow:
         self.alg = OpticalFlowDual_TVL1.create(tau, lambda_, theta, scale_count, warp_count, epsilon,
             iterations, scale_step, gamma, use_initial_flow)
 
-    def __call__(self, Mat reference, Mat target) -> Mat:
-        cvtColor(<InputArray>reference.c_mat,
-                 <OutputArray>self.reference,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        cvtColor(<InputArray>target.c_mat,
-                 <OutputArray>self.target,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        if self.flow_gpu.empty():
-             self.flow_gpu = c_GpuMat(self.reference.rows,
-                                      self.reference.cols,
+    def __call__(self, Mat reference, Mat target, out=None,
+                 initial_flow=None) -> Mat:
+        cdef c_Mat reference_frame = reference.c_mat
+        cdef c_Mat target_frame = target.c_mat
+        cdef c_Mat reference_gray, target_gray
+        with nogil:
+            as_gray(reference_frame, self.reference, reference_gray)
+            as_gray(target_frame, self.target, target_gray)
+        if (self.flow_gpu.rows != reference_gray.rows
+                or self.flow_gpu.cols != reference_gray.cols):
+             self.flow_gpu = c_GpuMat(reference_gray.rows,
+                                      reference_gray.cols,
                                       CV_32FC2)
+        cdef Mat flow = flow_output(out, reference_frame.rows, reference_frame.cols,
+                                    initial_flow, self.use_initial_flow)
+        cdef bool use_initial_flow = self.use_initial_flow
         with nogil:
-            self.target_gpu.upload(<InputArray> self.target)
-            self.reference_gpu.upload(<InputArray> self.reference)
+            self.target_gpu.upload(<InputArray> target_gray)
+            self.reference_gpu.upload(<InputArray> reference_gray)
+            if use_initial_flow:
+                self.flow_gpu.upload(<InputArray> flow.c_mat)
             deref(self.alg).calc(<InputArray>self.reference_gpu,
                                  <InputArray>self.target_gpu,
                                  <InputOutputArray>self.flow_gpu)
-        flow = Mat()
-        self.flow_gpu.download(<OutputArray> flow.c_mat)
+            self.flow_gpu.download(<OutputArray> flow.c_mat)
         return flow
 
+    def preprocess(self, Mat frame) -> Mat:
+        """Convert a BGR frame to the grayscale representation ``__call__`` uses."""
+        return preprocess_gray(frame)
+
     @property
     def tau(self):
         return deref(self.alg).getTau()
@@ -148,33 +159,36 @@ cdef class CudaBroxOpticalFlow:
         self.alg = BroxOpticalFlow.create(alpha, gamma, scale_factor, inner_iterations,
                                           outer_iterations, solver_iterations)
 
-    def __call__(self, Mat reference, Mat target) -> Mat:
-        cvtColor(<InputArray>reference.c_mat,
-                 <OutputArray>self.reference,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        cvtColor(<InputArray>target.c_mat,
-                 <OutputArray>self.target,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        self.target.convertTo(<OutputArray> self.target_float, CV_32FC1, 1.0 / 255.0)
-        self.reference.convertTo(<OutputArray> self.reference_float, CV_32FC1,
-                                 1.0 / 255.0)
+    def __call__(self, Mat reference, Mat target, out=None) -> Mat:
+        cdef c_Mat reference_frame = reference.c_mat
+        cdef c_Mat target_frame = target.c_mat
+        cdef c_Mat reference_float, target_float
 
         with nogil:
-            if self.flow_gpu.empty():
-                self.flow_gpu = c_GpuMat(self.reference.rows,
-                                         self.reference.cols,
+            as_gray_float(reference_frame, self.reference, self.reference_float,
+                          reference_float)
+            as_gray_float(target_frame, self.target, self.target_float, target_float)
+            if (self.flow_gpu.rows != reference_float.rows
+                    or self.flow_gpu.cols != reference_float.cols):
+                self.flow_gpu = c_GpuMat(reference_float.rows,
+                                         reference_float.cols,
                                          CV_32FC2)
-            self.target_gpu.upload(<InputArray> self.target_float)
-            self.reference_gpu.upload(<InputArray> self.reference_float)
+            self.target_gpu.upload(<InputArray> target_float)
+            self.reference_gpu.upload(<InputArray> reference_float)
 
 
             deref(self.alg).calc(<InputArray>self.reference_gpu,
                                  <InputArray>self.target_gpu,
                                  <InputOutputArray>self.flow_gpu)
-        flow = Mat()
-        self.flow_gpu.download(<OutputArray> flow.c_mat)
+        cdef Mat flow = flow_output(out, reference_frame.rows, reference_frame.cols)
+        with nogil:
+            self.flow_gpu.download(<OutputArray> flow.c_mat)
         return flow
 
+    def preprocess(self, Mat frame) -> Mat:
+        """Convert a BGR frame to the grayscale float32 frames ``__call__`` uses."""
+        return preprocess_gray_float(frame)
+
     @property
     def inner_iterations(self):
         return deref(self.alg).getInnerIterations()
@@ -233,27 +247,33 @@ cdef class CudaPyramidalLucasKanade:
                                                 max_scales,
                                                 iterations, False)
 
-    def __call__(self, Mat reference, Mat target) -> Mat:
-        cvtColor(<InputArray>reference.c_mat,
-                 <OutputArray>self.reference,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        cvtColor(<InputArray>target.c_mat,
-                 <OutputArray>self.target,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        if self.flow_gpu.empty():
-            self.flow_gpu = c_GpuMat(self.reference.rows,
-                                     self.reference.cols,
+    def __call__(self, Mat reference, Mat target, out=None) -> Mat:
+        cdef c_Mat reference_frame = reference.c_mat
+        cdef c_Mat target_frame = target.c_mat
+        cdef c_Mat reference_gray, target_gray
+        with nogil:
+            as_gray(reference_frame, self.reference, reference_gray)
+            as_gray(target_frame, self.target, target_gray)
+        if (self.flow_gpu.rows != reference_gray.rows
+                or self.flow_gpu.cols != reference_gray.cols):
+            self.flow_gpu = c_GpuMat(reference_gray.rows,
+                                     reference_gray.cols,
                                      CV_32FC2)
         with nogil:
-            self.target_gpu.upload(<InputArray> self.target)
-            self.reference_gpu.upload(<InputArray> self.reference)
+            self.target_gpu.upload(<InputArray> target_gray)
+            self.reference_gpu.upload(<InputArray> reference_gray)
             deref(self.alg).calc(<InputArray>self.reference_gpu,
                                  <InputArray>self.target_gpu,
                                  <InputOutputArray>self.flow_gpu)
-        flow = Mat()
-        self.flow_gpu.download(<OutputArray> flow.c_mat)
+        cdef Mat flow = flow_output(out, reference_frame.rows, reference_frame.cols)
+        with nogil:
+            self.flow_gpu.download(<OutputArray> flow.c_mat)
         return flow
 
+    def preprocess(self, Mat frame) -> Mat:
+        """Convert a BGR frame to the grayscale representation ``__call__`` uses."""
+        return preprocess_gray(frame)
+
     @property
     def window_size(self):
         return deref(self.alg).getWinSize().height
@@ -280,32 +300,45 @@ cdef class CudaFarnebackOpticalFlow:
                   int iterations = 10,
                   int neighborhood_size = 5,
                   double poly_sigma = 1.1,
+                  bool use_initial_flow = False,
                   ):
         self.alg = FarnebackOpticalFlow.create(scale_count, scale_factor,
                                                fast_pyramids, window_size,
                                                iterations, neighborhood_size, poly_sigma)
-
-    def __call__(self, Mat reference, Mat target) -> Mat:
-        cvtColor(<InputArray>reference.c_mat,
-                 <OutputArray>self.reference,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        cvtColor(<InputArray>target.c_mat,
-                 <OutputArray>self.target,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        if self.flow_gpu.empty():
-            self.flow_gpu = c_GpuMat(self.reference.rows,
-                                     self.reference.cols,
+        if use_initial_flow:
+            deref(self.alg).setFlags(deref(self.alg).getFlags() | OPTFLOW_USE_INITIAL_FLOW)
+
+    def __call__(self, Mat reference, Mat target, out=None,
+                 initial_flow=None) -> Mat:
+        cdef c_Mat reference_frame = reference.c_mat
+        cdef c_Mat target_frame = target.c_mat
+        cdef c_Mat reference_gray, target_gray
+        with nogil:
+            as_gray(reference_frame, self.reference, reference_gray)
+            as_gray(target_frame, self.target, target_gray)
+        if (self.flow_gpu.rows != reference_gray.rows
+                or self.flow_gpu.cols != reference_gray.cols):
+            self.flow_gpu = c_GpuMat(reference_gray.rows,
+                                     reference_gray.cols,
                                      CV_32FC2)
+        cdef Mat flow = flow_output(out, reference_frame.rows, reference_frame.cols,
+                                    initial_flow, self.use_initial_flow)
+        cdef bool use_initial_flow = self.use_initial_flow
         with nogil:
-            self.target_gpu.upload(<InputArray> self.target)
-            self.reference_gpu.upload(<InputArray> self.reference)
+            self.target_gpu.upload(<InputArray> target_gray)
+            self.reference_gpu.upload(<InputArray> reference_gray)
+            if use_initial_flow:
+                self.flow_gpu.upload(<InputArray> flow.c_mat)
             deref(self.alg).calc(<InputArray>self.reference_gpu,
                                  <InputArray>self.target_gpu,
                                  <InputOutputArray>self.flow_gpu)
-        flow = Mat()
-        self.flow_gpu.download(<OutputArray> flow.c_mat)
+            self.flow_gpu.download(<OutputArray> flow.c_mat)
         return flow
 
+    def preprocess(self, Mat frame) -> Mat:
+        """Convert a BGR frame to the grayscale representation ``__call__`` uses."""
+        return preprocess_gray(frame)
+
     @property
     def scale_count(self) -> int:
         return deref(self.alg).getNumLevels()
@@ -333,3 +366,7 @@ cdef class CudaFarnebackOpticalFlow:
     @property
     def window_size(self) -> int:
         return deref(self.alg).getWinSize()
+
+    @property
+    def use_initial_flow(self) -> bool:
+        return (deref(self.alg).getFlags() & OPTFLOW_USE_INITIAL_FLOW) != 0
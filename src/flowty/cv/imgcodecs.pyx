@@ -2,17 +2,77 @@
 import numpy as np
 from libcpp.string cimport string
 from libcpp cimport bool
-from .c_core cimport InputArray
+from libcpp.vector cimport vector
+from .c_core cimport InputArray, Mat as c_Mat
 from .core cimport Mat
 from .core import Mat
-from .c_imgcodecs cimport imwrite as c_imwrite
+from .c_imgcodecs cimport imread as c_imread, imwrite as c_imwrite, imencode as c_imencode, imdecode as c_imdecode
+from . cimport c_imgcodecs
+
+IMREAD_UNCHANGED = c_imgcodecs.IMREAD_UNCHANGED
+IMREAD_GRAYSCALE = c_imgcodecs.IMREAD_GRAYSCALE
+IMREAD_COLOR = c_imgcodecs.IMREAD_COLOR
+
+
+def imread(file_path, int flags = IMREAD_COLOR) -> np.ndarray:
+    """Read an image from disk.
+
+    Args:
+        file_path: Path of the image to read, a ``str`` or ``Path``.
+        flags: One of the ``IMREAD_*`` modes.
+    """
+    cdef string c_file_path = str(file_path).encode('UTF-8')
+    cdef c_Mat img
+    with nogil:
+        img = c_imread(c_file_path, flags)
+    if img.empty():
+        raise RuntimeError("Could not read image from {}".format(file_path))
+    return Mat.from_mat(img).asarray()
+
 
 def imwrite(file_path: str, img: np.ndarray):
     cdef string c_file_path = file_path.encode('UTF-8')
     # We have to copy the data as it seems imwrite is async and the img np.ndarray data
     # can be released before it is actually written causing memory corruption.
     cdef Mat mat = Mat.fromarray(img)
-    cdef bool success = c_imwrite(c_file_path, <InputArray> mat.c_mat)
+    cdef bool success
+    with nogil:
+        success = c_imwrite(c_file_path, <InputArray> mat.c_mat)
     if not success:
         raise RuntimeError("Could not write image to {}".format(file_path))
 
+
+def imencode(ext: str, img: np.ndarray) -> bytes:
+    """Encode an image in memory.
+
+    Args:
+        ext: Extension of the format to encode the image as, e.g. '.jpg'.
+        img: Image to encode.
+    """
+    cdef string c_ext = ext.encode('UTF-8')
+    cdef Mat mat = Mat.fromarray(img)
+    cdef vector[unsigned char] buf
+    cdef bool success
+    with nogil:
+        success = c_imencode(c_ext, <InputArray> mat.c_mat, buf)
+    if not success:
+        raise RuntimeError("Could not encode image as {}".format(ext))
+    if buf.empty():
+        return b""
+    return (<char*> buf.data())[:buf.size()]
+
+
+def imdecode(buf: bytes, int flags = IMREAD_UNCHANGED) -> np.ndarray:
+    """Decode an image encoded in memory.
+
+    Args:
+        buf: Encoded image.
+        flags: One of the ``IMREAD_*`` modes.
+    """
+    cdef Mat encoded = Mat.fromarray(np.frombuffer(buf, dtype=np.uint8).reshape(1, -1))
+    cdef c_Mat decoded
+    with nogil:
+        decoded = c_imdecode(<InputArray> encoded.c_mat, flags)
+    if decoded.empty():
+        raise RuntimeError("Could not decode image")
+    return Mat.from_mat(decoded).asarray()
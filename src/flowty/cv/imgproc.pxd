@@ -0,0 +1,107 @@
+# cython: language_level=3
+from libcpp cimport bool
+from .c_core cimport Mat as c_Mat, InputArray, OutputArray, CV_32F, CV_32FC1, \
+    CV_32FC2
+from .c_imgproc cimport cvtColor, ColorConversionCodes
+from .core cimport Mat
+
+
+cdef inline int as_gray(c_Mat& frame, c_Mat& scratch, c_Mat& gray) nogil except -1:
+    """Set ``gray`` to a single channel version of ``frame``, converting BGR
+    frames into ``scratch``. Frames that are already grayscale are used as is."""
+    if frame.channels() == 1:
+        gray = frame
+    else:
+        cvtColor(<InputArray> frame, <OutputArray> scratch,
+                 ColorConversionCodes.COLOR_BGR2GRAY)
+        gray = scratch
+    return 0
+
+
+cdef inline int as_gray_float(c_Mat& frame, c_Mat& gray_scratch,
+                              c_Mat& float_scratch, c_Mat& gray_float) nogil except -1:
+    """Set ``gray_float`` to a single channel float32 [0, 1] version of
+    ``frame``, converting into the scratch Mats where necessary."""
+    cdef c_Mat gray
+    if frame.depth() == CV_32F:
+        gray_float = frame
+    else:
+        as_gray(frame, gray_scratch, gray)
+        gray.convertTo(<OutputArray> float_scratch, CV_32FC1, 1.0 / 255.0)
+        gray_float = float_scratch
+    return 0
+
+
+cdef inline Mat preprocess_gray(Mat frame):
+    """Return ``frame`` converted to grayscale, or ``frame`` itself if it
+    already is."""
+    if frame.c_mat.channels() == 1:
+        return frame
+    cdef c_Mat bgr = frame.c_mat
+    cdef c_Mat scratch, gray
+    with nogil:
+        as_gray(bgr, scratch, gray)
+    return Mat.from_mat(gray)
+
+
+cdef inline Mat preprocess_gray_float(Mat frame):
+    """Return ``frame`` converted to grayscale float32, or ``frame`` itself if
+    it already is."""
+    if frame.c_mat.depth() == CV_32F:
+        return frame
+    cdef c_Mat bgr = frame.c_mat
+    cdef c_Mat gray_scratch, float_scratch, gray_float
+    with nogil:
+        as_gray_float(bgr, gray_scratch, float_scratch, gray_float)
+    return Mat.from_mat(gray_float)
+
+
+cdef inline bool is_flow_of_size(c_Mat& flow, int rows, int cols):
+    return flow.type() == CV_32FC2 and flow.rows == rows and flow.cols == cols
+
+
+cdef inline Mat flow_output(out, int rows, int cols, initial_flow=None,
+                            bool use_initial_flow=False):
+    """Return the Mat flow of size ``rows`` x ``cols`` is written into.
+
+    Args:
+        out: ``None`` to allocate a new Mat when flow is computed, otherwise a
+            CV_32FC2 ``Mat`` or C-contiguous float32 array of shape
+            (rows, cols, 2) that flow is written into without copying. Algorithms
+            that use flow of the right size as an initial estimate regardless of
+            ``use_initial_flow`` (DIS) must compute into another Mat and copy it
+            into ``out``.
+        initial_flow: Flow the returned Mat is initialised to, only used by
+            algorithms with ``use_initial_flow``.
+        use_initial_flow: Whether the algorithm uses the flow it is passed as
+            an initial estimate, in which case flow is initialised to zero when
+            ``initial_flow`` isn't given.
+    """
+    cdef Mat out_mat
+    if out is None:
+        out_mat = Mat()
+    elif isinstance(out, Mat):
+        out_mat = out
+    else:
+        # Mat.fromarray copies non-contiguous arrays, so flow wouldn't end up in
+        # the caller's array.
+        if not out.flags["C_CONTIGUOUS"]:
+            raise ValueError("Expected out to be C-contiguous")
+        out_mat = Mat.fromarray(out)
+    if out is not None and not is_flow_of_size(out_mat.c_mat, rows, cols):
+        raise ValueError("Expected out to be a float32 array or Mat of shape "
+                         "({}, {}, 2)".format(rows, cols))
+    if initial_flow is None:
+        if use_initial_flow:
+            out_mat.c_mat.create(rows, cols, CV_32FC2)
+            out_mat.c_mat.setTo(<InputArray> 0)
+        return out_mat
+    if not use_initial_flow:
+        raise ValueError("initial_flow is only used when use_initial_flow is set")
+    cdef Mat initial_mat = (initial_flow if isinstance(initial_flow, Mat)
+                            else Mat.fromarray(initial_flow))
+    if not is_flow_of_size(initial_mat.c_mat, rows, cols):
+        raise ValueError("Expected initial_flow to be a float32 array or Mat of "
+                         "shape ({}, {}, 2)".format(rows, cols))
+    initial_mat.c_mat.copyTo(<OutputArray> out_mat.c_mat)
+    return out_mat
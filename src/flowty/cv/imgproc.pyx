@@ -0,0 +1,48 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+
+
+def quantise_flow_uv(const float[:, :, ::1] flow not None, double bound,
+                     unsigned char[:, ::1] u not None,
+                     unsigned char[:, ::1] v not None):
+    """Quantise a 2D vector field into separate u and v planes.
+
+    Equivalent to ``quantise_flow(flow, bound)[..., 0]`` and ``[..., 1]`` but
+    clips, scales and deinterleaves the flow in a single pass without
+    allocating, so the planes can be reused between flow fields.
+
+    Args:
+        flow: Contiguous float32 vector field of shape (H, W, 2).
+        bound: Max value of flow (and -bound is min value), values above this
+            are clipped.
+        u: Contiguous uint8 array of shape (H, W) the u component is written to.
+        v: Contiguous uint8 array of shape (H, W) the v component is written to.
+    """
+    if flow.shape[2] != 2:
+        raise ValueError("Expected flow to have 2 channels, but had {}".format(
+                flow.shape[2]))
+    if (u.shape[0] != flow.shape[0] or u.shape[1] != flow.shape[1]
+            or v.shape[0] != flow.shape[0] or v.shape[1] != flow.shape[1]):
+        raise ValueError("Expected u and v planes of shape ({}, {})".format(
+                flow.shape[0], flow.shape[1]))
+    if flow.shape[0] == 0 or flow.shape[1] == 0:
+        return
+    cdef const float* flow_data = &flow[0, 0, 0]
+    cdef unsigned char* planes[2]
+    planes[0] = &u[0, 0]
+    planes[1] = &v[0, 0]
+    cdef Py_ssize_t i, pixel_count = flow.shape[0] * flow.shape[1]
+    cdef int channel
+    cdef float value
+    cdef float bound_f = <float> bound
+    # Match the float32 arithmetic of quantise_flow so results are identical.
+    cdef float scale = <float> (255 / (2 * bound))
+    with nogil:
+        for i in range(pixel_count):
+            for channel in range(2):
+                value = flow_data[2 * i + channel]
+                # NaN fails both comparisons so is mapped to 0 along with -bound.
+                if not value > -bound_f:
+                    value = -bound_f
+                elif value > bound_f:
+                    value = bound_f
+                planes[channel][i] = <unsigned char> ((value + bound_f) * scale)
@@ -8,10 +8,12 @@ cimport numpy as np
 from libcpp cimport bool
 from libcpp.string cimport string
 from .c_core cimport Ptr, String, Mat as c_Mat, InputArray, OutputArray, \
-    InputOutputArray, CV_32FC2, CV_32FC1
-from .c_imgproc cimport cvtColor, ColorConversionCodes
+    InputOutputArray, CV_32FC2, CV_32F
 from .core cimport Mat
-from .c_optflow cimport DenseOpticalFlow as c_DenseOpticalFlow, \
+from .imgproc cimport as_gray, as_gray_float, preprocess_gray, preprocess_gray_float, \
+    flow_output
+from .c_optflow cimport OPTFLOW_USE_INITIAL_FLOW, \
+     DenseOpticalFlow as c_DenseOpticalFlow, \
      DualTVL1OpticalFlow as c_DualTVL1OpticalFlow, \
      FarnebackOpticalFlow as c_FarnebackOpticalFlow, \
      DISOpticalFlow as c_DISOpticalFlow, PRESET_ULTRAFAST, PRESET_FAST, PRESET_MEDIUM, \
@@ -20,17 +22,24 @@ from .c_optflow cimport DenseOpticalFlow as c_DenseOpticalFlow, \
 
 
 cdef compute_flow(Ptr[c_DenseOpticalFlow] algorithm,
-                  Mat reference_rgb,
-                  Mat target_rgb,
-                  c_Mat& reference_gray,
-                  c_Mat& target_gray,
+                  Mat reference,
+                  Mat target,
+                  c_Mat& reference_scratch,
+                  c_Mat& target_scratch,
                   c_Mat& flow):
-    cvtColor(<InputArray> reference_rgb.c_mat, <OutputArray> reference_gray,
-             ColorConversionCodes.COLOR_BGR2GRAY)
-    cvtColor(<InputArray> target_rgb.c_mat, <OutputArray> target_gray,
-             ColorConversionCodes.COLOR_BGR2GRAY)
-    deref(algorithm).calc(<InputArray> reference_gray, <InputArray> target_gray,
-                          <InputOutputArray> flow)
+    # Frames may be BGR or already preprocessed to grayscale (see `preprocess`),
+    # only BGR frames are converted. The GIL is released for the conversion and
+    # flow computation so that threads, each with their own algorithm instance,
+    # can compute flow concurrently.
+    cdef c_Mat reference_frame = reference.c_mat
+    cdef c_Mat target_frame = target.c_mat
+    cdef c_Mat reference_gray, target_gray
+    with nogil:
+        as_gray(reference_frame, reference_scratch, reference_gray)
+        as_gray(target_frame, target_scratch, target_gray)
+        deref(algorithm).calc(<InputArray> reference_gray, <InputArray> target_gray,
+                              <InputOutputArray> flow)
+
 
 cdef class TvL1OpticalFlow:
     """
@@ -74,14 +83,19 @@ cdef class TvL1OpticalFlow:
         self.alg = c_DualTVL1OpticalFlow.create(tau, lambda_, theta, scale_count, warp_count, epsilon,
             inner_iterations, outer_iterations, scale_step, gamma, median_filtering, use_initial_flow)
 
-    def __call__(self, Mat reference, Mat target):
-        flow = Mat()
+    def __call__(self, Mat reference, Mat target, out=None, initial_flow=None):
+        cdef Mat flow = flow_output(out, reference.c_mat.rows, reference.c_mat.cols,
+                                    initial_flow, self.use_initial_flow)
         compute_flow(<Ptr[c_DenseOpticalFlow]>self.alg, reference, target,
                      self.reference,
                      self.target,
                      flow.c_mat)
         return flow
 
+    def preprocess(self, Mat frame) -> Mat:
+        """Convert a BGR frame to the grayscale representation ``__call__`` uses."""
+        return preprocess_gray(frame)
+
 
     @property
     def tau(self):
@@ -187,20 +201,28 @@ cdef class FarnebackOpticalFlow:
                   int iterations = 10,
                   int neighborhood_size = 5,
                   double poly_sigma = 1.1,
+                  bool use_initial_flow = False,
                   ):
         self.alg = c_FarnebackOpticalFlow.create(scale_count, scale_factor,
                                                  fast_pyramids, window_size,
                                                  iterations, neighborhood_size, poly_sigma)
+        if use_initial_flow:
+            deref(self.alg).setFlags(deref(self.alg).getFlags() | OPTFLOW_USE_INITIAL_FLOW)
 
 
-    def __call__(self, Mat reference, Mat target):
-        flow = Mat()
+    def __call__(self, Mat reference, Mat target, out=None, initial_flow=None):
+        cdef Mat flow = flow_output(out, reference.c_mat.rows, reference.c_mat.cols,
+                                    initial_flow, self.use_initial_flow)
         compute_flow(<Ptr[c_DenseOpticalFlow]>self.alg, reference, target,
                      self.reference,
                      self.target,
                      flow.c_mat)
         return flow
 
+    def preprocess(self, Mat frame) -> Mat:
+        """Convert a BGR frame to the grayscale representation ``__call__`` uses."""
+        return preprocess_gray(frame)
+
     @property
     def scale_count(self) -> int:
         return deref(self.alg).getNumLevels()
@@ -229,6 +251,9 @@ cdef class FarnebackOpticalFlow:
     def window_size(self) -> int:
         return deref(self.alg).getWinSize()
 
+    @property
+    def use_initial_flow(self) -> bool:
+        return (deref(self.alg).getFlags() & OPTFLOW_USE_INITIAL_FLOW) != 0
 
 
 cdef class VariationalRefinementOpticalFlow:
@@ -252,24 +277,27 @@ cdef class VariationalRefinementOpticalFlow:
         deref(self.alg).setOmega(omega)
 
 
-    def __call__(self, Mat reference, Mat target):
-        cvtColor(<InputArray>reference.c_mat,
-                 <OutputArray>self.reference,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        cvtColor(<InputArray>target.c_mat,
-                 <OutputArray>self.target,
-                 ColorConversionCodes.COLOR_BGR2GRAY)
-        self.target.convertTo(<OutputArray> self.target_float, CV_32FC1, 1.0 / 255.0)
-        self.reference.convertTo(<OutputArray> self.reference_float, CV_32FC1,
-                                 1.0 / 255.0)
-        flow = Mat(self.reference.rows, self.reference.cols, CV_32FC2)
-        # Without setting the flow matrix to zero, you get weird pattern artifacts.
-        flow.c_mat.setTo(<InputArray> 0)
-        deref(self.alg).calc(<InputArray>self.reference_float,
-                             <InputArray>self.target_float,
-                             <InputOutputArray> flow.c_mat)
+    def __call__(self, Mat reference, Mat target, out=None, initial_flow=None):
+        cdef c_Mat reference_frame = reference.c_mat
+        cdef c_Mat target_frame = target.c_mat
+        cdef c_Mat reference_float, target_float
+        # Flow is refined from initial_flow, or from zero flow without which you
+        # get weird pattern artifacts.
+        cdef Mat flow = flow_output(out, reference_frame.rows, reference_frame.cols,
+                                    initial_flow, True)
+        with nogil:
+            as_gray_float(reference_frame, self.reference, self.reference_float,
+                          reference_float)
+            as_gray_float(target_frame, self.target, self.target_float, target_float)
+            deref(self.alg).calc(<InputArray>reference_float,
+                                 <InputArray>target_float,
+                                 <InputOutputArray> flow.c_mat)
         return flow
 
+    def preprocess(self, Mat frame) -> Mat:
+        """Convert a BGR frame to the grayscale float32 frames ``__call__`` uses."""
+        return preprocess_gray_float(frame)
+
     @property
     def sor_iterations(self) -> int:
         return deref(self.alg).getSorIterations()
@@ -294,6 +322,11 @@ cdef class VariationalRefinementOpticalFlow:
     def omega(self) -> float:
         return deref(self.alg).getOmega()
 
+    @property
+    def use_initial_flow(self) -> bool:
+        """Always ``True``, flow is refined from ``initial_flow`` (or zero)."""
+        return True
+
 cdef class DenseInverseSearchOpticalFlow:
     cdef Ptr[c_DISOpticalFlow] alg
     cdef c_Mat reference, target
@@ -340,13 +373,25 @@ cdef class DenseInverseSearchOpticalFlow:
             self.variational_refinement_iterations = variational_refinement_iterations
 
 
-    def __call__(self, Mat reference, Mat target):
-        flow = Mat()
+    def __call__(self, Mat reference, Mat target, out=None):
+        cdef Mat out_mat = flow_output(out, reference.c_mat.rows, reference.c_mat.cols)
+        # DIS uses any flow of the right size it is given as an initial estimate,
+        # so flow is computed into a new Mat and copied into ``out`` rather than
+        # computed in place from whatever ``out`` held.
+        cdef Mat flow = Mat()
         compute_flow(<Ptr[c_DenseOpticalFlow]>self.alg, reference, target,
                      self.reference,
                      self.target,
                      flow.c_mat)
-        return flow
+        if out is None:
+            return flow
+        with nogil:
+            flow.c_mat.copyTo(<OutputArray> out_mat.c_mat)
+        return out_mat
+
+    def preprocess(self, Mat frame) -> Mat:
+        """Convert a BGR frame to the grayscale representation ``__call__`` uses."""
+        return preprocess_gray(frame)
 
     @property
     def finest_scale(self) -> int:
@@ -429,7 +474,45 @@ cdef class DenseInverseSearchOpticalFlow:
     def variational_refinement_iterations(self, int iterations):
         deref(self.alg).setVariationalRefinementIterations(iterations)
 
-def read_flo(str path) -> Mat:
+
+cdef class CascadeOpticalFlow:
+    """Compute flow with a fast algorithm, then refine it with a more accurate one
+    initialised with that flow, e.g. DIS followed by a reduced schedule TV-L1.
+
+    Args:
+        initial_flow_algorithm: Algorithm computing the initial flow, e.g.
+            ``DenseInverseSearchOpticalFlow(preset='ultrafast')``.
+        refinement_algorithm: Algorithm refining flow from an ``initial_flow``
+            argument, e.g. ``TvL1OpticalFlow(use_initial_flow=True)`` or
+            ``VariationalRefinementOpticalFlow()``.
+    """
+    cdef readonly object initial_flow_algorithm, refinement_algorithm
+
+    def __cinit__(self, initial_flow_algorithm, refinement_algorithm):
+        if not getattr(refinement_algorithm, "use_initial_flow", False):
+            raise ValueError("Expected refinement_algorithm to use initial flow")
+        self.initial_flow_algorithm = initial_flow_algorithm
+        self.refinement_algorithm = refinement_algorithm
+
+    def __call__(self, Mat reference, Mat target, out=None):
+        # The initial flow algorithm allocates its flow afresh for every pair, as
+        # DIS would otherwise start from the previous pair's flow and make the
+        # result depend on the order pairs are computed in.
+        initial_flow = self.initial_flow_algorithm(reference, target)
+        return self.refinement_algorithm(reference, target, out=out,
+                                         initial_flow=initial_flow)
+
+    def preprocess(self, Mat frame) -> Mat:
+        """Convert a BGR frame to the representation the initial flow algorithm uses."""
+        return self.initial_flow_algorithm.preprocess(frame)
+
+    def __repr__(self):
+        return "{}(initial_flow_algorithm={!r}, refinement_algorithm={!r})".format(
+                self.__class__.__name__, self.initial_flow_algorithm,
+                self.refinement_algorithm)
+
+
+def read_flo(path) -> Mat:
     if isinstance(path, Path):
         path = str(path)
     cdef c_Mat flow = readOpticalFlow(String(<string> path.encode('utf8')))
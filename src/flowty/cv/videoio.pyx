@@ -4,10 +4,12 @@ from typing import Iterator, Optional
 
 from libcpp.string cimport string
 from libcpp cimport bool
+from libcpp.vector cimport vector
 
-from .c_core cimport Mat as c_Mat, OutputArray, Size
+from .c_core cimport Mat as c_Mat, InputArray, OutputArray, Size, CV_8U
 from .core cimport Mat
 from .core import Mat
+from .c_imgproc cimport cvtColor, ColorConversionCodes
 from .c_videoio cimport VideoCapture
 from . cimport  c_videoio
 
@@ -43,32 +45,252 @@ _backend_lookup = {
 }
 _reverse_backend_lookup = {enum_value: video_key for video_key, enum_value in _backend_lookup.items()}
 
+
+cdef enum RawFormat:
+    RAW_NONE
+    RAW_BGR
+    RAW_RGB
+    RAW_GRAY
+    RAW_YUYV
+    RAW_UYVY
+    RAW_YUV420
+
+# Pixel formats (by their V4L2 fourcc) of frames returned by backends with RGB
+# conversion disabled that luma can be read from directly.
+_raw_format_lookup = {
+    'BGR3': RAW_BGR,
+    'RGB3': RAW_RGB,
+    'GREY': RAW_GRAY,
+    'YUYV': RAW_YUYV,
+    'YUY2': RAW_YUYV,
+    'UYVY': RAW_UYVY,
+    'YU12': RAW_YUV420,
+    'YV12': RAW_YUV420,
+    'NV12': RAW_YUV420,
+    'NV21': RAW_YUV420,
+}
+# OpenCV converts YUV to BGR as limited range BT.601, where luma spans [16, 235].
+DEF LUMA_SCALE = 255.0 / 219.0
+
+
+cdef str fourcc_to_str(double fourcc):
+    cdef int code = <int> fourcc
+    return "".join(chr((code >> shift) & 0xff) for shift in (0, 8, 16, 24))
+
+
+cdef int raw_to_gray(c_Mat& raw, int raw_format, int rows, c_Mat& converted,
+                     c_Mat& gray) nogil except -1:
+    """Set ``gray`` to a single channel version of ``raw``, a frame of ``rows``
+    rows in ``raw_format``, converting into ``converted`` where necessary.
+
+    Luma of YUV frames is expanded to full range so that gray frames match those
+    converted from the BGR frames OpenCV would have decoded.
+    """
+    cdef c_Mat luma
+    if raw_format == RAW_GRAY:
+        gray = raw
+        return 0
+    if raw_format == RAW_BGR or raw_format == RAW_RGB:
+        cvtColor(<InputArray> raw, <OutputArray> converted,
+                 ColorConversionCodes.COLOR_BGR2GRAY if raw_format == RAW_BGR
+                 else ColorConversionCodes.COLOR_RGB2GRAY)
+        gray = converted
+        return 0
+    if raw_format == RAW_YUYV:
+        cvtColor(<InputArray> raw, <OutputArray> converted,
+                 ColorConversionCodes.COLOR_YUV2GRAY_YUY2)
+        luma = converted
+    elif raw_format == RAW_UYVY:
+        cvtColor(<InputArray> raw, <OutputArray> converted,
+                 ColorConversionCodes.COLOR_YUV2GRAY_UYVY)
+        luma = converted
+    else:
+        # Planar YUV 4:2:0 frames start with the luma plane.
+        luma = raw.rowRange(0, rows)
+    luma.convertTo(<OutputArray> converted, CV_8U, LUMA_SCALE, -16 * LUMA_SCALE)
+    gray = converted
+    return 0
+
+
+cdef str gstreamer_yuv_pipeline(str file_path):
+    """GStreamer pipeline decoding ``file_path`` to planar YUV 4:2:0, which most
+    decoders output so it's passed through without conversion."""
+    location = os.path.abspath(file_path).replace("\\", "\\\\").replace('"', '\\"')
+    return ('filesrc location="{}" ! decodebin ! videoconvert ! '
+            'video/x-raw,format=I420 ! appsink sync=false'.format(location))
+
+
+def raw_frame_to_gray(Mat frame, str fourcc, int rows) -> Mat:
+    """Convert ``frame``, as returned by a backend with RGB conversion disabled in
+    the pixel format ``fourcc`` (e.g. ``'YUYV'``), to a gray frame of ``rows``
+    rows."""
+    if fourcc not in _raw_format_lookup:
+        raise ValueError("Unsupported pixel format '{}'".format(fourcc))
+    cdef int raw_format = _raw_format_lookup[fourcc]
+    cdef c_Mat raw = frame.c_mat
+    cdef c_Mat converted, gray
+    with nogil:
+        raw_to_gray(raw, raw_format, rows, converted, gray)
+    return Mat.from_mat(gray)
+
 cdef class VideoSource:
     """
     Args:
         file_path (str): Path to video.
         backend (str): Backend to use to decode video.
+        color (str): Either ``'bgr'`` for 3 channel BGR frames or ``'gray'`` for
+            single channel frames. Gray frames are read from the raw frame when
+            the backend can return frames in a known pixel format: GStreamer
+            decodes files to planar YUV and backends that support disabling RGB
+            conversion (e.g. V4L2 cameras) return their native format. Otherwise,
+            including with FFmpeg whose raw mode returns encoded packets rather
+            than decoded YUV, they are converted from BGR.
+        buffer_count (int): Number of buffers frames are decoded into in turn,
+            see the ``buffer_count`` property. 0 allocates a buffer per frame.
     """
     cdef:
         VideoCapture c_cap
+        bool gray
+        int raw_format
+        int frame_rows
+        vector[c_Mat] decoded_buffers, converted_buffers
+        size_t next_buffer
+        readonly long allocation_count
 
-    def __cinit__(self, str file_path, str backend = "ffmpeg"):
+    def __cinit__(self, str file_path, str backend = "ffmpeg", str color = "bgr",
+                  int buffer_count = 0):
+        if color not in ("bgr", "gray"):
+            raise ValueError("Expected color to be 'bgr' or 'gray' but was '{}'".format(
+                    color))
         if '%' not in file_path and not os.path.exists(file_path):
             raise RuntimeError("{} doesnt exist".format(file_path))
         cdef string cpp_file_path = file_path.encode('UTF-8')
         cdef int backend_enum = _backend_lookup[backend.lower()]
-        self.c_cap = VideoCapture(cpp_file_path, backend_enum)
+        cdef string cpp_pipeline
+        self.gray = color == "gray"
+        self.raw_format = RAW_NONE
+        # GStreamer converts files to BGR unless given a pipeline ending in
+        # another format, one in YUV has luma read straight from it. If the
+        # pipeline can't be built (e.g. a missing plugin) BGR is decoded.
+        if (self.gray and backend_enum == c_videoio.CAP_GSTREAMER
+                and os.path.isfile(file_path)):
+            cpp_pipeline = gstreamer_yuv_pipeline(file_path).encode('UTF-8')
+            if self.c_cap.open(cpp_pipeline, backend_enum):
+                self.raw_format = RAW_YUV420
+        if self.raw_format == RAW_NONE:
+            self.c_cap.open(cpp_file_path, backend_enum)
+        # Most other backends, including FFmpeg, refuse to disable RGB conversion,
+        # their BGR frames are converted to gray in `as_color`.
+        if (self.gray and self.raw_format == RAW_NONE
+                and self.c_cap.set(c_videoio.CAP_PROP_CONVERT_RGB, 0)):
+            self.raw_format = _raw_format_lookup.get(fourcc_to_str(self.fourcc),
+                                                     RAW_NONE)
+            if self.raw_format == RAW_NONE:
+                # Frames in other formats, e.g. MJPEG, are only decoded when
+                # converting to RGB.
+                self.c_cap.set(c_videoio.CAP_PROP_CONVERT_RGB, 1)
+        self.frame_rows = <int> self.c_cap.get(c_videoio.CAP_PROP_FRAME_HEIGHT)
+        self.buffer_count = buffer_count
+
+    cdef int as_color(self, c_Mat& decoded, c_Mat& converted,
+                      c_Mat& frame) nogil except -1:
+        """Set ``frame`` to ``decoded`` in the requested color format, converting
+        into ``converted`` where necessary."""
+        if not self.gray:
+            frame = decoded
+        elif self.raw_format != RAW_NONE:
+            raw_to_gray(decoded, self.raw_format, self.frame_rows, converted, frame)
+        elif decoded.channels() == 3:
+            cvtColor(<InputArray> decoded, <OutputArray> converted,
+                     ColorConversionCodes.COLOR_BGR2GRAY)
+            frame = converted
+        else:
+            frame = decoded
+        return 0
+
+    cdef Mat decode(self, bool grabbed):
+        """Decode the next frame, or the grabbed frame if ``grabbed``, into the
+        next buffer of the ring when ``buffer_count`` is set.
+
+        Returns:
+            The frame, or ``None`` if there wasn't one.
+        """
+        cdef size_t i = self.next_buffer
+        cdef bool pooled = self.decoded_buffers.size() > 0
+        cdef c_Mat decoded, converted, frame
+        if pooled:
+            decoded = self.decoded_buffers[i]
+            converted = self.converted_buffers[i]
+        cdef void* decoded_data = decoded.data
+        cdef void* converted_data = converted.data
+        cdef bool ok
+        with nogil:
+            if grabbed:
+                ok = self.c_cap.retrieve(<OutputArray> decoded, 0)
+            else:
+                ok = self.c_cap.read(<OutputArray> decoded)
+            if ok:
+                self.as_color(decoded, converted, frame)
+        if not ok:
+            return None
+        # Buffers are only reallocated when the frame size or type changes.
+        self.allocation_count += ((decoded.data != decoded_data)
+                                  + (converted.data != converted_data))
+        if pooled:
+            self.decoded_buffers[i] = decoded
+            self.converted_buffers[i] = converted
+            self.next_buffer = (i + 1) % self.decoded_buffers.size()
+        return Mat.from_mat(frame)
 
     def __iter__(self) -> Iterator[Mat]:
         return self
 
     def __next__(self) -> Mat:
-        cdef Mat frame = Mat()
-        cdef bool read = self.c_cap.read(<OutputArray> frame.c_mat)
-        if not read:
+        frame = self.decode(False)
+        if frame is None:
             raise StopIteration()
         return frame
 
+    def grab(self) -> bool:
+        """Advance to the next frame without decoding it.
+
+        Returns:
+            Whether a frame was grabbed, ``False`` at the end of the video.
+        """
+        cdef bool grabbed
+        with nogil:
+            grabbed = self.c_cap.grab()
+        return grabbed
+
+    def retrieve(self) -> Mat:
+        """Decode the most recently grabbed frame."""
+        frame = self.decode(True)
+        if frame is None:
+            raise RuntimeError("Unable to retrieve frame, was one grabbed?")
+        return frame
+
+    @property
+    def buffer_count(self):
+        """Number of buffers frames are decoded into in turn, or 0 to allocate a
+        new buffer for each frame.
+
+        With ``buffer_count = n`` a frame is overwritten when the ``n``-th frame
+        after it is decoded, so at most ``n - 1`` earlier frames may still be in
+        use when reading a frame. Setting this releases any existing buffers.
+        """
+        return self.decoded_buffers.size()
+
+    @buffer_count.setter
+    def buffer_count(self, int buffer_count):
+        if buffer_count < 0:
+            raise ValueError("buffer_count must be non-negative but was {}".format(
+                    buffer_count))
+        self.decoded_buffers.clear()
+        self.converted_buffers.clear()
+        self.decoded_buffers.resize(buffer_count)
+        self.converted_buffers.resize(buffer_count)
+        self.next_buffer = 0
+
     cpdef void open(self, file_path: str, backend: Optional[str] = None):
         cdef string cpp_file_path = file_path.encode('UTF-8')
         if backend is None:
@@ -76,14 +298,36 @@ cdef class VideoSource:
         cdef int backend_enum = backend
         self.c_cap.open(cpp_file_path, backend_enum)
 
+    def seek_frame(self, int frame):
+        """Seek so that the next frame read is ``frame``."""
+        if not self.c_cap.set(c_videoio.CAP_PROP_POS_FRAMES, frame):
+            raise RuntimeError("Unable to seek to frame {}".format(frame))
+
+    def seek_ms(self, double ms):
+        """Seek so that the next frame read is the one at ``ms`` milliseconds."""
+        if not self.c_cap.set(c_videoio.CAP_PROP_POS_MSEC, ms):
+            raise RuntimeError("Unable to seek to {}ms".format(ms))
+
     @property
     def pos_ms(self):
         return self.c_cap.get(c_videoio.CAP_PROP_POS_MSEC)
 
+    @pos_ms.setter
+    def pos_ms(self, double pos_ms):
+        self.seek_ms(pos_ms)
+
     @property
     def pos_frames(self):
         return self.c_cap.get(c_videoio.CAP_PROP_POS_FRAMES)
 
+    @pos_frames.setter
+    def pos_frames(self, int pos_frames):
+        self.seek_frame(pos_frames)
+
+    @property
+    def color(self):
+        return "gray" if self.gray else "bgr"
+
     @property
     def frame_width(self):
         return self.c_cap.get(c_videoio.CAP_PROP_FRAME_WIDTH)
@@ -138,15 +382,45 @@ cdef class VideoSource:
 
 
 cdef class VideoWriter:
+    """
+    Args:
+        file_path (str): Path to video.
+        fourcc (str): 4 character code of the codec used to encode frames, e.g.
+            'mp4v'.
+        fps (float): Frame rate of the video.
+        height (int): Height of frames.
+        width (int): Width of frames.
+        backend (str): Backend to use to encode video.
+        is_color (bool): Whether frames are BGR, otherwise they are grayscale.
+    """
     cdef c_videoio.VideoWriter c_writer
 
-    def __cinit__(self, str file_path, str fourcc, float fps, int height, int width, str backend = 'ffmpeg'):
+    def __cinit__(self, str file_path, str fourcc, float fps, int height, int width,
+                  str backend = 'ffmpeg', bool is_color = True):
         if len(fourcc) != 4:
             raise ValueError("Expected fourcc to be a 4 characeter string but was '{}'".format(fourcc))
 
         cdef string cpp_file_path = file_path.encode('UTF-8')
         cdef int backend_enum = _backend_lookup[backend.lower()]
-        cdef int fourcc_int = VideoWriter.fourcc(fourcc[0], fourcc[1], fourcc[2], fourcc[3])
-        cdef Size size = Size(height, width)
-        self.c_writer = c_videoio.VideoWriter(cpp_file_path, backend_enum, fourcc_int, fps, size)
+        cdef bytes fourcc_bytes = fourcc.encode('ascii')
+        cdef int fourcc_int = c_videoio.VideoWriter.fourcc(
+                fourcc_bytes[0], fourcc_bytes[1], fourcc_bytes[2], fourcc_bytes[3])
+        cdef Size size = Size(width, height)
+        self.c_writer = c_videoio.VideoWriter(cpp_file_path, backend_enum, fourcc_int,
+                                              fps, size, is_color)
+        if not self.c_writer.isOpened():
+            raise RuntimeError("Unable to open {} for writing with fourcc '{}'".format(
+                    file_path, fourcc))
+
+    def write(self, Mat frame):
+        cdef c_Mat c_frame = frame.c_mat
+        with nogil:
+            self.c_writer.write(<InputArray> c_frame)
 
+    def release(self):
+        with nogil:
+            self.c_writer.release()
+
+    @property
+    def is_opened(self):
+        return self.c_writer.isOpened()
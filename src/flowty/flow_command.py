@@ -1,36 +1,156 @@
 from abc import ABC
+from functools import partial
+from pathlib import Path
+from typing import Optional
 
 from flowty.cv import mat_to_array
 from flowty.cv.videoio import VideoSource
 from flowty.flow_pipe import FlowPipe
-from flowty.videoio import get_flow_writer
+from flowty.metrics import FlowPipeMetrics, MetricsExporter
+from flowty.trace import Tracer
+from flowty.segments import (
+    Segment, frame_range, plan_segments, resume_segment, run_segments
+)
+from flowty.videoio import get_flow_writer, parse_template_fields
 
 
 class AbstractFlowCommand(ABC):
 
-    def __init__(self, args):
+    def __init__(self, args, flow_algorithm=None):
         self.args = args
+        # All flow algorithms compute flow on grayscale frames, decoding straight
+        # to gray avoids converting to BGR and back.
         self.video_src = VideoSource(
-                str(args.src.absolute()), backend=args.opencv_videoio_backend
+                str(args.src.absolute()), backend=args.opencv_videoio_backend,
+                color="gray",
         )
-        self.video_sink = get_flow_writer(args)
-        self.flow_algorithm = self.get_flow_algorithm(args)
+        self.start_frame, self.end_frame = frame_range(args, self.video_src)
+        self.video_sink = get_flow_writer(args, src=self.video_src)
+        if flow_algorithm is None:
+            flow_algorithm = self.get_flow_algorithm(args)
+        self.flow_algorithm = flow_algorithm
 
     def get_flow_algorithm(self, args):
         raise NotImplementedError()
 
+    def get_warm_flow_algorithm(self, args):
+        """Return an algorithm computing flow from an initial estimate of it, used
+        to warm start each pair from the previous one's flow, or ``None`` to
+        compute each pair from scratch."""
+        return None
+
     @staticmethod
     def register_command(command_parsers):
         raise NotImplementedError()
 
-    def main(self):
-
-        pipeline = FlowPipe(
+    def create_pipeline(self, segment: Segment = None,
+                        metrics: FlowPipeMetrics = None,
+                        tracer: Tracer = None) -> FlowPipe:
+        if segment is None:
+            segment = Segment(start=self.start_frame, end=self.end_frame, first_index=1)
+        if self.args.resume:
+            segment = resume_segment(segment, self.video_sink.exists,
+                                     stride=self.args.video_stride,
+                                     dilation=self.args.video_dilation)
+        self.video_sink.frame_index = segment.first_index
+        return FlowPipe(
                 src=self.video_src,
                 flow_algorithm=self.flow_algorithm,
                 dest=self.video_sink,
                 output_transforms=[mat_to_array],
                 stride=self.args.video_stride,
                 dilation=self.args.video_dilation,
+                pipelined=self.args.pipelined,
+                queue_size=self.args.queue_size,
+                workers=self.args.workers,
+                flow_algorithm_factory=partial(self.get_flow_algorithm, self.args),
+                start=segment.start,
+                end=segment.end,
+                warm_flow_algorithm=self.get_warm_flow_algorithm(self.args),
+                metrics=metrics,
+                tracer=tracer,
+        )
+
+    def create_metrics_exporter(self,
+                                segment: Segment = None) -> Optional[MetricsExporter]:
+        """Create an exporter writing the metrics of a pipeline run to the paths
+        given on the command line, or ``None`` if metrics aren't requested."""
+        paths = {
+            "json_path": self.args.metrics_json,
+            "prometheus_path": self.args.metrics_prometheus,
+            "summary_path": self.args.metrics_summary,
+        }
+        if all(path is None for path in paths.values()):
+            return None
+        labels = {"video": str(self.args.src)}
+        if self._is_segmented(segment):
+            labels["segment"] = str(segment.start)
+        paths = {name: self._output_path(path, segment) for name, path in paths.items()}
+        summary_info = {
+            "args": {name: value for name, value in vars(self.args).items()
+                     if name != "command"},
+            "segment": segment._asdict() if segment is not None else None,
+        }
+        return MetricsExporter(FlowPipeMetrics(labels),
+                               interval=self.args.metrics_interval,
+                               summary_info=summary_info, **paths)
+
+    def run_pipeline(self, segment: Segment = None) -> None:
+        exporter = self.create_metrics_exporter(segment)
+        tracer = None
+        if self.args.trace is not None:
+            tracer = Tracer(sample_interval=self.args.trace_sample_interval)
+            self.video_sink.tracer = tracer
+        pipe = self.create_pipeline(
+                segment,
+                metrics=exporter.metrics if exporter is not None else None,
+                tracer=tracer,
         )
-        pipeline.run()
\ No newline at end of file
+        try:
+            if exporter is None:
+                pipe.run()
+            else:
+                with exporter:
+                    pipe.run()
+        finally:
+            if tracer is not None:
+                tracer.write(self._output_path(self.args.trace, segment))
+
+    def _is_segmented(self, segment: Optional[Segment]) -> bool:
+        return segment is not None and self.args.segments > 1
+
+    def _output_path(self, path: Optional[Path], segment: Optional[Segment]):
+        """Path of a metrics or trace file, made unique to ``segment`` as segments
+        run concurrently."""
+        if path is None or not self._is_segmented(segment):
+            return path
+        return path.with_name("{}.segment-{}{}".format(path.stem, segment.start,
+                                                        path.suffix))
+
+    def main(self):
+        # Segmented and resumed runs write a range of output files, which isn't
+        # possible with writers storing all flow in one file.
+        if ((self.args.segments > 1 or self.args.resume)
+                and "index" not in parse_template_fields(self.args.dest)):
+            raise ValueError("--segments and --resume require an '{index}' "
+                             "substitution in the output template")
+        # Warm starting seeds each pair from the previous one's flow, which a
+        # segment or resumed run doesn't have for its first pair, so its output
+        # would differ from a single run's.
+        if ((self.args.segments > 1 or self.args.resume)
+                and getattr(self.args, "warm_start", False)):
+            raise ValueError("--warm-start can't be combined with --segments or "
+                             "--resume")
+        if self.args.segments > 1:
+            segments = plan_segments(
+                    int(self.video_src.frame_count),
+                    self.args.segments,
+                    stride=self.args.video_stride,
+                    dilation=self.args.video_dilation,
+                    start=self.start_frame,
+                    end=self.end_frame,
+            )
+            if len(segments) > 1:
+                run_segments(self.args, segments)
+                return
+        self.run_pipeline()
@@ -1,67 +1,408 @@
+import threading
 import time
 from collections import deque
-from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from queue import Queue
+from typing import Iterable, Iterator, Optional, Tuple
 
 from tqdm import tqdm
 
 from flowty.cv import Mat
+from flowty.cv.core import get_mat_stats, track_live_mat_bytes
+from flowty.metrics import peak_rss_bytes
+from flowty.trace import NULL_TRACER, traced_frames
+
+_END_OF_STREAM = object()
 
 
 class FlowPipe:
+    """Compute flow between frames of ``src`` and write it to ``dest``.
+
+    Args:
+        src: Iterable of frames. Sources with ``grab()`` and ``retrieve()`` methods
+            are read with those instead, so frames that are never used as a
+            reference or target (when ``stride > dilation``) aren't decoded.
+            Sources with a ``buffer_count`` attribute are set to decode into a
+            ring of ``frame_buffer_count`` buffers, enough that no frame is
+            overwritten while the pipe still uses it.
+        flow_algorithm: Callable computing flow between a reference and target frame.
+            If it has a ``preprocess`` method, each frame is passed through it once
+            after decoding rather than converted once per pair it takes part in.
+        dest: Flow sink with a ``write(flow)`` method, and optionally a ``close()``
+            method called once all flow has been written. If it has a
+            ``record_pos_ms(index, pos_ms)`` method and ``src`` a ``pos_ms``
+            attribute, it's passed the timestamp of each reference frame read
+            with ``grab()`` along with the index of the flow field from it.
+        input_transforms: Transforms applied to each frame read from ``src``.
+        output_transforms: Transforms applied to each flow field before writing.
+        stride: Number of frames between consecutive reference frames.
+        dilation: Number of frames between reference and target frames.
+        pipelined: Decode, compute flow and write in separate threads connected by
+            bounded queues so that each stage overlaps with the others.
+        queue_size: Maximum number of flow fields waiting to be computed or written,
+            in addition to those being computed by workers, when ``pipelined``.
+            Together with ``dilation`` and ``workers`` this bounds the number of
+            frames held in memory.
+        workers: Number of threads computing flow for independent frame pairs
+            concurrently. More than one worker implies ``pipelined``.
+        flow_algorithm_factory: Zero argument callable creating a new flow algorithm
+            instance, required when ``workers > 1`` as algorithms hold scratch
+            buffers and so can't be shared between threads.
+        start: Index of the first frame to read. Sources with a settable
+            ``pos_frames`` are seeked, otherwise frames before ``start`` are skipped.
+        end: Index of the frame to stop reading at (exclusive), or ``None`` to read
+            until ``src`` is exhausted.
+        warm_flow_algorithm: Algorithm taking an ``initial_flow`` keyword argument
+            used for every pair after the first, initialised with the flow of the
+            previous pair. Consecutive flow fields are similar so this can use a
+            much cheaper schedule than ``flow_algorithm``. Requires
+            ``stride == 1``, ``dilation == 1`` and a single worker, as each pair
+            depends on the last.
+        metrics: ``FlowPipeMetrics`` updated with the latency of each stage, queue
+            depths, the ``bytes_written`` of ``dest``, the ``allocation_count``
+            of ``src``, Mat counters and peak RSS as flow is computed. Memory
+            metrics are sampled whenever the metrics are collected and once
+            the run ends. Bytes referenced by live Mats are tracked during the
+            run, counting Mats created since it started.
+        tracer: ``Tracer`` recording a span for decoding and preprocessing each
+            frame and computing and writing each flow field. Spans are indexed
+            by the flow field as numbered by ``dest``'s ``frame_index``, frames
+            by the flow field they are the reference of.
+    """
+
     def __init__(self,
                  src,
                  flow_algorithm,
                  dest,
                  input_transforms=None,
                  output_transforms=None,
-                 stride=1, dilation=1):
+                 stride=1, dilation=1,
+                 pipelined=False, queue_size=8,
+                 workers=1, flow_algorithm_factory=None,
+                 start=0, end=None, warm_flow_algorithm=None, metrics=None,
+                 tracer=None):
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1 but was {}".format(queue_size))
+        if workers < 1:
+            raise ValueError("workers must be at least 1 but was {}".format(workers))
+        if workers > 1 and flow_algorithm_factory is None:
+            raise ValueError("flow_algorithm_factory is required when workers > 1")
+        if start < 0 or (end is not None and end < start):
+            raise ValueError("Invalid frame range [{}, {})".format(start, end))
+        if warm_flow_algorithm is not None and (stride != 1 or dilation != 1
+                                                or workers > 1):
+            raise ValueError("warm_flow_algorithm requires stride == 1, "
+                             "dilation == 1 and a single worker")
         self.src = src
         self.flow_algorithm = flow_algorithm
+        # Algorithms can expose a `preprocess` method converting decoded frames into
+        # the representation they compute flow on (e.g. grayscale). Applying it once
+        # per decoded frame means it is cached in the dilation window rather than
+        # being recomputed for every pair the frame takes part in.
+        self.preprocess = getattr(flow_algorithm, "preprocess", None)
         self.input_transforms = input_transforms if input_transforms is not None else []
         self.output_transforms = output_transforms if output_transforms is not None else []
         self.dest = dest
         self.stride = stride
         self.dilation = dilation
+        self.pipelined = pipelined or workers > 1
+        self.queue_size = queue_size
+        self.workers = workers
+        self.flow_algorithm_factory = flow_algorithm_factory
+        self.start = start
+        self.end = end
+        self.warm_flow_algorithm = warm_flow_algorithm
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.add_collector(self._update_memory_metrics)
+        self.tracer = tracer if tracer is not None else NULL_TRACER
+        self._previous_flow = None
+        self._first_index = 0
+        # Every algorithm instance created for workers, reused by later runs.
+        self._flow_algorithms = [flow_algorithm]
+        self._idle_flow_algorithms = []
+        self._idle_flow_algorithms_lock = threading.Lock()
+        self._worker_state = threading.local()
+        self._flow_time = 0.0
+        self._write_time = 0.0
+
+    @property
+    def frame_buffer_count(self) -> int:
+        """Number of frames that must be decoded after a frame before it can be
+        overwritten. This bounds the frames the pipe holds: the ``dilation``
+        frames waiting to be paired along with the frame being read, and when
+        ``pipelined`` both frames of each pair queued or being computed."""
+        frame_count = self.dilation + 2
+        if self.pipelined:
+            frame_count += 2 * (self.queue_size + self.workers)
+        return frame_count
+
+    def _source_frames(self) -> Iterator:
+        """Yield frames from ``start`` to ``end``, with ``None`` in place of frames
+        that are never part of a pair given the stride and dilation."""
+        if hasattr(self.src, "buffer_count"):
+            self.src.buffer_count = self.frame_buffer_count
+        skip_count = 0
+        if self.start > 0:
+            try:
+                self.src.pos_frames = self.start
+            except AttributeError:
+                skip_count = self.start
+        # Sources supporting grab/retrieve only decode the frames that are used,
+        # the others are only demuxed.
+        if hasattr(self.src, "grab") and hasattr(self.src, "retrieve"):
+            frames = self._grab_frames(skip_count)
+        else:
+            frames = iter(self.src)
+        if self.tracer.enabled:
+            frames = traced_frames(self.tracer, "decode", frames,
+                                   self._flow_index_of_frame,
+                                   first_frame=self.start - skip_count)
+        stop = None if self.end is None else skip_count + self.end - self.start
+        for i, frame in enumerate(islice(frames, skip_count, stop)):
+            yield frame if self._is_frame_used(i) else None
+
+    def _grab_frames(self, skip_count: int) -> Iterator:
+        # Writers that record the timestamp of each flow field's reference frame
+        # get it from sources reporting the position of the grabbed frame.
+        record_pos_ms = None
+        if hasattr(self.src, "pos_ms"):
+            record_pos_ms = getattr(self.dest, "record_pos_ms", None)
+        i = -skip_count
+        while self.src.grab():
+            if i >= 0 and self._is_frame_used(i):
+                if record_pos_ms is not None and i % self.stride == 0:
+                    record_pos_ms(self._first_index + i // self.stride,
+                                  self.src.pos_ms)
+                yield self.src.retrieve()
+            else:
+                yield None
+            i += 1
+
+    def _is_frame_used(self, i: int) -> bool:
+        """Whether the ``i``-th frame read is a reference or target frame."""
+        return (i % self.stride == 0
+                or (i >= self.dilation and (i - self.dilation) % self.stride == 0))
+
+    def _flow_index_of_frame(self, frame: int) -> Optional[int]:
+        """Index, as numbered by ``dest``, of the flow field ``frame`` is the
+        reference of, or the target of if it is never a reference. ``None`` if
+        the frame isn't used."""
+        i = frame - self.start
+        if i < 0:
+            return None
+        if i % self.stride == 0:
+            pair_index = i // self.stride
+        elif i >= self.dilation and (i - self.dilation) % self.stride == 0:
+            pair_index = (i - self.dilation) // self.stride
+        else:
+            return None
+        return self._first_index + pair_index
 
     def _frame_generator(self) -> Iterator:
-        for frame in iter(self.src):
-            for transform in self.input_transforms:
-                frame = transform(frame)
+        for i, frame in enumerate(self._source_frames(), self.start):
+            if frame is not None:
+                with self.tracer.span("preprocess", self._flow_index_of_frame(i),
+                                      frame=i):
+                    for transform in self.input_transforms:
+                        frame = transform(frame)
+                    if self.preprocess is not None:
+                        frame = self.preprocess(frame)
             yield frame
 
-    def run(self):
-        frame_iter = self._frame_generator()
+    def _frame_pairs(self, frames: Iterable) -> Iterator[Tuple]:
+        """Yield (reference, target) frame pairs according to stride and dilation."""
         frame_queue = deque()
-        while len(frame_queue) < self.dilation:
-            frame_queue.append(next(frame_iter))
-        assert len(frame_queue) == self.dilation
+        for i, frame in enumerate(frames):
+            frame_queue.append(frame)
+            if len(frame_queue) <= self.dilation:
+                continue
+            reference = frame_queue.popleft()
+            if (i - self.dilation) % self.stride == 0:
+                yield reference, frame
 
-        t = time.time()
+    def _progress_bar(self, frames: Iterable) -> tqdm:
         try:
-            total = int(self.src.frame_count)
+            end = int(self.src.frame_count)
         except AttributeError:
-            total = None
+            end = None
+        if self.end is not None:
+            end = self.end if end is None else min(end, self.end)
+        total = None if end is None else max(end - self.start, 0)
+        return tqdm(frames, total=total, dynamic_ncols=True)
+
+    def _set_progress_description(self, pbar: tqdm, data_load_time: float) -> None:
+        pbar.set_description("read: {:.2f}ms, compute: {:.2f}ms, write: {:.2f}ms".format(
+                data_load_time, self._flow_time, self._write_time
+        ))
+
+    def run(self):
+        self._previous_flow = None
+        # Flow writers number flow from frame_index, spans are indexed likewise
+        # so they can be matched with the writer's spans.
+        self._first_index = getattr(self.dest, "frame_index", 0)
+        if self.metrics is not None:
+            track_live_mat_bytes(True)
+        try:
+            if self.pipelined:
+                self._run_pipelined()
+            else:
+                self._run_serial()
+        finally:
+            # Writers that write in the background only report errors once
+            # they've finished writing, so they must be closed.
+            close = getattr(self.dest, "close", None)
+            if close is not None:
+                close()
+            # Some writers only know how much they've written once closed.
+            if self.metrics is not None:
+                try:
+                    self._update_write_metrics()
+                    self._update_memory_metrics()
+                finally:
+                    track_live_mat_bytes(False)
 
-        pbar = tqdm(enumerate(frame_iter), total=total, dynamic_ncols=True)
-        for i, target in pbar:
+    def _run_serial(self):
+        pbar = self._progress_bar(self._frame_generator())
+        t = time.time()
+        for i, (reference, target) in enumerate(self._frame_pairs(pbar)):
             data_load_time = (time.time() - t) * 1e3
-            reference = frame_queue.popleft()
-            frame_queue.append(target)
-            assert len(frame_queue) == self.dilation
-            if i % self.stride == 0:
-                t = time.time()
-                flow = self.flow_algorithm(reference, target)
-                flow_time = (time.time() - t) * 1e3
+            self._observe("read", data_load_time)
+            index = self._first_index + i
+            flow = self.compute_flow(reference, target, index=index)
+            self.write_flow(flow, index=index)
+            self._set_progress_description(pbar, data_load_time)
+            t = time.time()
 
-                t = time.time()
-                self.write_flow(flow)
-                write_time = (time.time() - t) * 1e3
-                pbar.set_description("read: {:.2f}ms, compute: {:.2f}ms, write: {:.2f}ms".format(
-                        data_load_time, flow_time, write_time
-                ))
+    def _run_pipelined(self):
+        # The calling thread decodes frames and assembles pairs, `workers` threads
+        # compute flow and a writer thread writes it out. Flow is passed to the
+        # writer as futures through a bounded queue in the order pairs were read,
+        # so flow is written in frame order regardless of which worker finishes
+        # first, and decoding blocks once the queue is full.
+        flow_futures = Queue(maxsize=self.queue_size + self.workers - 1)
+        errors = []
+        writer = threading.Thread(
+                target=self._write_flow_futures,
+                args=(flow_futures, errors),
+                name="FlowPipe-writer",
+                daemon=True,
+        )
+        # Worker threads belong to this run, so the instances they took in a
+        # previous run are free again.
+        self._idle_flow_algorithms = list(self._flow_algorithms)
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        writer.start()
+        try:
+            pbar = self._progress_bar(self._frame_generator())
             t = time.time()
+            for i, (reference, target) in enumerate(self._frame_pairs(pbar)):
+                if errors:
+                    break
+                data_load_time = (time.time() - t) * 1e3
+                self._observe("read", data_load_time)
+                flow_futures.put(executor.submit(self._compute_flow_in_worker,
+                                                 reference, target,
+                                                 self._first_index + i))
+                if self.metrics is not None:
+                    self.metrics.set_queue_depth("flow", flow_futures.qsize())
+                self._set_progress_description(pbar, data_load_time)
+                t = time.time()
+        finally:
+            flow_futures.put(_END_OF_STREAM)
+            writer.join()
+            executor.shutdown()
+        if errors:
+            raise errors[0]
+
+    def _write_flow_futures(self, flow_futures: Queue, errors: list) -> None:
+        i = self._first_index
+        while True:
+            flow_future = flow_futures.get()
+            if flow_future is _END_OF_STREAM:
+                return
+            # After a failure we keep draining the queue so the decoding thread
+            # never blocks, it will stop once it notices the error.
+            if errors:
+                continue
+            try:
+                self.write_flow(flow_future.result(), index=i)
+            except BaseException as e:
+                errors.append(e)
+            i += 1
+
+    def _compute_flow_in_worker(self, reference, target, index: int):
+        try:
+            flow_algorithm = self._worker_state.flow_algorithm
+        except AttributeError:
+            flow_algorithm = self._worker_state.flow_algorithm = \
+                self._acquire_flow_algorithm()
+        return self.compute_flow(reference, target, flow_algorithm=flow_algorithm,
+                                 index=index)
+
+    def _acquire_flow_algorithm(self):
+        """Take ownership of an algorithm instance for the calling worker thread.
+        Workers reuse ``flow_algorithm`` and those created in earlier runs, the
+        others create their own."""
+        with self._idle_flow_algorithms_lock:
+            if self._idle_flow_algorithms:
+                return self._idle_flow_algorithms.pop()
+        flow_algorithm = self.flow_algorithm_factory()
+        with self._idle_flow_algorithms_lock:
+            self._flow_algorithms.append(flow_algorithm)
+        return flow_algorithm
+
+    def compute_flow(self, reference, target, flow_algorithm=None, index: int = 0):
+        if flow_algorithm is None:
+            flow_algorithm = self.flow_algorithm
+        t = time.time()
+        with self.tracer.span("compute", index):
+            if self.warm_flow_algorithm is None:
+                flow = flow_algorithm(reference, target)
+            else:
+                # Only a single worker computes flow, in pair order.
+                if self._previous_flow is None:
+                    flow = flow_algorithm(reference, target)
+                else:
+                    flow = self.warm_flow_algorithm(reference, target,
+                                                    initial_flow=self._previous_flow)
+                self._previous_flow = flow
+        self._flow_time = (time.time() - t) * 1e3
+        self._observe("compute", self._flow_time)
+        return flow
+
+    def write_flow(self, flow: Mat, index: int = 0) -> None:
+        t = time.time()
+        with self.tracer.span("write", index):
+            for transform in self.output_transforms:
+                flow = transform(flow)
+            self.dest.write(flow)
+        self._write_time = (time.time() - t) * 1e3
+        self._observe("write", self._write_time)
+        if self.metrics is not None:
+            self._update_write_metrics()
+
+    def _observe(self, stage: str, duration_ms: float) -> None:
+        if self.metrics is not None:
+            self.metrics.observe(stage, duration_ms / 1e3)
+
+    def _update_write_metrics(self) -> None:
+        bytes_written = getattr(self.dest, "bytes_written", None)
+        if bytes_written is not None:
+            self.metrics.set_bytes_written(bytes_written)
+        pending_count = getattr(self.dest, "pending_count", None)
+        if pending_count is not None:
+            self.metrics.set_queue_depth("writer", pending_count)
 
-    def write_flow(self, flow: Mat) -> None:
-        for transform in self.output_transforms:
-            flow = transform(flow)
-        self.dest.write(flow)
\ No newline at end of file
+    def _update_memory_metrics(self) -> None:
+        # get_mat_stats walks every live Mat, so this is sampled by the metrics'
+        # collectors rather than run for every flow field written.
+        memory = get_mat_stats()
+        allocation_count = getattr(self.src, "allocation_count", None)
+        if allocation_count is not None:
+            memory["frame_buffer_allocations"] = allocation_count
+        peak_rss = peak_rss_bytes()
+        if peak_rss is not None:
+            memory["peak_rss_bytes"] = peak_rss
+        self.metrics.update_memory(**memory)
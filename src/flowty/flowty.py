@@ -1,29 +1,70 @@
 import argparse
-from flowty.algorithms import tvl1, brox, pyrlk, farneback, vr, dis
+import importlib
 import sys
 
-parser = argparse.ArgumentParser(
-        prog='flowty',
-        description="Compute optical flow",
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
-)
-command_parsers = parser.add_subparsers()
+# Subcommand -> (module, command class, help). Command modules import the compiled
+# OpenCV extensions (including CUDA's), so only the chosen subcommand's module is
+# imported and the others are listed from here.
+COMMANDS = {
+    "tvl1": ("flowty.algorithms.tvl1", "TvL1Command",
+             "Compute TV-L1 optical flow"),
+    "brox": ("flowty.algorithms.brox", "BroxCommand",
+             "Compute Brox optical flow (CUDA only)"),
+    "pyrlk": ("flowty.algorithms.pyrlk", "PyrLucasKanadeCommand",
+              "Compute Pyramidal Lucas-Kanade optical flow (CUDA only)"),
+    "farneback": ("flowty.algorithms.farneback", "FarnebackCommand",
+                  "Compute Farneback optical flow"),
+    "vr": ("flowty.algorithms.vr", "VariationalRefinementCommand",
+           "Compute Variational Refinement (Brox) optical flow"),
+    "dis": ("flowty.algorithms.dis", "DenseInverseSearchCommand",
+            "Compute Dense Inverse Search optical flow"),
+    "cascade": ("flowty.algorithms.cascade", "CascadeCommand",
+                "Compute Dense Inverse Search optical flow refined with TV-L1 or "
+                "variational refinement"),
+    "batch": ("flowty.batch", "BatchCommand",
+              "Compute optical flow for a manifest of videos"),
+}
 
-tvl1.TvL1Command.register_command(command_parsers)
-brox.BroxCommand.register_command(command_parsers)
-pyrlk.PyrLucasKanadeCommand.register_command(command_parsers)
-farneback.FarnebackCommand.register_command(command_parsers)
-vr.VariationalRefinementCommand.register_command(command_parsers)
-dis.DenseInverseSearchCommand.register_command(command_parsers)
+
+def load_command(name: str):
+    """Import the module implementing subcommand ``name`` and return its class."""
+    module_name, class_name, _ = COMMANDS[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_parser(command_name: str = None) -> argparse.ArgumentParser:
+    """Create the ``flowty`` argument parser with every subcommand listed, but
+    only ``command_name``'s arguments registered."""
+    parser = argparse.ArgumentParser(
+            prog='flowty',
+            description="Compute optical flow",
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    command_parsers = parser.add_subparsers()
+    for name, (_, _, help) in COMMANDS.items():
+        if name == command_name:
+            load_command(name).register_command(command_parsers)
+        else:
+            command_parsers.add_parser(name, help=help)
+    return parser
+
+
+def parse_args(argv) -> argparse.Namespace:
+    # The top level parser has no options taking values, so the first positional
+    # argument is the subcommand.
+    command_name = next((arg for arg in argv if not arg.startswith("-")), None)
+    if command_name not in COMMANDS:
+        command_name = None
+    return create_parser(command_name).parse_args(argv)
 
 
 def main(argv=None):
     if argv is None:
         argv = sys.argv[1:]
-    args = parser.parse_args(argv)
+    args = parse_args(argv)
 
     if not hasattr(args, 'command'):
-        parser.print_help()
+        create_parser().print_help()
         return 1
 
     command = args.command(args)
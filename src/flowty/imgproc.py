@@ -16,6 +16,18 @@ def quantise_flow(flow: np.ndarray, bound: float = 20) -> np.ndarray:
     return quantised_flow
 
 
+def dequantise_flow(quantised_flow: np.ndarray, bound: float = 20) -> np.ndarray:
+    """Recover a 2D vector field quantised by ``quantise_flow``
+    Args:
+        quantised_flow: 2D uint8-valued vector field.
+        bound: Bound used when quantising the flow.
+    """
+    flow = quantised_flow.astype(np.float32)
+    flow *= (2 * bound / 255)
+    flow -= bound
+    return flow
+
+
 def flow_to_hsv(flow: np.ndarray, bound: float = 20) -> np.ndarray:
     """Create HSV flow representation """
     raise NotImplementedError()
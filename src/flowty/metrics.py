@@ -0,0 +1,343 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+# Upper bounds of latency histogram buckets in seconds, spanning sub-millisecond
+# writes to multi-second flow computation at high resolutions.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+STAGES = ("read", "compute", "write")
+# Memory metrics: name -> (Prometheus metric name, type, help).
+MEMORY_METRICS = {
+    "frame_buffer_allocations": ("flowty_frame_buffer_allocations_total", "counter",
+                                 "Frame buffers allocated while decoding."),
+    "mat_allocations": ("flowty_mat_allocations_total", "counter",
+                        "Mats created in the process."),
+    "buffer_exports": ("flowty_mat_buffer_exports_total", "counter",
+                       "Mats exported through the buffer protocol."),
+    "live_mats": ("flowty_live_mats", "gauge", "Mats alive."),
+    "live_mat_bytes": ("flowty_live_mat_bytes", "gauge",
+                       "Bytes of pixel data referenced by live Mats."),
+    "live_buffer_exports": ("flowty_live_mat_buffer_exports", "gauge",
+                            "Mat buffer exports not yet released."),
+    "peak_rss_bytes": ("flowty_peak_rss_bytes", "gauge",
+                       "Peak resident set size of the process."),
+}
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of the process, or ``None`` if unknown."""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS.
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class Histogram:
+    """Cumulative histogram of observed values, as exported by Prometheus.
+
+    Args:
+        buckets: Increasing upper bounds of each bucket, a final ``+Inf`` bucket
+            is added.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.bucket_counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative_counts(self) -> List[int]:
+        counts = []
+        total = 0
+        for count in self.bucket_counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def quantile(self, q: float) -> float:
+        """Estimate the ``q``-quantile by interpolating within its bucket, as
+        Prometheus' ``histogram_quantile`` does."""
+        if self.count == 0:
+            return math.nan
+        rank = q * self.count
+        lower_bound = 0.0
+        lower_count = 0
+        for bound, count in zip(self.buckets + (self.max,), self.cumulative_counts()):
+            if count >= rank:
+                bucket_count = count - lower_count
+                if bucket_count == 0:
+                    return bound
+                fraction = (rank - lower_count) / bucket_count
+                return lower_bound + (bound - lower_bound) * fraction
+            lower_bound, lower_count = bound, count
+        return self.max
+
+    def summary(self) -> Dict:
+        """Summarise observed latencies in milliseconds."""
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": self.sum / self.count * 1e3,
+            "p50_ms": self.quantile(0.5) * 1e3,
+            "p90_ms": self.quantile(0.9) * 1e3,
+            "p99_ms": self.quantile(0.99) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+
+
+class FlowPipeMetrics:
+    """Telemetry of a ``FlowPipe`` run, updated incrementally as it runs.
+
+    Records the latency of each stage (reading a frame pair, computing flow and
+    writing it), the number of flow fields written, queue depths, bytes written
+    and the ``MEMORY_METRICS``. Metrics that are costly to measure are updated by
+    collectors, called by ``collect`` before each export rather than per flow
+    field. All methods are thread safe.
+
+    Args:
+        labels: Labels identifying the run, e.g. the video, added to every exported
+            Prometheus metric and to the JSON snapshot.
+    """
+
+    def __init__(self, labels: Optional[Dict[str, str]] = None):
+        self.labels = dict(labels) if labels is not None else {}
+        self.stage_latency = {stage: Histogram() for stage in STAGES}
+        self.flows_written = 0
+        self.bytes_written = 0
+        self.memory = {}
+        self._initial_mat_allocations = None
+        self.queue_depth = {}
+        self.start_time = time.time()
+        self.end_time = None
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stage_latency[stage].observe(seconds)
+            if stage == "write":
+                self.flows_written += 1
+
+    def set_queue_depth(self, queue: str, depth: int) -> None:
+        with self._lock:
+            self.queue_depth[queue] = depth
+
+    def set_bytes_written(self, bytes_written: int) -> None:
+        with self._lock:
+            self.bytes_written = bytes_written
+
+    def update_memory(self, **values: int) -> None:
+        """Update memory metrics, keyed by their name in ``MEMORY_METRICS``."""
+        with self._lock:
+            self.memory.update(values)
+            # Mat allocations are counted over the whole process, the first value
+            # seen is the baseline for this run's allocation rate.
+            if self._initial_mat_allocations is None and "mat_allocations" in values:
+                self._initial_mat_allocations = values["mat_allocations"]
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register ``collector`` to be called by ``collect``."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> None:
+        """Update metrics that are sampled rather than observed, e.g. memory."""
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            collector()
+
+    def finish(self) -> None:
+        with self._lock:
+            self.end_time = time.time()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            end_time = self.end_time if self.end_time is not None else time.time()
+            elapsed = end_time - self.start_time
+            return {
+                "labels": dict(self.labels),
+                "start_time": self.start_time,
+                "elapsed_seconds": elapsed,
+                "finished": self.end_time is not None,
+                "flows_written": self.flows_written,
+                "frames_per_second": self.flows_written / elapsed if elapsed > 0 else 0.0,
+                "bytes_written": self.bytes_written,
+                "memory": dict(self.memory),
+                "mat_allocations_per_second": self._mat_allocation_rate(elapsed),
+                "queue_depth": dict(self.queue_depth),
+                "stage_latency": {
+                    stage: histogram.summary()
+                    for stage, histogram in self.stage_latency.items()
+                },
+            }
+
+    def _mat_allocation_rate(self, elapsed: float) -> float:
+        if self._initial_mat_allocations is None or elapsed <= 0:
+            return 0.0
+        return (self.memory["mat_allocations"] - self._initial_mat_allocations) / elapsed
+
+    def to_prometheus(self) -> str:
+        """Format metrics in the Prometheus text exposition format, as read by the
+        node exporter's textfile collector."""
+        with self._lock:
+            elapsed = (self.end_time or time.time()) - self.start_time
+            lines = [
+                "# HELP flowty_stage_latency_seconds Latency of each FlowPipe stage.",
+                "# TYPE flowty_stage_latency_seconds histogram",
+            ]
+            for stage, histogram in self.stage_latency.items():
+                for bound, count in zip(histogram.buckets + (math.inf,),
+                                        histogram.cumulative_counts()):
+                    lines.append(_sample("flowty_stage_latency_seconds_bucket", count,
+                                         self.labels, stage=stage,
+                                         le=_format_value(bound)))
+                lines.append(_sample("flowty_stage_latency_seconds_sum", histogram.sum,
+                                     self.labels, stage=stage))
+                lines.append(_sample("flowty_stage_latency_seconds_count",
+                                     histogram.count, self.labels, stage=stage))
+            lines += [
+                "# HELP flowty_flows_written_total Flow fields written.",
+                "# TYPE flowty_flows_written_total counter",
+                _sample("flowty_flows_written_total", self.flows_written, self.labels),
+                "# HELP flowty_frames_per_second Flow fields written per second.",
+                "# TYPE flowty_frames_per_second gauge",
+                _sample("flowty_frames_per_second",
+                        self.flows_written / elapsed if elapsed > 0 else 0.0,
+                        self.labels),
+                "# HELP flowty_bytes_written_total Bytes of flow written.",
+                "# TYPE flowty_bytes_written_total counter",
+                _sample("flowty_bytes_written_total", self.bytes_written, self.labels),
+                "# HELP flowty_queue_depth Items waiting in each FlowPipe queue.",
+                "# TYPE flowty_queue_depth gauge",
+            ]
+            for queue, depth in self.queue_depth.items():
+                lines.append(_sample("flowty_queue_depth", depth, self.labels,
+                                     queue=queue))
+            for name, value in self.memory.items():
+                metric_name, metric_type, description = MEMORY_METRICS[name]
+                lines += [
+                    "# HELP {} {}".format(metric_name, description),
+                    "# TYPE {} {}".format(metric_name, metric_type),
+                    _sample(metric_name, value, self.labels),
+                ]
+            return "\n".join(lines) + "\n"
+
+
+def _sample(name: str, value, labels: Dict[str, str], **extra_labels) -> str:
+    labels = dict(labels, **extra_labels)
+    if labels:
+        name += "{" + ",".join('{}="{}"'.format(key, _escape_label(value))
+                               for key, value in labels.items()) + "}"
+    return "{} {}".format(name, _format_value(value))
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(value)
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """Write ``text`` to ``path`` by renaming a temporary file over it, so readers
+    such as the node exporter never see a partially written file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(".{}.{}.tmp".format(path.name, os.getpid()))
+    tmp_path.write_text(text)
+    os.replace(str(tmp_path), str(path))
+
+
+class MetricsExporter:
+    """Periodically write ``metrics`` to a JSON file and/or a Prometheus textfile.
+
+    Args:
+        metrics: Metrics to export.
+        json_path: Path to write a JSON snapshot of the metrics to.
+        prometheus_path: Path to write the metrics to in the Prometheus text format,
+            should be a ``.prom`` file in the node exporter's textfile directory.
+        summary_path: Path to write a JSON snapshot to once the run has finished,
+            along with ``summary_info``.
+        interval: Seconds between exports.
+        summary_info: Extra information stored in the summary, e.g. the arguments
+            flow was computed with.
+    """
+
+    def __init__(self, metrics: FlowPipeMetrics, json_path: Optional[Path] = None,
+                 prometheus_path: Optional[Path] = None,
+                 summary_path: Optional[Path] = None, interval: float = 10.0,
+                 summary_info: Optional[Dict] = None):
+        if interval <= 0:
+            raise ValueError("interval must be positive but was {}".format(interval))
+        self.metrics = metrics
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.summary_path = summary_path
+        self.interval = interval
+        self.summary_info = summary_info if summary_info is not None else {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._export_periodically,
+                                        name="MetricsExporter", daemon=True)
+        self._thread.start()
+
+    def _export_periodically(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.export()
+
+    def export(self) -> None:
+        self.metrics.collect()
+        if self.json_path is not None:
+            write_atomic(self.json_path, json.dumps(self.metrics.snapshot(), indent=2))
+        if self.prometheus_path is not None:
+            write_atomic(self.prometheus_path, self.metrics.to_prometheus())
+
+    def close(self) -> None:
+        """Stop exporting periodically and write the final metrics and summary."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.metrics.finish()
+        self.export()
+        if self.summary_path is not None:
+            summary = dict(self.summary_info, **self.metrics.snapshot())
+            write_atomic(self.summary_path, json.dumps(summary, indent=2, default=str))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,125 @@
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+
+class Segment(NamedTuple):
+    """A contiguous range of frames processed independently of the others.
+
+    Attributes:
+        start: Index of the first frame of the segment.
+        end: Index of the frame to stop reading at (exclusive), or ``None`` to read
+            until the end of the video.
+        first_index: Output index of the first flow field computed in the segment.
+    """
+    start: int
+    end: Optional[int]
+    first_index: int
+
+
+def count_flow_pairs(frame_count: int, stride: int = 1, dilation: int = 1) -> int:
+    """Number of flow fields computed from a video of ``frame_count`` frames."""
+    return max(frame_count - dilation + stride - 1, 0) // stride
+
+
+def frame_range(args: argparse.Namespace, src) -> Tuple[int, Optional[int]]:
+    """Frames of ``src`` to compute flow between as selected by the
+    ``--start-frame``/``--start-time`` and ``--end-frame``/``--end-time`` options.
+
+    Returns:
+        Index of the first frame and of the frame to stop at (exclusive), or
+        ``None`` to stop at the end of the video.
+    """
+    def time_to_frame(seconds):
+        if not src.fps > 0:
+            raise ValueError("Unable to select frames by time as the frame rate of "
+                             "{} is unknown".format(args.src))
+        return int(round(seconds * src.fps))
+
+    start = getattr(args, "start_frame", None)
+    if start is None:
+        start_time = getattr(args, "start_time", None)
+        start = 0 if start_time is None else time_to_frame(start_time)
+    end = getattr(args, "end_frame", None)
+    if end is None:
+        end_time = getattr(args, "end_time", None)
+        end = None if end_time is None else time_to_frame(end_time)
+    if start < 0 or (end is not None and end < start):
+        raise ValueError("Invalid frame range [{}, {})".format(start, end))
+    return start, end
+
+
+def plan_segments(frame_count: int, segment_count: int,
+                  stride: int = 1, dilation: int = 1,
+                  start: int = 0, end: int = None) -> List[Segment]:
+    """Split frames ``start`` up to ``end`` of a video of ``frame_count`` frames
+    into at most ``segment_count`` segments that together produce the same flow
+    fields as processing all of the frames at once.
+
+    Work is divided by frame pair rather than by frame, each segment reads the
+    ``dilation`` frames following its last reference frame so no pair is lost
+    at segment boundaries. The last segment reads up to ``end``, or until the end
+    of the video if ``end`` is ``None`` as frame counts reported by containers
+    are not always exact.
+    """
+    if segment_count < 1:
+        raise ValueError("segment_count must be at least 1 but was {}".format(
+                segment_count))
+    if end is not None:
+        frame_count = min(frame_count, end)
+    pair_count = count_flow_pairs(frame_count - start, stride, dilation)
+    segment_count = max(min(segment_count, pair_count), 1)
+    segments = []
+    for i in range(segment_count):
+        first_pair = i * pair_count // segment_count
+        end_pair = (i + 1) * pair_count // segment_count
+        if i == segment_count - 1:
+            segment_end = end
+        else:
+            segment_end = start + (end_pair - 1) * stride + dilation + 1
+        segments.append(Segment(start + first_pair * stride, segment_end,
+                                first_pair + 1))
+    return segments
+
+
+def resume_segment(segment: Segment, exists: Callable[[int], bool],
+                   stride: int = 1, dilation: int = 1) -> Segment:
+    """Return the part of ``segment`` whose output has not been written yet.
+
+    Output is assumed to be written in order so the segment resumes from the
+    first missing output index. The output before it is recomputed too as it
+    may only have been partially written when the run was interrupted.
+
+    Args:
+        segment: Segment to resume.
+        exists: Callable returning whether the output with an index exists.
+        stride: Number of frames between consecutive reference frames.
+        dilation: Number of frames between reference and target frames.
+    """
+    last_index = None
+    if segment.end is not None:
+        last_index = segment.first_index - 1 + count_flow_pairs(
+                segment.end - segment.start, stride, dilation)
+    index = segment.first_index
+    while (last_index is None or index <= last_index) and exists(index):
+        index += 1
+    index = max(index - 1, segment.first_index)
+    start = segment.start + (index - segment.first_index) * stride
+    return Segment(start, segment.end, index)
+
+
+def run_segments(args: argparse.Namespace, segments: List[Segment]) -> None:
+    """Run ``args.command`` over each segment in its own process."""
+    # Processes are spawned rather than forked as CUDA and some video backends
+    # can't be used from a child forked after they've been initialised.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(segments), mp_context=context) as executor:
+        futures = [executor.submit(_run_segment, args, segment) for segment in segments]
+        for future in futures:
+            future.result()
+
+
+def _run_segment(args: argparse.Namespace, segment: Segment) -> None:
+    command = args.command(args)
+    command.run_pipeline(segment)
@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_END_OF_FRAMES = object()
+
+
+class NullTracer:
+    """Tracer that records nothing, used when tracing is off so that spans cost a
+    method call returning a shared no-op context manager."""
+    enabled = False
+
+    def span(self, name: str, index: int, **args) -> _NullSpan:
+        return _NULL_SPAN
+
+
+NULL_TRACER = NullTracer()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "index", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, index: int, args: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.index = index
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.tracer.record(self.name, self.index, self.start, time.perf_counter_ns(),
+                           **self.args)
+
+
+class Tracer:
+    """Record spans of work done for each frame or flow field and write them in
+    the Chrome trace-event format, viewable in ``chrome://tracing`` or Perfetto.
+
+    Spans are indexed by the flow field they contribute to, as numbered by the
+    flow writer, so that all spans of a flow field are sampled together and can
+    be matched up by their ``index`` argument.
+
+    Args:
+        sample_interval: Only record spans for every ``sample_interval``-th flow
+            field, limiting the size of traces of long videos.
+    """
+    enabled = True
+
+    def __init__(self, sample_interval: int = 1):
+        if sample_interval < 1:
+            raise ValueError("sample_interval must be at least 1 but was {}".format(
+                    sample_interval))
+        self.sample_interval = sample_interval
+        self.spans = []
+        self._thread_names = {}
+        self._origin = time.perf_counter_ns()
+
+    def is_sampled(self, index: int) -> bool:
+        return index % self.sample_interval == 0
+
+    def span(self, name: str, index: int, **args):
+        """Context manager recording the time spent in its body as a span named
+        ``name`` for the flow field ``index`` on the calling thread, with any
+        further ``args`` (e.g. the frame number)."""
+        if not self.is_sampled(index):
+            return _NULL_SPAN
+        return _Span(self, name, index, args)
+
+    def record(self, name: str, index: int, start: int, end: int, **args) -> None:
+        """Record a span on the calling thread between ``start`` and ``end``, given
+        by ``time.perf_counter_ns()``."""
+        thread = threading.current_thread()
+        self._thread_names.setdefault(thread.ident, thread.name)
+        # list.append is atomic so spans can be recorded from any thread without
+        # a lock.
+        self.spans.append((name, index, start, end, thread.ident, args))
+
+    def events(self) -> List[Dict]:
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+             "args": {"name": thread_name}}
+            for tid, thread_name in self._thread_names.items()
+        ]
+        for name, index, start, end, tid, args in list(self.spans):
+            events.append({
+                "name": name,
+                "cat": "flowty",
+                "ph": "X",
+                "ts": (start - self._origin) / 1e3,
+                "dur": (end - start) / 1e3,
+                "pid": pid,
+                "tid": tid,
+                "args": dict(args, index=index),
+            })
+        return events
+
+    def write(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+
+
+def traced_frames(tracer, name: str, frames,
+                  flow_index: Callable[[int], Optional[int]], first_frame: int = 0):
+    """Yield from ``frames``, numbered from ``first_frame``, recording the time
+    taken to produce each as a span of the flow field ``flow_index(frame)``.
+    Frames for which that is ``None`` aren't recorded."""
+    frames = iter(frames)
+    frame_number = first_frame
+    while True:
+        start = time.perf_counter_ns()
+        frame = next(frames, _END_OF_FRAMES)
+        if frame is _END_OF_FRAMES:
+            return
+        index = flow_index(frame_number)
+        if index is not None and tracer.is_sampled(index):
+            tracer.record(name, index, start, time.perf_counter_ns(),
+                          frame=frame_number)
+        yield frame
+        frame_number += 1
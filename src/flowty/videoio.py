@@ -1,94 +1,863 @@
 import argparse
+import io
+import os
 import string
+import tarfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable, Iterator, Set, Tuple
 import numpy as np
 
+from flowty.cv import Mat, mat_to_array
+from flowty.cv.imgproc import quantise_flow_uv
 from flowty.cv.optflow import write_flo
-from flowty.imgproc import quantise_flow
-from .cv.imgcodecs import imwrite
+from flowty.cv.videoio import VideoSource, VideoWriter
+from flowty.imgproc import dequantise_flow
+from flowty.segments import count_flow_pairs, frame_range
+from flowty.trace import NULL_TRACER
+from .cv.imgcodecs import IMREAD_GRAYSCALE, imdecode, imencode, imwrite
 
 
 def parse_template_fields(str_template):
     return {field for (_, field, _, _) in string.Formatter().parse(str_template)}
 
 
-def get_flow_writer(args: argparse.Namespace):
+def get_flow_writer(args: argparse.Namespace, src=None):
+    """Create the writer for ``args.dest`` based on its extension.
+
+    Args:
+        args: Parsed command line arguments.
+        src: Video source flow is computed from. Used by writers that store
+            information about the source, e.g. to preallocate storage.
+    """
+    flow_dtype = getattr(args, "flow_dtype", "float32")
+
+    def numpy_writer(args):
+        if "index" in parse_template_fields(args.dest):
+            return FlowNumpyWriter(args.dest, dtype=flow_dtype)
+        stride = getattr(args, "video_stride", 1)
+        if src is None:
+            return FlowMemmapWriter(args.dest, dtype=flow_dtype, stride=stride)
+        start, end = frame_range(args, src)
+        return FlowMemmapWriter.for_source(
+                args.dest, src, stride=stride,
+                dilation=getattr(args, "video_dilation", 1), dtype=flow_dtype,
+                start=start, end=end
+        )
+
     extension_writer_map = [
         (
             ["jpeg", "jpg", "png"],
             lambda args: FlowUVImageWriter(args.dest, bound=args.bound),
         ),
-        (["np", "npy"], lambda args: FlowNumpyWriter(args.dest)),
+        (["np", "npy"], numpy_writer),
         (["flo"], lambda args: MiddleburyFlowWriter(args.dest)),
+        (
+            ["tar"],
+            lambda args: FlowShardWriter(
+                    args.dest, bound=args.bound,
+                    max_shard_size=int(getattr(args, "shard_size", 1024) * 2 ** 20),
+                    max_shard_frames=getattr(args, "shard_frames", None)
+            ),
+        ),
+        (
+            ["mp4", "mkv", "avi"],
+            lambda args: FlowVideoWriter.for_source(
+                    args.dest, src, stride=getattr(args, "video_stride", 1),
+                    bound=args.bound, fourcc=getattr(args, "fourcc", None)
+            ),
+        ),
     ]
     for extensions, writer_cls in extension_writer_map:
-        for extension in extensions:
-            if args.dest.lower().endswith("." + extension):
-                return writer_cls(args)
+        if any(args.dest.lower().endswith("." + extension) for extension in extensions):
+            writer = writer_cls(args)
+            break
     else:
         raise ValueError("Unable to retrieve flow writer for '{}'".format(args.dest))
+    writer_threads = getattr(args, "writer_threads", 0)
+    if writer_threads > 0:
+        if not writer.concurrent_writes:
+            writer_threads = 1
+        writer = AsyncFlowWriter(writer, threads=writer_threads)
+    return writer
+
+
+class FlowWriter:
+    """Base class of writers storing each flow field under an output index.
+
+    Subclasses implement ``_write(flow, index)`` and ``exists(index)``, calling
+    ``_count_bytes_written`` with the size of the data they write. Unless
+    ``concurrent_writes`` is False, ``_write`` must be safe to call from multiple
+    threads for different indices. Quantising and encoding flow are recorded as
+    spans with ``tracer``.
+    """
+    concurrent_writes = True
+    tracer = NULL_TRACER
+
+    def __init__(self):
+        self.frame_index = 1
+        self.bytes_written = 0
+        self._bytes_written_lock = threading.Lock()
+        self._created_dirs = set()
+
+    def write(self, flow: np.ndarray) -> None:
+        verify_flow_preconditions(flow)
+        self._write(flow, self.frame_index)
+        self.frame_index += 1
+
+    def exists(self, index: int) -> bool:
+        """Whether the flow with output ``index`` has already been written."""
+        raise NotImplementedError()
+
+    def exists_up_to(self, count: int) -> bool:
+        """Whether the flow with every output index from 1 to ``count`` has
+        already been written. Writers override this to probe in bulk."""
+        return all(self.exists(index) for index in range(1, count + 1))
 
+    def close(self) -> None:
+        pass
 
-class FlowUVImageWriter:
+    def _write(self, flow: np.ndarray, index: int) -> None:
+        raise NotImplementedError()
+
+    def _count_bytes_written(self, nbytes: int) -> None:
+        with self._bytes_written_lock:
+            self.bytes_written += nbytes
+
+    def _make_parent_dir(self, path: Path) -> None:
+        # Creating directories is slow on network filesystems even when they
+        # already exist, so only do it the first time a directory is seen.
+        parent = path.parent
+        if parent not in self._created_dirs:
+            parent.mkdir(exist_ok=True, parents=True)
+            self._created_dirs.add(parent)
+
+
+class FlowUVImageWriter(FlowWriter):
     def __init__(self, file_path_template: str, bound=20):
+        super().__init__()
         template_fields = parse_template_fields(file_path_template)
         if "axis" not in template_fields:
             raise ValueError("Missing '{axis}' substitution in output template")
         if "index" not in template_fields:
             raise ValueError("Missing '{index}' substitution in output template")
         self.file_path_template = file_path_template
-        self.frame_index = 1
         self.bound = bound
+        # u/v planes reused between flow fields, per thread so that writes can run
+        # concurrently from an AsyncFlowWriter.
+        self._planes = threading.local()
 
-    def write(self, flow: np.ndarray) -> None:
-        verify_flow_preconditions(flow)
+    def exists(self, index: int) -> bool:
+        return all(
+            Path(self.file_path_template.format(axis=axis, index=index)).exists()
+            for axis in ["u", "v"]
+        )
 
-        quantised_flow = quantise_flow(flow, bound=self.bound)
-        self._write_uv_images(quantised_flow)
-        self.frame_index += 1
+    def exists_up_to(self, count: int) -> bool:
+        return _paths_exist(
+            Path(self.file_path_template.format(axis=axis, index=index))
+            for index in range(1, count + 1) for axis in ["u", "v"]
+        )
 
-    def _write_uv_images(self, flow: np.ndarray) -> None:
-        u_img_path = self.file_path_template.format(axis="u", index=self.frame_index)
-        v_img_path = self.file_path_template.format(axis="v", index=self.frame_index)
+    def _write(self, flow: np.ndarray, index: int) -> None:
+        u, v = self._get_planes(flow.shape[:2])
+        with self.tracer.span("quantise", index):
+            quantise_flow_uv(np.ascontiguousarray(flow, dtype=np.float32), self.bound,
+                             u, v)
+        with self.tracer.span("encode", index):
+            self._write_uv_images(u, v, index)
+
+    def _get_planes(self, shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        planes = getattr(self._planes, "uv", None)
+        if planes is None or planes[0].shape != shape:
+            planes = self._planes.uv = (np.empty(shape, dtype=np.uint8),
+                                        np.empty(shape, dtype=np.uint8))
+        return planes
+
+    def _write_uv_images(self, u: np.ndarray, v: np.ndarray, index: int) -> None:
+        u_img_path = self.file_path_template.format(axis="u", index=index)
+        v_img_path = self.file_path_template.format(axis="v", index=index)
         for dest in [u_img_path, v_img_path]:
-            Path(dest).parent.mkdir(exist_ok=True, parents=True)
-        imwrite(u_img_path, flow[..., 0])
-        imwrite(v_img_path, flow[..., 1])
+            self._make_parent_dir(Path(dest))
+        imwrite(u_img_path, u)
+        imwrite(v_img_path, v)
+        self._count_bytes_written(os.path.getsize(u_img_path)
+                                  + os.path.getsize(v_img_path))
 
 
-class FlowNumpyWriter:
-    def __init__(self, file_path_template: str):
+class FlowNumpyWriter(FlowWriter):
+    def __init__(self, file_path_template: str, dtype="float32"):
+        super().__init__()
         if "index" not in parse_template_fields(file_path_template):
             raise ValueError("Missing '{index}' substitution in output template")
         self.file_path_template = file_path_template
-        self.frame_index = 1
+        self.dtype = np.dtype(dtype)
 
-    def write(self, flow: np.ndarray) -> None:
-        verify_flow_preconditions(flow)
-        filepath = Path(self.file_path_template.format(index=self.frame_index))
-        filepath.parent.mkdir(exist_ok=True, parents=True)
+    def exists(self, index: int) -> bool:
+        return Path(self.file_path_template.format(index=index)).exists()
 
-        with filepath.open(mode="wb") as f:
-            np.save(f, flow)
+    def exists_up_to(self, count: int) -> bool:
+        return _paths_exist(Path(self.file_path_template.format(index=index))
+                            for index in range(1, count + 1))
 
-        self.frame_index += 1
+    def _write(self, flow: np.ndarray, index: int) -> None:
+        filepath = Path(self.file_path_template.format(index=index))
+        self._make_parent_dir(filepath)
 
+        with filepath.open(mode="wb") as f:
+            np.save(f, flow.astype(self.dtype, copy=False))
+            self._count_bytes_written(f.tell())
 
-class MiddleburyFlowWriter:
+
+class MiddleburyFlowWriter(FlowWriter):
     def __init__(self, file_path_template: str):
+        super().__init__()
         if "index" not in parse_template_fields(file_path_template):
             raise ValueError("Missing '{index}' substitution in output template")
         self.file_path_template = file_path_template
-        self.frame_index = 1
+
+    def exists(self, index: int) -> bool:
+        return Path(self.file_path_template.format(index=index)).exists()
+
+    def exists_up_to(self, count: int) -> bool:
+        return _paths_exist(Path(self.file_path_template.format(index=index))
+                            for index in range(1, count + 1))
+
+    def _write(self, flow: np.ndarray, index: int) -> None:
+        filepath = Path(self.file_path_template.format(index=index))
+        self._make_parent_dir(filepath)
+
+        write_flo(flow, filepath)
+        self._count_bytes_written(filepath.stat().st_size)
+
+
+class FlowMemmapWriter(FlowWriter):
+    """Write flow fields to a single ``.npy`` file of shape (T, H, W, 2).
+
+    Each flow field is written at its index's offset with one contiguous write,
+    the header is finalised with the number of flow fields written on
+    ``close``. Until then the header reports no flow fields so an interrupted
+    run isn't mistaken for a complete one.
+
+    If the source frame of each flow field is known, it is stored alongside
+    its timestamp in a sidecar ``.index.npy`` file, see ``FlowMemmapReader``.
+    Timestamps passed to ``record_pos_ms`` are stored as they are, those of
+    other flow fields are computed from the frame rate.
+
+    Args:
+        file_path: Path to the ``.npy`` file.
+        dtype: Data type flow is stored as, e.g. float32 or float16.
+        capacity: Number of flow fields to preallocate space for.
+        stride: Number of source frames between the reference frames of
+            consecutive flow fields.
+        frame_offset: Source frame number of the first flow field's reference.
+        fps: Source frame rate, used to compute the timestamp of flow fields
+            without a recorded one.
+    """
+    header_size = 128
+
+    def __init__(self, file_path: str, dtype="float32", capacity: int = 0,
+                 stride: int = 1, frame_offset: int = 0, fps: float = None):
+        super().__init__()
+        self.file_path = Path(file_path)
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.stride = stride
+        self.frame_offset = frame_offset
+        self.fps = fps
+        self._file = None
+        self._frame_shape = None
+        self._frame_nbytes = None
+        self._frame_count = 0
+        self._pos_ms = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_source(cls, file_path: str, src, stride: int = 1, dilation: int = 1,
+                   dtype="float32", start: int = 0,
+                   end: int = None) -> "FlowMemmapWriter":
+        """Create a writer sized for and indexed by frames ``start`` up to ``end``
+        of ``src``."""
+        frame_count = int(src.frame_count)
+        if end is not None:
+            frame_count = min(frame_count, end)
+        capacity = count_flow_pairs(frame_count - start, stride, dilation)
+        return cls(file_path, dtype=dtype, capacity=capacity, stride=stride,
+                   frame_offset=start, fps=src.fps)
+
+    @property
+    def index_path(self) -> Path:
+        return index_path(self.file_path)
+
+    def exists(self, index: int) -> bool:
+        try:
+            with self.file_path.open("rb") as f:
+                np.lib.format.read_magic(f)
+                shape, _, _ = np.lib.format.read_array_header_1_0(f)
+        except (OSError, ValueError):
+            return False
+        return shape[0] >= index
+
+    def exists_up_to(self, count: int) -> bool:
+        return self.exists(count)
+
+    def record_pos_ms(self, index: int, pos_ms: float) -> None:
+        """Record the source timestamp of the reference frame of the flow field
+        with output ``index``."""
+        self._pos_ms[index] = pos_ms
+
+    def _write(self, flow: np.ndarray, index: int) -> None:
+        data = np.ascontiguousarray(flow, dtype=self.dtype)
+        with self._lock:
+            if self._file is None:
+                self._open(data.shape)
+            elif data.shape != self._frame_shape:
+                raise ValueError("Expected flow of shape {} but was {}".format(
+                        self._frame_shape, data.shape))
+            self._write_at(self._offset(index), data)
+            self._frame_count = max(self._frame_count, index)
+        self._count_bytes_written(data.nbytes)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+            self._write_at(0, self._header(self._frame_count))
+            self._file.truncate(self._offset(self._frame_count + 1))
+            self._file.close()
+            self._file = None
+        if self.fps is not None or self._pos_ms:
+            self._write_index()
+
+    def _open(self, frame_shape: Tuple[int, ...]) -> None:
+        self._frame_shape = frame_shape
+        self._frame_nbytes = int(np.prod(frame_shape)) * self.dtype.itemsize
+        self._make_parent_dir(self.file_path)
+        # Unbuffered so flow is written straight from the caller's array.
+        self._file = open(str(self.file_path), "wb+", buffering=0)
+        self._write_at(0, self._header(0))
+        if self.capacity > 0:
+            size = self._offset(self.capacity + 1)
+            try:
+                os.posix_fallocate(self._file.fileno(), 0, size)
+            except (AttributeError, OSError):
+                # Not all platforms and filesystems support preallocation, fall
+                # back to extending the file.
+                self._file.truncate(size)
+
+    def _write_at(self, offset: int, data) -> None:
+        # Unbuffered writes can write fewer bytes than asked, e.g. when
+        # interrupted by a signal, so write until all of data has been written.
+        view = memoryview(data).cast("B")
+        self._file.seek(offset)
+        while view:
+            written = self._file.write(view)
+            if not written:
+                raise OSError("Unable to write flow to {}".format(self.file_path))
+            view = view[written:]
+
+    def _offset(self, index: int) -> int:
+        return self.header_size + (index - 1) * self._frame_nbytes
+
+    def _header(self, frame_count: int) -> bytes:
+        header = "{{'descr': {!r}, 'fortran_order': False, 'shape': {!r}, }}".format(
+                np.lib.format.dtype_to_descr(self.dtype),
+                (frame_count,) + tuple(self._frame_shape),
+        )
+        magic = np.lib.format.magic(1, 0)
+        # The header is padded to a fixed size so it can be rewritten in place.
+        header_length = self.header_size - len(magic) - 2
+        header = header.ljust(header_length - 1) + "\n"
+        if len(header) != header_length:
+            raise ValueError("Header for shape {} is too long".format(self._frame_shape))
+        return magic + header_length.to_bytes(2, "little") + header.encode("latin1")
+
+    def _write_index(self) -> None:
+        frames = self.frame_offset + self.stride * np.arange(self._frame_count)
+        index = np.empty(self._frame_count, dtype=FLOW_INDEX_DTYPE)
+        index["frame"] = frames
+        index["pos_ms"] = frames * 1000 / self.fps if self.fps else np.nan
+        for i, pos_ms in self._pos_ms.items():
+            if 1 <= i <= self._frame_count:
+                index["pos_ms"][i - 1] = pos_ms
+        np.save(str(self.index_path), index)
+
+
+FLOW_INDEX_DTYPE = np.dtype([("frame", np.int64), ("pos_ms", np.float64)])
+
+
+def index_path(flow_path) -> Path:
+    """Path of the sidecar index of a single file flow store."""
+    flow_path = Path(flow_path)
+    return flow_path.with_name(flow_path.stem + ".index.npy")
+
+
+class FlowMemmapReader:
+    """Random access to flow written by ``FlowMemmapWriter`` without copying.
+
+    Args:
+        file_path: Path to the ``.npy`` file.
+
+    Attributes:
+        flow: Memory mapped flow of shape (T, H, W, 2), ``flow[i]`` is the flow
+            field with output index ``i + 1``.
+        frames: Source frame number of each flow field's reference frame, or
+            ``None`` if there is no sidecar index.
+        pos_ms: Timestamp of each flow field's reference frame in milliseconds
+            as reported by the source when it was decoded, or computed as
+            ``frame * 1000 / fps`` if it wasn't, ``None`` if there is no
+            sidecar index.
+    """
+
+    def __init__(self, file_path: str):
+        self.flow = np.load(str(file_path), mmap_mode="r")
+        self.frames = None
+        self.pos_ms = None
+        sidecar_path = index_path(file_path)
+        if sidecar_path.exists():
+            index = np.load(str(sidecar_path))
+            self.frames = index["frame"]
+            self.pos_ms = index["pos_ms"]
+
+    def __len__(self) -> int:
+        return len(self.flow)
+
+    def __getitem__(self, item) -> np.ndarray:
+        return self.flow[item]
+
+
+class FlowVideoWriter(FlowWriter):
+    """Encode quantised flow as grayscale video.
+
+    If ``file_path_template`` has an ``{axis}`` field the u and v components
+    are written to separate videos, otherwise they're stacked vertically in a
+    single video with frames twice the height of the flow. Flow must be written
+    in order, see ``FlowVideoReader`` for reading it back.
+
+    Args:
+        file_path_template: Path to the video, e.g. ``flow/{axis}.mp4``.
+        bound: Max magnitude of flow, values above this are clipped.
+        fps: Frame rate of the video.
+        fourcc: 4 character code of the codec used to encode the video, defaults
+            to one supported by the container, see ``default_fourccs``.
+        backend: Backend to use to encode video.
+    """
+    default_fourccs = {"mp4": "mp4v", "mkv": "FFV1", "avi": "MJPG"}
+    concurrent_writes = False
+
+    def __init__(self, file_path_template: str, bound=20, fps: float = 25,
+                 fourcc: str = None, backend: str = "ffmpeg"):
+        super().__init__()
+        if fourcc is None:
+            extension = file_path_template.rsplit(".", 1)[-1].lower()
+            try:
+                fourcc = self.default_fourccs[extension]
+            except KeyError:
+                raise ValueError("No default fourcc for '{}', please specify "
+                                 "one".format(file_path_template))
+        self.file_path_template = file_path_template
+        self.separate_axes = "axis" in parse_template_fields(file_path_template)
+        self.bound = bound
+        self.fps = fps
+        self.fourcc = fourcc
+        self.backend = backend
+        self._video_writers = None
+        self._frame_shape = None
+        self._written_count = None
+
+    @classmethod
+    def for_source(cls, file_path_template: str, src=None, stride: int = 1,
+                   **kwargs) -> "FlowVideoWriter":
+        """Create a writer whose frame rate matches flow computed from ``src``."""
+        if src is not None and src.fps > 0:
+            kwargs["fps"] = src.fps / stride
+        return cls(file_path_template, **kwargs)
+
+    @property
+    def file_paths(self):
+        if self.separate_axes:
+            return [self.file_path_template.format(axis=axis) for axis in ["u", "v"]]
+        return [self.file_path_template]
+
+    def written_count(self) -> int:
+        """Number of flow fields in the video(s) already written, probed once so
+        that checking ``exists`` for every index only opens them once."""
+        if self._written_count is None:
+            try:
+                self._written_count = int(min(
+                        VideoSource(file_path, backend=self.backend).frame_count
+                        for file_path in self.file_paths
+                ))
+            except RuntimeError:
+                self._written_count = 0
+        return self._written_count
+
+    def exists(self, index: int) -> bool:
+        return self.written_count() >= index
+
+    def exists_up_to(self, count: int) -> bool:
+        return self.exists(count)
+
+    def _write(self, flow: np.ndarray, index: int) -> None:
+        if self._video_writers is None:
+            self._open(flow.shape[:2])
+        elif flow.shape[:2] != self._frame_shape:
+            raise ValueError("Expected flow of shape {} but was {}".format(
+                    self._frame_shape, flow.shape[:2]))
+        with self.tracer.span("quantise", index):
+            quantise_flow_uv(np.ascontiguousarray(flow, dtype=np.float32), self.bound,
+                             self._u, self._v)
+        with self.tracer.span("encode", index):
+            for video_writer, frame in zip(self._video_writers, self._frames):
+                video_writer.write(Mat.fromarray(frame))
+
+    def close(self) -> None:
+        if self._video_writers is None:
+            return
+        for video_writer in self._video_writers:
+            video_writer.release()
+        self._video_writers = None
+        self._written_count = None
+        # Encoders buffer frames so the size written is only known once closed.
+        self._count_bytes_written(sum(os.path.getsize(file_path)
+                                      for file_path in self.file_paths))
+
+    def _open(self, frame_shape: Tuple[int, int]) -> None:
+        # Opening the videos truncates them.
+        self._written_count = None
+        height, width = frame_shape
+        if self.separate_axes:
+            self._u = np.empty(frame_shape, dtype=np.uint8)
+            self._v = np.empty(frame_shape, dtype=np.uint8)
+            self._frames = [self._u, self._v]
+        else:
+            frame = np.empty((2 * height, width), dtype=np.uint8)
+            self._u, self._v = frame[:height], frame[height:]
+            self._frames = [frame]
+            height = 2 * height
+        self._frame_shape = frame_shape
+        self._video_writers = []
+        for file_path in self.file_paths:
+            self._make_parent_dir(Path(file_path))
+            self._video_writers.append(VideoWriter(
+                    file_path, self.fourcc, self.fps, height, width,
+                    backend=self.backend, is_color=False
+            ))
+
+
+SHARD_INDEX_DTYPE = np.dtype([
+    ("index", np.int64),
+    ("u_offset", np.int64), ("u_size", np.int64),
+    ("v_offset", np.int64), ("v_size", np.int64),
+])
+
+
+class FlowShardWriter(FlowWriter):
+    """Append quantised u/v JPEGs to tar shards.
+
+    Flow with index ``i`` is stored as the members ``{i:08d}.u.jpg`` and
+    ``{i:08d}.v.jpg`` in the style of WebDataset, and a new shard is started
+    once the current one would exceed ``max_shard_size`` bytes or
+    ``max_shard_frames`` flow fields. When a shard is closed, the offset and
+    size of each member is recorded in a sidecar ``.index.npy`` so flow can be
+    read without scanning the shard.
+
+    Args:
+        file_path_template: Path to shards with a ``{shard}`` field, e.g.
+            ``flow/shard-{shard:05d}.tar``.
+        bound: Max magnitude of flow, values above this are clipped.
+        max_shard_size: Maximum size of a shard in bytes.
+        max_shard_frames: Maximum number of flow fields in a shard, or ``None``
+            for no limit.
+    """
+    concurrent_writes = False
+
+    def __init__(self, file_path_template: str, bound=20,
+                 max_shard_size: int = 2 ** 30, max_shard_frames: int = None):
+        super().__init__()
+        if "shard" not in parse_template_fields(file_path_template):
+            raise ValueError("Missing '{shard}' substitution in output template")
+        self.file_path_template = file_path_template
+        self.bound = bound
+        self.max_shard_size = max_shard_size
+        self.max_shard_frames = max_shard_frames
+        self.shard = 0
+        self._tar = None
+        self._index = []
+        self._written_indices = None
+        self._u = self._v = None
+
+    def written_indices(self) -> Set[int]:
+        """Indices of flow in the shards already written, read from their indices
+        once so that checking ``exists`` for every index doesn't reread them."""
+        if self._written_indices is None:
+            self._written_indices = {
+                int(index)
+                for shard_index in _read_shard_indices(self.file_path_template)
+                for index in shard_index["index"]
+            }
+        return self._written_indices
+
+    def exists(self, index: int) -> bool:
+        return index in self.written_indices()
+
+    def exists_up_to(self, count: int) -> bool:
+        return self.written_indices().issuperset(range(1, count + 1))
+
+    def _write(self, flow: np.ndarray, index: int) -> None:
+        if self._u is None or self._u.shape != flow.shape[:2]:
+            self._u = np.empty(flow.shape[:2], dtype=np.uint8)
+            self._v = np.empty(flow.shape[:2], dtype=np.uint8)
+        with self.tracer.span("quantise", index):
+            quantise_flow_uv(np.ascontiguousarray(flow, dtype=np.float32), self.bound,
+                             self._u, self._v)
+        with self.tracer.span("encode", index):
+            u_jpg = imencode(".jpg", self._u)
+            v_jpg = imencode(".jpg", self._v)
+
+        if self._tar is not None and self._is_full(len(u_jpg), len(v_jpg)):
+            self._close_shard()
+            self.shard += 1
+        if self._tar is None:
+            self._open_shard()
+        key = "{:08d}".format(index)
+        shard_offset = self._tar.offset
+        u_offset = self._add_member(key + ".u.jpg", u_jpg)
+        v_offset = self._add_member(key + ".v.jpg", v_jpg)
+        self._index.append((index, u_offset, len(u_jpg), v_offset, len(v_jpg)))
+        self._count_bytes_written(self._tar.offset - shard_offset)
+
+    def close(self) -> None:
+        if self._tar is not None:
+            self._close_shard()
+
+    def _is_full(self, *member_sizes: int) -> bool:
+        if self.max_shard_frames is not None and len(self._index) >= self.max_shard_frames:
+            return True
+        # Members have a header block and are padded to a whole number of blocks,
+        # archives end with two empty blocks and are padded to a whole record.
+        size = self._tar.offset + 2 * tarfile.BLOCKSIZE
+        for member_size in member_sizes:
+            size += tarfile.BLOCKSIZE + _round_up(member_size, tarfile.BLOCKSIZE)
+        return _round_up(size, tarfile.RECORDSIZE) > self.max_shard_size
+
+    def _open_shard(self) -> None:
+        shard_path = Path(self.file_path_template.format(shard=self.shard))
+        self._make_parent_dir(shard_path)
+        self._tar = tarfile.open(str(shard_path), mode="w", format=tarfile.USTAR_FORMAT)
+        self._index = []
+        # Opening a shard truncates it.
+        self._written_indices = None
+
+    def _add_member(self, name: str, data: bytes) -> int:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        data_offset = self._tar.offset + len(
+                info.tobuf(self._tar.format, self._tar.encoding, self._tar.errors))
+        self._tar.addfile(info, io.BytesIO(data))
+        return data_offset
+
+    def _close_shard(self) -> None:
+        shard_path = self.file_path_template.format(shard=self.shard)
+        self._tar.close()
+        self._tar = None
+        np.save(str(index_path(shard_path)),
+                np.array(self._index, dtype=SHARD_INDEX_DTYPE))
+        self._written_indices = None
+
+
+def _round_up(size: int, multiple: int) -> int:
+    return -(-size // multiple) * multiple
+
+
+def _shard_paths(file_path_template: str) -> Iterator[str]:
+    shard = 0
+    while True:
+        shard_path = file_path_template.format(shard=shard)
+        if not os.path.exists(shard_path):
+            return
+        yield shard_path
+        shard += 1
+
+
+def _read_shard_indices(file_path_template: str) -> Iterator[np.ndarray]:
+    for shard_path in _shard_paths(file_path_template):
+        shard_index_path = index_path(shard_path)
+        if not shard_index_path.exists():
+            return
+        yield np.load(str(shard_index_path))
+
+
+class FlowShardReader:
+    """Stream flow from tar shards written by ``FlowShardWriter``.
+
+    Shards are read sequentially, iterating over the reader yields the index
+    and float32 flow field of shape (H, W, 2) of each flow stored.
+
+    Args:
+        file_path_template: Path to shards with a ``{shard}`` field, e.g.
+            ``flow/shard-{shard:05d}.tar``.
+        bound: Bound the flow was quantised with.
+    """
+
+    def __init__(self, file_path_template: str, bound=20):
+        if "shard" not in parse_template_fields(file_path_template):
+            raise ValueError("Missing '{shard}' substitution in shard template")
+        self.file_path_template = file_path_template
+        self.bound = bound
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        for shard_path in _shard_paths(self.file_path_template):
+            with tarfile.open(shard_path, mode="r|") as tar:
+                planes = {}
+                for member in tar:
+                    key, axis, _ = member.name.split(".")
+                    planes[axis] = imdecode(tar.extractfile(member).read(),
+                                            IMREAD_GRAYSCALE)
+                    if len(planes) == 2:
+                        quantised_flow = np.concatenate([planes["u"], planes["v"]],
+                                                        axis=-1)
+                        yield int(key), dequantise_flow(quantised_flow,
+                                                        bound=self.bound)
+                        planes = {}
+
+
+class FlowVideoReader:
+    """Decode flow written by ``FlowVideoWriter``.
+
+    Iterating over the reader yields float32 flow fields of shape (H, W, 2).
+
+    Args:
+        file_path_template: Path the flow was written to, e.g. ``flow/{axis}.mp4``.
+        bound: Bound the flow was quantised with.
+        backend: Backend to use to decode video.
+    """
+
+    def __init__(self, file_path_template: str, bound=20, backend: str = "ffmpeg"):
+        self.file_path_template = file_path_template
+        self.bound = bound
+        self.backend = backend
+
+    def __iter__(self):
+        if "axis" in parse_template_fields(self.file_path_template):
+            u_src, v_src = [
+                VideoSource(self.file_path_template.format(axis=axis),
+                            backend=self.backend, color="gray")
+                for axis in ["u", "v"]
+            ]
+            for u_frame, v_frame in zip(u_src, v_src):
+                quantised_flow = np.stack([mat_to_array(u_frame)[..., 0],
+                                           mat_to_array(v_frame)[..., 0]], axis=-1)
+                yield dequantise_flow(quantised_flow, bound=self.bound)
+        else:
+            for frame in VideoSource(self.file_path_template, backend=self.backend,
+                                     color="gray"):
+                gray = mat_to_array(frame)[..., 0]
+                height = gray.shape[0] // 2
+                quantised_flow = np.stack([gray[:height], gray[height:]], axis=-1)
+                yield dequantise_flow(quantised_flow, bound=self.bound)
+
+
+class AsyncFlowWriter:
+    """Write flow in background threads using another writer.
+
+    Encoding and IO for consecutive flow fields run concurrently on ``threads``
+    threads. Writes complete in order: an error writing a flow field is raised
+    from a later call to ``write`` or from ``close``, after the flow fields
+    before it have been written.
+
+    Args:
+        writer: Writer implementing ``_write(flow, index)``.
+        threads: Number of threads writing flow.
+        max_pending: Maximum number of flow fields waiting to be written before
+            ``write`` blocks, defaults to twice the number of threads.
+    """
+
+    def __init__(self, writer: FlowWriter, threads: int = 4, max_pending: int = None):
+        if threads < 1:
+            raise ValueError("threads must be at least 1 but was {}".format(threads))
+        self.writer = writer
+        self.max_pending = max_pending if max_pending is not None else 2 * threads
+        self._executor = ThreadPoolExecutor(max_workers=threads,
+                                            thread_name_prefix="AsyncFlowWriter")
+        self._pending = deque()
+
+    @property
+    def frame_index(self) -> int:
+        return self.writer.frame_index
+
+    @property
+    def bytes_written(self) -> int:
+        return self.writer.bytes_written
+
+    @property
+    def tracer(self):
+        return self.writer.tracer
+
+    @tracer.setter
+    def tracer(self, tracer) -> None:
+        self.writer.tracer = tracer
+
+    @property
+    def pending_count(self) -> int:
+        """Number of flow fields submitted but not yet known to be written."""
+        return len(self._pending)
+
+    @frame_index.setter
+    def frame_index(self, frame_index: int) -> None:
+        self.writer.frame_index = frame_index
 
     def write(self, flow: np.ndarray) -> None:
         verify_flow_preconditions(flow)
-        filepath = Path(self.file_path_template.format(index=self.frame_index))
-        filepath.parent.mkdir(exist_ok=True, parents=True)
+        while self._pending and (self._pending[0].done()
+                                 or len(self._pending) >= self.max_pending):
+            self._pending.popleft().result()
+        self._pending.append(
+                self._executor.submit(self.writer._write, flow, self.writer.frame_index)
+        )
+        self.writer.frame_index += 1
 
-        write_flo(flow, filepath)
+    def exists(self, index: int) -> bool:
+        return self.writer.exists(index)
 
-        self.frame_index += 1
+    def exists_up_to(self, count: int) -> bool:
+        return self.writer.exists_up_to(count)
+
+    def record_pos_ms(self, index: int, pos_ms: float) -> None:
+        record_pos_ms = getattr(self.writer, "record_pos_ms", None)
+        if record_pos_ms is not None:
+            record_pos_ms(index, pos_ms)
+
+    def close(self) -> None:
+        """Wait for pending flow to be written, then close the wrapped writer, even
+        if a write failed, so it writes out anything it holds (e.g. indices)."""
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._executor.shutdown()
+            self.writer.close()
+
+
+def _paths_exist(paths: Iterable[Path]) -> bool:
+    """Whether all of ``paths`` exist, listing each directory once rather than
+    checking each path, which is much faster on network filesystems."""
+    listings = {}
+    for path in paths:
+        names = listings.get(path.parent)
+        if names is None:
+            try:
+                names = listings[path.parent] = set(os.listdir(str(path.parent)))
+            except OSError:
+                return False
+        if path.name not in names:
+            return False
+    return True
 
 
 def verify_flow_preconditions(flow: np.ndarray):
@@ -1,4 +1,6 @@
+import numpy as np
 import pytest
+from numpy.testing import assert_allclose
 
 from flowty.cv.videoio import VideoSource
 from ....resources import VIDEO_PATHS
@@ -57,6 +59,80 @@ class TestVideoSource:
     def test_backend_property(self):
         assert 'ffmpeg' == self.get_ffmpeg_src().backend
 
+    def test_seek_frame(self):
+        src = self.get_ffmpeg_src()
+        src.seek_frame(100)
+        assert 100 == src.pos_frames
+        n_frames = sum(1 for _ in src)
+        assert self.expected_frame_count - 100 == n_frames
+
+    def test_pos_frames_setter_seeks(self):
+        src = self.get_ffmpeg_src()
+        src.pos_frames = 10
+        assert 10 == src.pos_frames
+
+    def test_seek_ms(self):
+        src = self.get_ffmpeg_src()
+        src.seek_ms(1000)
+        assert 30 == src.pos_frames
+
+    def test_grab_and_retrieve(self):
+        src = self.get_ffmpeg_src()
+        grabbed_count = 0
+        while src.grab():
+            grabbed_count += 1
+            if grabbed_count == 10:
+                assert self.expected_shape == src.retrieve().shape
+        assert self.expected_frame_count == grabbed_count
+
+    def test_gray_frames(self):
+        src = VideoSource(VIDEO_PATHS['mp4'], backend='ffmpeg', color='gray')
+        assert 'gray' == src.color
+        assert self.expected_shape[:2] + (1,) == next(src).shape
+
+    def test_gray_frames_match_converted_bgr_frames(self):
+        gray_frame = next(VideoSource(VIDEO_PATHS['mp4'], color='gray'))
+        bgr_frame = next(self.get_ffmpeg_src()).asarray()
+        # FFmpeg doesn't support disabling RGB conversion, so gray frames are
+        # converted from BGR with BT.601 weights. OpenCV rounds these to fixed
+        # point, differently between versions and builds, so allow off by one.
+        expected = bgr_frame @ np.array([0.114, 0.587, 0.299])
+        assert_allclose(gray_frame.asarray()[..., 0], expected, atol=1)
+
+    def test_gstreamer_gray_frames_are_read_from_luma(self):
+        gray_frame = next(VideoSource(VIDEO_PATHS['mp4'], backend='gstreamer',
+                                      color='gray'), None)
+        if gray_frame is None:
+            pytest.skip("OpenCV is built without GStreamer")
+        bgr_frame = next(VideoSource(VIDEO_PATHS['mp4'], backend='gstreamer'))
+        assert self.expected_shape[:2] + (1,) == gray_frame.shape
+        # Expanded luma matches gray converted from BGR up to the rounding of
+        # each conversion, and BGR values clipped to [0, 255].
+        expected = bgr_frame.asarray() @ np.array([0.114, 0.587, 0.299])
+        assert np.abs(gray_frame.asarray()[..., 0] - expected).mean() < 1
+
+    def test_raises_error_on_unknown_color(self):
+        with pytest.raises(ValueError):
+            VideoSource(VIDEO_PATHS['mp4'], color='rgb')
+
+    def test_frame_buffers_are_reused_once_allocated(self):
+        src = VideoSource(VIDEO_PATHS['mp4'], buffer_count=3)
+        first_frames = [next(src).asarray().copy() for _ in range(3)]
+        allocation_count = src.allocation_count
+        assert allocation_count == 3
+        frames = [next(src) for _ in range(20)]
+        assert allocation_count == src.allocation_count
+        # Frames share the buffers they were decoded into.
+        assert np.shares_memory(frames[0].asarray(), frames[3].asarray())
+        assert not np.shares_memory(frames[0].asarray(), frames[1].asarray())
+        assert not np.array_equal(first_frames[0], frames[-3].asarray())
+
+    def test_frame_buffers_are_allocated_per_frame_by_default(self):
+        src = self.get_ffmpeg_src()
+        for _ in range(5):
+            next(src)
+        assert 5 == src.allocation_count
+
     def test_raises_error_if_video_dosent_exist(self):
         with pytest.raises(RuntimeError):
             VideoSource('/tmp/invalid-video.mp4')
@@ -1,4 +1,5 @@
 import argparse
+import threading
 from abc import ABC
 from pathlib import Path
 
@@ -7,10 +8,21 @@ import pytest
 from imageio import imread
 from numpy.testing import assert_array_almost_equal, assert_allclose
 
+import flowty.videoio
+from flowty.cv.imgcodecs import imdecode
 from flowty.cv.optflow import read_flo
+from flowty.trace import Tracer
 from flowty.videoio import (
+    AsyncFlowWriter,
     FlowUVImageWriter,
     FlowNumpyWriter,
+    FlowMemmapReader,
+    FlowMemmapWriter,
+    FlowShardReader,
+    FlowShardWriter,
+    FlowVideoReader,
+    FlowVideoWriter,
+    FlowWriter,
     MiddleburyFlowWriter,
     get_flow_writer,
 )
@@ -27,14 +39,49 @@ class TestGetFlowWriter:
         writer = get_flow_writer(self.create_args(extension))
         assert isinstance(writer, FlowNumpyWriter)
 
+    def test_npy_without_index_returns_flow_memmap_writer(self):
+        args = argparse.Namespace(dest="path/flow.npy", flow_dtype="float16")
+        writer = get_flow_writer(args)
+        assert isinstance(writer, FlowMemmapWriter)
+        assert writer.dtype == np.float16
+
     def test_flo_returns_middlebury_flow_writer(self):
         writer = get_flow_writer(self.create_args("flo"))
         assert isinstance(writer, MiddleburyFlowWriter)
 
+    @pytest.mark.parametrize("extension", ["mp4", "mkv", "avi", "MP4"])
+    def test_video_extensions_return_flow_video_writer(self, extension):
+        writer = get_flow_writer(self.create_args(extension, bound=20))
+        assert isinstance(writer, FlowVideoWriter)
+
+    @pytest.mark.parametrize("extension,fourcc", [("mp4", "mp4v"), ("mkv", "FFV1"),
+                                                  ("avi", "MJPG")])
+    def test_video_fourcc_defaults_to_container_codec(self, extension, fourcc):
+        writer = get_flow_writer(self.create_args(extension, bound=20))
+        assert writer.fourcc == fourcc
+
+    def test_video_writer_is_written_from_a_single_thread(self):
+        writer = get_flow_writer(self.create_args("mkv", bound=20, writer_threads=4))
+        assert isinstance(writer, AsyncFlowWriter)
+        assert writer._executor._max_workers == 1
+
+    def test_tar_returns_flow_shard_writer(self):
+        args = argparse.Namespace(dest="flow/shard-{shard:05d}.tar", bound=20,
+                                  shard_size=1, shard_frames=100)
+        writer = get_flow_writer(args)
+        assert isinstance(writer, FlowShardWriter)
+        assert writer.max_shard_size == 2 ** 20
+        assert writer.max_shard_frames == 100
+
     def test_raises_error_on_unknown_extension(self):
         with pytest.raises(ValueError):
             get_flow_writer(self.create_args("asdf"))
 
+    def test_writer_threads_returns_async_flow_writer(self):
+        writer = get_flow_writer(self.create_args("npy", writer_threads=2))
+        assert isinstance(writer, AsyncFlowWriter)
+        assert isinstance(writer.writer, FlowNumpyWriter)
+
     def test_bound_set_in_uv_flow_writer(self):
         bound = 25
         writer = get_flow_writer(self.create_args('jpg', bound=bound))
@@ -75,6 +122,34 @@ class AbstractTestFlowWriter(ABC):
         self.assert_flow_exists(tmp_path, index=0)
         self.assert_flow_equal(tmp_path, index=0, flow=flow)
 
+    def test_exists_only_for_written_flow(self, tmp_path):
+        image_writer = self.get_flow_writer(tmp_path)
+        flow = np.zeros((5, 5, 2), dtype=np.float32)
+        assert not image_writer.exists(1)
+
+        image_writer.write(flow)
+
+        assert image_writer.exists(1)
+        assert not image_writer.exists(2)
+
+    def test_exists_up_to_only_once_every_index_is_written(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        for _ in range(2):
+            writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+        writer.close()
+
+        assert writer.exists_up_to(2)
+        assert not writer.exists_up_to(3)
+
+    def test_bytes_written_counts_data_written_to_disk(self, tmp_path):
+        image_writer = self.get_flow_writer(tmp_path)
+        assert image_writer.bytes_written == 0
+
+        image_writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+        image_writer.close()
+
+        assert 0 < image_writer.bytes_written <= directory_size(tmp_path)
+
     def get_flow_writer(self, tmp_path):
         raise NotImplementedError()
 
@@ -94,6 +169,16 @@ class TestFlowUVImageWriter(AbstractTestFlowWriter):
         with pytest.raises(ValueError):
             FlowUVImageWriter("flow/{axis}/frame.jpg")
 
+    def test_quantising_and_encoding_are_traced(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        writer.tracer = Tracer()
+
+        writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+
+        assert [(name, index) for name, index, *_ in writer.tracer.spans] == [
+            ("quantise", 1), ("encode", 1),
+        ]
+
     def get_flow_writer(self, tmp_path):
         filename_template = tmp_path / "{axis}/{index:05d}.jpg"
         return FlowUVImageWriter(str(filename_template))
@@ -126,6 +211,15 @@ class TestFlowNumpyWriter(AbstractTestFlowWriter):
         loaded_flow = np.load(tmp_dir / "frame_{:05d}.npy".format(index + 1))
         assert_array_almost_equal(loaded_flow, flow)
 
+    def test_exists_up_to_requires_no_missing_indices(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        for _ in range(3):
+            writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+        writer.close()
+        (tmp_path / "frame_00002.npy").unlink()
+
+        assert not writer.exists_up_to(3)
+
     def get_flow_writer(self, tmp_path):
         filename_template = tmp_path / "frame_{index:05d}.npy"
         return FlowNumpyWriter(str(filename_template))
@@ -148,3 +242,406 @@ class TestFlowMiddleburyWriter(AbstractTestFlowWriter):
     def get_flow_writer(self, tmp_path):
         filename_template = tmp_path / "frame_{index:05d}.flo"
         return MiddleburyFlowWriter(str(filename_template))
+
+
+class TestAsyncFlowWriter(TestFlowNumpyWriter):
+    def test_flow_is_written_under_consecutive_indices(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        flows = [np.full((5, 5, 2), i, dtype=np.float32) for i in range(20)]
+        for flow in flows:
+            writer.write(flow)
+        writer.close()
+
+        for index, flow in enumerate(flows):
+            self.assert_flow_equal(tmp_path, index=index, flow=flow)
+
+    def test_frame_index_is_shared_with_wrapped_writer(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        writer.frame_index = 5
+        writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+        writer.close()
+
+        assert writer.writer.frame_index == 6
+        self.assert_flow_exists(tmp_path, index=4)
+
+    def test_write_errors_are_raised_on_close(self):
+        all_written = threading.Event()
+
+        class FailingWriter(FlowWriter):
+            def _write(self, flow, index):
+                all_written.wait()
+                if index == 3:
+                    raise IOError("disk full")
+
+        writer = AsyncFlowWriter(FailingWriter(), threads=2, max_pending=100)
+        for _ in range(5):
+            writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+        all_written.set()
+        with pytest.raises(IOError, match="disk full"):
+            writer.close()
+
+    def test_wrapped_writer_is_closed_when_a_write_failed(self):
+        class FailingWriter(FlowWriter):
+            closed = False
+
+            def _write(self, flow, index):
+                raise IOError("disk full")
+
+            def close(self):
+                self.closed = True
+
+        writer = AsyncFlowWriter(FailingWriter(), threads=1)
+        writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+        with pytest.raises(IOError, match="disk full"):
+            writer.close()
+
+        assert writer.writer.closed
+
+    def test_write_errors_are_raised_from_later_writes(self):
+        class FailingWriter(FlowWriter):
+            def _write(self, flow, index):
+                raise IOError("disk full")
+
+        writer = AsyncFlowWriter(FailingWriter(), threads=1, max_pending=1)
+        writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+        with pytest.raises(IOError, match="disk full"):
+            writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+
+    def test_saving_single_flow_image(self, tmp_path):
+        image_writer = self.get_flow_writer(tmp_path)
+        flow = np.random.uniform(
+            low=-self.bound, high=self.bound, size=(5, 5, 2)
+        ).astype(np.float32)
+
+        image_writer.write(flow)
+        image_writer.close()
+
+        self.assert_flow_exists(tmp_path, index=0)
+        self.assert_flow_equal(tmp_path, index=0, flow=flow)
+
+    def test_exists_only_for_written_flow(self, tmp_path):
+        image_writer = self.get_flow_writer(tmp_path)
+        assert not image_writer.exists(1)
+
+        image_writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+        image_writer.close()
+
+        assert image_writer.exists(1)
+        assert not image_writer.exists(2)
+
+    def get_flow_writer(self, tmp_path):
+        return AsyncFlowWriter(super().get_flow_writer(tmp_path), threads=4)
+
+
+class TestFlowMemmapWriter(AbstractTestFlowWriter):
+    def test_flow_is_stored_in_a_single_file(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        flows = [np.full((4, 6, 2), i, dtype=np.float32) for i in range(5)]
+        for flow in flows:
+            writer.write(flow)
+        writer.close()
+
+        assert_array_almost_equal(np.load(tmp_path / "flow.npy"), np.stack(flows))
+        assert [path.name for path in tmp_path.iterdir()] == ["flow.npy"]
+
+    def test_preallocated_capacity_is_truncated_on_close(self, tmp_path):
+        writer = FlowMemmapWriter(str(tmp_path / "flow.npy"), capacity=10)
+        writer.write(np.ones((4, 6, 2), dtype=np.float32))
+        writer.close()
+
+        assert np.load(tmp_path / "flow.npy").shape == (1, 4, 6, 2)
+
+    def test_short_writes_are_continued(self, tmp_path):
+        class ShortWritingFile:
+            def __init__(self, file):
+                self.file = file
+
+            def write(self, data):
+                return self.file.write(data[:7])
+
+            def __getattr__(self, name):
+                return getattr(self.file, name)
+
+        writer = self.get_flow_writer(tmp_path)
+        flows = [np.full((4, 6, 2), i, dtype=np.float32) for i in range(3)]
+        writer.write(flows[0])
+        writer._file = ShortWritingFile(writer._file)
+        for flow in flows[1:]:
+            writer.write(flow)
+        writer.close()
+
+        assert_array_almost_equal(np.load(tmp_path / "flow.npy"), np.stack(flows))
+
+    def test_flow_can_be_stored_as_float16(self, tmp_path):
+        writer = FlowMemmapWriter(str(tmp_path / "flow.npy"), dtype="float16")
+        writer.write(np.full((4, 6, 2), 1.5, dtype=np.float32))
+        writer.close()
+
+        loaded_flow = np.load(tmp_path / "flow.npy")
+        assert loaded_flow.dtype == np.float16
+        assert_array_almost_equal(loaded_flow[0], np.full((4, 6, 2), 1.5))
+
+    def test_flow_is_not_complete_until_closed(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        writer.write(np.zeros((4, 6, 2), dtype=np.float32))
+        assert not writer.exists(1)
+
+        writer.close()
+        assert writer.exists(1)
+
+    def test_flow_of_different_shape_raises_error(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        writer.write(np.zeros((4, 6, 2), dtype=np.float32))
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((6, 4, 2), dtype=np.float32))
+
+    def test_sidecar_index_maps_flow_to_source_frames(self, tmp_path):
+        writer = FlowMemmapWriter(str(tmp_path / "flow.npy"), stride=2,
+                                  frame_offset=10, fps=25)
+        for _ in range(3):
+            writer.write(np.zeros((4, 6, 2), dtype=np.float32))
+        writer.close()
+
+        reader = FlowMemmapReader(str(tmp_path / "flow.npy"))
+        assert list(reader.frames) == [10, 12, 14]
+        assert_allclose(reader.pos_ms, [400, 480, 560])
+
+    def test_sidecar_index_stores_recorded_timestamps(self, tmp_path):
+        writer = FlowMemmapWriter(str(tmp_path / "flow.npy"), fps=25)
+        writer.record_pos_ms(2, 100.5)
+        writer.record_pos_ms(4, 200)
+        for _ in range(3):
+            writer.write(np.zeros((4, 6, 2), dtype=np.float32))
+        writer.close()
+
+        reader = FlowMemmapReader(str(tmp_path / "flow.npy"))
+        assert_allclose(reader.pos_ms, [0, 100.5, 80])
+
+    def test_reader_memory_maps_flow(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        flows = [np.full((4, 6, 2), i, dtype=np.float32) for i in range(3)]
+        for flow in flows:
+            writer.write(flow)
+        writer.close()
+
+        reader = FlowMemmapReader(str(tmp_path / "flow.npy"))
+        assert isinstance(reader.flow, np.memmap)
+        assert len(reader) == 3
+        assert_array_almost_equal(reader[1], flows[1])
+        assert reader.frames is None
+
+    def test_saving_single_flow_image(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        flow = np.random.uniform(
+            low=-self.bound, high=self.bound, size=(5, 5, 2)
+        ).astype(np.float32)
+
+        writer.write(flow)
+        writer.close()
+
+        self.assert_flow_exists(tmp_path, index=0)
+        self.assert_flow_equal(tmp_path, index=0, flow=flow)
+
+    def test_exists_only_for_written_flow(self, tmp_path):
+        writer = self.get_flow_writer(tmp_path)
+        assert not writer.exists(1)
+
+        writer.write(np.zeros((5, 5, 2), dtype=np.float32))
+        writer.close()
+
+        assert writer.exists(1)
+        assert not writer.exists(2)
+
+    def get_flow_writer(self, tmp_path):
+        return FlowMemmapWriter(str(tmp_path / "flow.npy"))
+
+    def assert_flow_exists(self, tmp_dir: Path, index: int):
+        assert len(np.load(tmp_dir / "flow.npy", mmap_mode="r")) > index
+
+    def assert_flow_equal(self, tmp_dir, index: int, flow: np.ndarray):
+        assert_array_almost_equal(np.load(tmp_dir / "flow.npy")[index], flow)
+
+
+class TestFlowVideoWriter:
+    bound = 20
+
+    @pytest.mark.parametrize("template", ["flow/{axis}.mkv", "flow.mkv"])
+    def test_flow_is_recovered_by_reader(self, tmp_path, template):
+        file_path_template = str(tmp_path / template)
+        writer = FlowVideoWriter(file_path_template, bound=self.bound)
+        flows = [
+            np.random.uniform(low=-self.bound, high=self.bound,
+                              size=(32, 48, 2)).astype(np.float32)
+            for _ in range(5)
+        ]
+        for flow in flows:
+            writer.write(flow)
+        writer.close()
+
+        read_flows = list(FlowVideoReader(file_path_template, bound=self.bound))
+        assert len(read_flows) == len(flows)
+        # FFV1 is lossless so only quantisation error remains.
+        for read_flow, flow in zip(read_flows, flows):
+            assert_allclose(read_flow, flow, atol=2 * self.bound / 255)
+
+    def test_axes_are_written_to_separate_videos(self, tmp_path):
+        writer = FlowVideoWriter(str(tmp_path / "{axis}.mkv"))
+        writer.write(np.zeros((32, 48, 2), dtype=np.float32))
+        writer.close()
+
+        assert (tmp_path / "u.mkv").exists()
+        assert (tmp_path / "v.mkv").exists()
+        assert writer.exists(1)
+        assert not writer.exists(2)
+
+    def test_videos_are_only_probed_once_to_check_flow_exists(self, tmp_path,
+                                                             monkeypatch):
+        writer = FlowVideoWriter(str(tmp_path / "{axis}.mkv"))
+        for _ in range(3):
+            writer.write(np.zeros((32, 48, 2), dtype=np.float32))
+        writer.close()
+        opened_paths = []
+        video_source = flowty.videoio.VideoSource
+
+        def recording_video_source(file_path, **kwargs):
+            opened_paths.append(file_path)
+            return video_source(file_path, **kwargs)
+
+        monkeypatch.setattr(flowty.videoio, "VideoSource", recording_video_source)
+
+        assert [writer.exists(index) for index in range(1, 5)] == \
+               [True, True, True, False]
+        assert len(opened_paths) == 2
+
+    def test_exists_up_to_written_count(self, tmp_path):
+        writer = FlowVideoWriter(str(tmp_path / "flow.mkv"))
+        for _ in range(3):
+            writer.write(np.zeros((32, 48, 2), dtype=np.float32))
+        writer.close()
+
+        assert writer.exists_up_to(3)
+        assert not writer.exists_up_to(4)
+
+    def test_flow_of_different_shape_raises_error(self, tmp_path):
+        writer = FlowVideoWriter(str(tmp_path / "flow.mkv"))
+        writer.write(np.zeros((32, 48, 2), dtype=np.float32))
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((48, 32, 2), dtype=np.float32))
+        writer.close()
+
+    def test_unknown_container_requires_fourcc(self):
+        with pytest.raises(ValueError):
+            FlowVideoWriter("flow.webm")
+
+
+class TestFlowShardWriter:
+    bound = 20
+
+    def test_throws_error_if_template_missing_shard_field(self):
+        with pytest.raises(ValueError):
+            FlowShardWriter("flow/shard.tar")
+
+    def test_flow_is_recovered_by_reader(self, tmp_path):
+        template = str(tmp_path / "shard-{shard:05d}.tar")
+        flows = self.write_flows(FlowShardWriter(template, bound=self.bound), 5)
+
+        read_flows = list(FlowShardReader(template, bound=self.bound))
+        assert [index for index, _ in read_flows] == [1, 2, 3, 4, 5]
+        tolerance = 2 * self.bound / 30  # Allow for JPEG compression error.
+        for (_, read_flow), flow in zip(read_flows, flows):
+            assert read_flow.shape == flow.shape
+            assert_allclose(read_flow, flow, atol=tolerance)
+
+    def test_bytes_written_counts_shard_members(self, tmp_path):
+        template = str(tmp_path / "shard-{shard:05d}.tar")
+        writer = FlowShardWriter(template, bound=self.bound, max_shard_frames=2)
+        self.write_flows(writer, 5)
+
+        tar_size = sum(path.stat().st_size for path in tmp_path.glob("*.tar"))
+        assert 0 < writer.bytes_written <= tar_size
+
+    def test_shards_roll_over_by_frame_count(self, tmp_path):
+        template = str(tmp_path / "shard-{shard:05d}.tar")
+        self.write_flows(FlowShardWriter(template, max_shard_frames=2), 5)
+
+        assert sorted(path.name for path in tmp_path.glob("*.tar")) == [
+            "shard-00000.tar", "shard-00001.tar", "shard-00002.tar"
+        ]
+        assert len(list(FlowShardReader(template))) == 5
+
+    def test_shards_roll_over_by_size(self, tmp_path):
+        template = str(tmp_path / "shard-{shard:05d}.tar")
+        self.write_flows(FlowShardWriter(template, max_shard_size=12000), 5)
+
+        shard_paths = list(tmp_path.glob("*.tar"))
+        assert len(shard_paths) > 1
+        for shard_path in shard_paths:
+            assert shard_path.stat().st_size <= 12000
+
+    def test_index_locates_members(self, tmp_path):
+        template = str(tmp_path / "shard-{shard:05d}.tar")
+        self.write_flows(FlowShardWriter(template), 3)
+
+        shard_index = np.load(str(tmp_path / "shard-00000.index.npy"))
+        assert list(shard_index["index"]) == [1, 2, 3]
+        data = (tmp_path / "shard-00000.tar").read_bytes()
+        for entry in shard_index:
+            for axis in ["u", "v"]:
+                offset = entry[axis + "_offset"]
+                member = data[offset:offset + entry[axis + "_size"]]
+                assert imdecode(member).shape[:2] == (32, 48)
+
+    def test_exists_only_for_written_flow(self, tmp_path):
+        writer = FlowShardWriter(str(tmp_path / "shard-{shard:05d}.tar"))
+        assert not writer.exists(1)
+
+        self.write_flows(writer, 1)
+
+        assert writer.exists(1)
+        assert not writer.exists(2)
+
+    def test_shard_indices_are_only_read_once_to_check_flow_exists(self, tmp_path,
+                                                                  monkeypatch):
+        template = str(tmp_path / "shard-{shard:05d}.tar")
+        self.write_flows(FlowShardWriter(template, max_shard_frames=2), 5)
+        read_count = 0
+        read_shard_indices = flowty.videoio._read_shard_indices
+
+        def counting_read_shard_indices(file_path_template):
+            nonlocal read_count
+            read_count += 1
+            return read_shard_indices(file_path_template)
+
+        monkeypatch.setattr(flowty.videoio, "_read_shard_indices",
+                            counting_read_shard_indices)
+        writer = FlowShardWriter(template, max_shard_frames=2)
+
+        assert [writer.exists(index) for index in range(1, 7)] == \
+               [True] * 5 + [False]
+        assert read_count == 1
+
+    def test_exists_up_to_only_once_every_index_is_written(self, tmp_path):
+        template = str(tmp_path / "shard-{shard:05d}.tar")
+        self.write_flows(FlowShardWriter(template, max_shard_frames=2), 5)
+        writer = FlowShardWriter(template)
+
+        assert writer.exists_up_to(5)
+        assert not writer.exists_up_to(6)
+
+    def write_flows(self, writer, count):
+        # Smoothly varying flow, like real flow. JPEG compresses uniform noise too
+        # lossily to reliably meet the tolerance flow is recovered to.
+        y, x = np.mgrid[:32, :48]
+        flows = [
+            0.9 * self.bound * np.stack([np.sin(x / 7 + i), np.cos(y / 5 + i)],
+                                        axis=-1).astype(np.float32)
+            for i in range(count)
+        ]
+        for flow in flows:
+            writer.write(flow)
+        writer.close()
+        return flows
+
+
+def directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
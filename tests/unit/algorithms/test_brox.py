@@ -8,7 +8,7 @@ from flowty.algorithms.brox import BroxCommand
 from flowty.cv.cuda_optflow import CudaBroxOpticalFlow
 
 
-@pytest.mark.skipif('not flowty.cuda_available')
+@pytest.mark.skipif('not flowty.cuda_available()')
 class TestBroxFlowCommand:
     @pytest.mark.parametrize("arg,attr,value", [
         ("alpha", "alpha", 0.2),
@@ -39,7 +39,7 @@ class TestBroxFlowCommand:
 
     def test_raises_runtime_error_if_cuda_not_available(self, monkeypatch):
         with monkeypatch.context() as ctx:
-            ctx.setattr(flowty, "cuda_available", False)
+            ctx.setattr(flowty, "cuda_available", lambda: False)
             with pytest.raises(RuntimeError):
                 self.get_flow_alg(["brox", "src", "flow/{axis}/frame_{index:05d}.jpg"])
 
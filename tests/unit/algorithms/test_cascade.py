@@ -0,0 +1,52 @@
+import argparse
+
+import pytest
+
+from flowty.algorithms.cascade import CascadeCommand
+from flowty.cv.optflow import CascadeOpticalFlow, DenseInverseSearchOpticalFlow, \
+    TvL1OpticalFlow, VariationalRefinementOpticalFlow
+
+
+class TestCascadeCommand:
+    def test_dis_is_refined_with_reduced_schedule_tvl1_by_default(self):
+        str_args = ["cascade", "src", "flow/{axis}/frame_{index:05d}.jpg",
+                    "--scale-count", "1", "--warp-count", "2", "--outer-iterations", "3"]
+
+        flow_alg = self.get_flow_alg(str_args)
+
+        assert isinstance(flow_alg, CascadeOpticalFlow)
+        assert isinstance(flow_alg.initial_flow_algorithm, DenseInverseSearchOpticalFlow)
+        refinement_alg = flow_alg.refinement_algorithm
+        assert isinstance(refinement_alg, TvL1OpticalFlow)
+        assert refinement_alg.use_initial_flow
+        assert (refinement_alg.scale_count, refinement_alg.warp_count,
+                refinement_alg.outer_iterations) == (1, 2, 3)
+
+    def test_variational_refinement(self):
+        str_args = ["cascade", "src", "flow/{axis}/frame_{index:05d}.jpg",
+                    "--refinement", "vr", "--sor-iterations", "4"]
+
+        flow_alg = self.get_flow_alg(str_args)
+
+        assert isinstance(flow_alg.refinement_algorithm,
+                          VariationalRefinementOpticalFlow)
+        assert flow_alg.refinement_algorithm.sor_iterations == 4
+
+    @pytest.mark.parametrize("preset", ["ultrafast", "fast", "medium"])
+    def test_preset(self, preset):
+        str_args = ["cascade", "src", "flow/{axis}/frame_{index:05d}.jpg",
+                    "--preset", preset]
+
+        flow_alg = self.get_flow_alg(str_args)
+
+        expected_alg = DenseInverseSearchOpticalFlow(preset=preset)
+        assert (flow_alg.initial_flow_algorithm.patch_stride ==
+                expected_alg.patch_stride)
+
+    def get_flow_alg(self, str_args):
+        parser = argparse.ArgumentParser()
+        command_parsers = parser.add_subparsers()
+        CascadeCommand.register_command(command_parsers)
+        args = parser.parse_args(str_args)
+        command = CascadeCommand(args)
+        return command.get_flow_algorithm(args)
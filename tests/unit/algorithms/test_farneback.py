@@ -3,6 +3,7 @@ import argparse
 import pytest
 from pytest import approx
 
+import flowty
 from flowty.algorithms.farneback import FarnebackCommand
 from flowty.cv.cuda_optflow import CudaFarnebackOpticalFlow
 from flowty.cv.optflow import FarnebackOpticalFlow
@@ -40,7 +41,7 @@ class TestFarnebackCommand:
             expected_value = instance_value
         assert getattr(flow_alg, attr) == expected_value
 
-    @pytest.mark.skipif('not flowty.cuda_available')
+    @pytest.mark.skipif('not flowty.cuda_available()')
     @pytest.mark.parametrize("arg,attr,value", arg_test_cases)
     def test_gpu_args(self, arg, attr, value):
         if isinstance(value, tuple):
@@ -63,10 +64,27 @@ class TestFarnebackCommand:
             expected_value = instance_value
         assert getattr(flow_alg, attr) == expected_value
 
-    def get_flow_alg(self, str_args):
+    def test_warm_start_uses_initial_flow_with_warm_schedule(self):
+        str_args = ["farneback", "src", "flow/{axis}/frame_{index:05d}.jpg",
+                    "--warm-start", "--warm-scale-count", "1", "--warm-iterations", "2"]
+
+        flow_alg = self.get_flow_alg(str_args)
+        warm_flow_alg = self.get_flow_alg(str_args, warm=True)
+
+        assert not flow_alg.use_initial_flow
+        assert warm_flow_alg.use_initial_flow
+        assert (warm_flow_alg.scale_count, warm_flow_alg.iterations) == (1, 2)
+
+    def test_no_warm_flow_algorithm_without_warm_start(self):
+        str_args = ["farneback", "src", "flow/{axis}/frame_{index:05d}.jpg"]
+        assert self.get_flow_alg(str_args, warm=True) is None
+
+    def get_flow_alg(self, str_args, warm=False):
         parser = argparse.ArgumentParser()
         command_parsers = parser.add_subparsers()
         FarnebackCommand.register_command(command_parsers)
         args = parser.parse_args(str_args)
         command = FarnebackCommand(args)
+        if warm:
+            return command.get_warm_flow_algorithm(args)
         return command.get_flow_algorithm(args)
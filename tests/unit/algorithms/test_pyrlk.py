@@ -2,11 +2,12 @@ import argparse
 
 import pytest
 
+import flowty
 from flowty.algorithms.pyrlk import PyrLucasKanadeCommand
 from flowty.cv.cuda_optflow import CudaPyramidalLucasKanade
 
 
-@pytest.mark.skipif('not flowty.cuda_available')
+@pytest.mark.skipif('not flowty.cuda_available()')
 class TestPyramidalLucasKanadeCommand:
     @pytest.mark.parametrize(
         "arg,attr,value",
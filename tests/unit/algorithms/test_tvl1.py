@@ -33,16 +33,47 @@ class TestTvL1FlowCommand:
             value = approx(value)
         assert getattr(flow_alg, attr) == value
 
-    def get_flow_alg(self, str_args):
+    def test_warm_start_uses_initial_flow_with_warm_schedule(self):
+        str_args = ["tvl1", "src", "flow/{axis}/frame_{index:05d}.jpg", "--warm-start",
+                    "--warm-scale-count", "1", "--warm-warp-count", "2",
+                    "--warm-outer-iterations", "3"]
+
+        flow_alg = self.get_flow_alg(str_args)
+        warm_flow_alg = self.get_flow_alg(str_args, warm=True)
+
+        assert not flow_alg.use_initial_flow
+        assert warm_flow_alg.use_initial_flow
+        assert (warm_flow_alg.scale_count, warm_flow_alg.warp_count,
+                warm_flow_alg.outer_iterations) == (1, 2, 3)
+        assert warm_flow_alg.tau == approx(flow_alg.tau)
+
+    def test_no_warm_flow_algorithm_without_warm_start(self):
+        str_args = ["tvl1", "src", "flow/{axis}/frame_{index:05d}.jpg"]
+        assert self.get_flow_alg(str_args, warm=True) is None
+
+    @pytest.mark.parametrize("option", [["--segments", "2"], ["--resume"]])
+    def test_warm_start_is_rejected_for_partial_runs(self, option):
+        str_args = ["tvl1", "src", "flow/{axis}/frame_{index:05d}.jpg",
+                    "--warm-start"] + option
+        with pytest.raises(ValueError):
+            self.create_command(str_args).main()
+
+    def get_flow_alg(self, str_args, warm=False):
+        command = self.create_command(str_args)
+        args = command.args
+        if warm:
+            return command.get_warm_flow_algorithm(args)
+        flow_alg = command.get_flow_algorithm(args)
+        return flow_alg
+
+    def create_command(self, str_args):
         parser = argparse.ArgumentParser()
         command_parsers = parser.add_subparsers()
         TvL1Command.register_command(command_parsers)
         args = parser.parse_args(str_args)
-        command = TvL1Command(args)
-        flow_alg = command.get_flow_algorithm(args)
-        return flow_alg
+        return TvL1Command(args)
 
-    @pytest.mark.skipif('not flowty.cuda_available')
+    @pytest.mark.skipif('not flowty.cuda_available()')
     @pytest.mark.parametrize("arg,attr,value", [
         ("tau", "tau", 0.2),
         ("lambda", "lambda_", 0.1),
@@ -63,7 +94,7 @@ class TestTvL1FlowCommand:
             value = approx(value)
         assert getattr(flow_alg, attr) == value
 
-    @pytest.mark.skipif('not flowty.cuda_available')
+    @pytest.mark.skipif('not flowty.cuda_available()')
     def test_gpu_iterations(self):
         inner_iterations = 20
         outer_iterations = 30
@@ -75,7 +106,7 @@ class TestTvL1FlowCommand:
         assert isinstance(flow_alg, CudaTvL1OpticalFlow)
         assert flow_alg.iterations == inner_iterations * outer_iterations
 
-    @pytest.mark.skipif('not flowty.cuda_available')
+    @pytest.mark.skipif('not flowty.cuda_available()')
     def test_median_filtering_on_gpu_raises_error(self):
         str_args = ["tvl1", "src", "flow/{axis}/frame_{index:05d}.jpg", "--median-filtering", "3", "--cuda"]
 
@@ -84,6 +115,6 @@ class TestTvL1FlowCommand:
 
     def test_raises_runtime_error_if_cuda_not_available(self, monkeypatch):
         with monkeypatch.context() as ctx:
-            ctx.setattr(flowty, "cuda_available", False)
+            ctx.setattr(flowty, "cuda_available", lambda: False)
             with pytest.raises(RuntimeError):
                 self.get_flow_alg(["tvl1", "src", "flow/{axis}/frame_{index:05d}.jpg", "--cuda"])
\ No newline at end of file
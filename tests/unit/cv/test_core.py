@@ -1,5 +1,8 @@
+import threading
+
 import numpy as np
-from flowty.cv.core import Mat, CV_64F, CV_8U, CV_8UC2, CV_8UC3, CV_32FC2, CV_32FC3, CV_64FC3
+import pytest
+from flowty.cv.core import get_mat_stats, track_live_mat_bytes, Mat, CV_64F, CV_8U, CV_8UC2, CV_8UC3, CV_32FC2, CV_32FC3, CV_64FC3
 from numpy.testing import assert_equal
 
 
@@ -88,3 +91,77 @@ class TestMat:
         assert np.array_equal(array2[0, 0, :], np.array([0, 1, 2]))
         del array1
         del array2
+
+
+class TestMatStats:
+    @pytest.fixture(autouse=True)
+    def live_mat_bytes_tracking(self):
+        track_live_mat_bytes(True)
+        yield
+        track_live_mat_bytes(False)
+
+    def test_live_mats_are_counted_until_released(self):
+        before = get_mat_stats()
+        mat = Mat(rows=10, cols=20, dtype=CV_8UC3)
+        during = get_mat_stats()
+        del mat
+        after = get_mat_stats()
+
+        assert during["live_mats"] == before["live_mats"] + 1
+        assert during["live_mat_bytes"] == before["live_mat_bytes"] + 10 * 20 * 3
+        assert during["mat_allocations"] == before["mat_allocations"] + 1
+        assert after["live_mats"] == before["live_mats"]
+        assert after["live_mat_bytes"] == before["live_mat_bytes"]
+
+    def test_shared_data_is_counted_once(self):
+        array = np.zeros((10, 20, 2), dtype=np.float32)
+        before = get_mat_stats()
+        mats = [Mat.fromarray(array), Mat.fromarray(array)]
+
+        stats = get_mat_stats()
+
+        assert stats["live_mats"] == before["live_mats"] + len(mats)
+        assert stats["live_mat_bytes"] == before["live_mat_bytes"] + array.nbytes
+
+    def test_live_mat_bytes_are_only_counted_while_tracked(self):
+        track_live_mat_bytes(False)
+        try:
+            before = get_mat_stats()
+            mat = Mat(rows=10, cols=20, dtype=CV_8UC3)
+            during = get_mat_stats()
+        finally:
+            track_live_mat_bytes(True)
+
+        assert "live_mat_bytes" not in during
+        assert during["live_mats"] == before["live_mats"] + 1
+        # Mats created before tracking started aren't counted.
+        assert get_mat_stats()["live_mat_bytes"] == 0
+        del mat
+
+    def test_buffer_exports_are_counted(self):
+        mat = Mat(rows=2, cols=2, dtype=CV_32FC2)
+        before = get_mat_stats()
+        array = mat.asarray()
+        during = get_mat_stats()
+        del array
+        after = get_mat_stats()
+
+        assert during["buffer_exports"] == before["buffer_exports"] + 1
+        assert during["live_buffer_exports"] == before["live_buffer_exports"] + 1
+        assert after["live_buffer_exports"] == before["live_buffer_exports"]
+
+    def test_stats_can_be_read_while_other_threads_create_mats(self):
+        stop = threading.Event()
+
+        def create_mats():
+            while not stop.is_set():
+                Mat(rows=2, cols=2, dtype=CV_8UC3)
+
+        thread = threading.Thread(target=create_mats)
+        thread.start()
+        try:
+            for _ in range(200):
+                get_mat_stats()
+        finally:
+            stop.set()
+            thread.join()
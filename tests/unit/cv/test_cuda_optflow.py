@@ -8,9 +8,9 @@ from flowty.cv.cuda_optflow import CudaTvL1OpticalFlow, CudaBroxOpticalFlow, \
     CudaPyramidalLucasKanade, CudaFarnebackOpticalFlow
 from flowty.cv.core import Mat
 
-from tests.unit.cv.test_optflow import OpticalFlowAlgorithmTestBase
+from tests.unit.cv.test_optflow import InitialFlowTestMixin, OpticalFlowAlgorithmTestBase
 
-if not flowty.cuda_available:
+if not flowty.cuda_available():
     pytest.skip("skipping CUDA-only module: flowty.cv.cuda_optflow", allow_module_level=True)
 
 
@@ -19,10 +19,13 @@ def to_rgb(grayscale_img: np.ndarray):
     return Mat.fromarray(np.stack([grayscale_img] * 3, axis=-1).astype(np.uint8))
 
 
-class TestCudaTvL1OpticalFlow(OpticalFlowAlgorithmTestBase):
+class TestCudaTvL1OpticalFlow(InitialFlowTestMixin, OpticalFlowAlgorithmTestBase):
     def get_flow_algorithm(self):
         return CudaTvL1OpticalFlow()
 
+    def get_warm_flow_algorithm(self):
+        return CudaTvL1OpticalFlow(scale_count=1, warp_count=2, use_initial_flow=True)
+
     @pytest.mark.parametrize("property,expected_value", [
         ("tau", 0.25),
         ("lambda_", 0.15),
@@ -79,10 +82,14 @@ class TestCudaPyramidalLucasKanade(OpticalFlowAlgorithmTestBase):
         assert getattr(self.get_flow_algorithm(), property) == expected_value
 
 
-class TestCudaFarnebackOpticalFlow(OpticalFlowAlgorithmTestBase):
+class TestCudaFarnebackOpticalFlow(InitialFlowTestMixin, OpticalFlowAlgorithmTestBase):
     def get_flow_algorithm(self):
         return CudaFarnebackOpticalFlow()
 
+    def get_warm_flow_algorithm(self):
+        return CudaFarnebackOpticalFlow(scale_count=1, iterations=2,
+                                        use_initial_flow=True)
+
     @pytest.mark.parametrize("property,expected_value", [
         ("scale_count", 5),
         ("scale_factor", 0.5),
@@ -90,8 +97,8 @@ class TestCudaFarnebackOpticalFlow(OpticalFlowAlgorithmTestBase):
         ("window_size", 13),
         ("iterations", 10),
         ("neighborhood_size", 5),
-        ("poly_sigma", 1.1)
-
+        ("poly_sigma", 1.1),
+        ("use_initial_flow", False),
     ])
     def test_property(self, property, expected_value):
         assert getattr(self.get_flow_algorithm(), property) == expected_value
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from flowty.cv.imgcodecs import imread, imwrite, IMREAD_GRAYSCALE
+from numpy.testing import assert_equal
+
+
+class TestImread:
+    def test_reads_image_written_by_imwrite(self, tmp_path):
+        img = np.random.randint(0, 256, size=(12, 16, 3), dtype=np.uint8)
+        path = tmp_path / "img.png"
+        imwrite(str(path), img)
+
+        assert_equal(imread(path), img)
+
+    def test_reads_grayscale(self, tmp_path):
+        img = np.random.randint(0, 256, size=(12, 16), dtype=np.uint8)
+        path = tmp_path / "img.png"
+        imwrite(str(path), img)
+
+        assert imread(path, IMREAD_GRAYSCALE).shape[:2] == (12, 16)
+
+    def test_raises_error_when_image_does_not_exist(self, tmp_path):
+        with pytest.raises(RuntimeError):
+            imread(tmp_path / "missing.png")
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from flowty.cv.imgproc import quantise_flow_uv
+from flowty.imgproc import quantise_flow
+
+
+class TestQuantiseFlowUV:
+    @pytest.mark.parametrize("bound", [1, 7.5, 20])
+    def test_planes_are_identical_to_quantise_flow(self, bound):
+        flow = np.random.uniform(low=-2 * bound, high=2 * bound,
+                                 size=(31, 47, 2)).astype(np.float32)
+        flow[0, 0] = bound
+        flow[0, 1] = -bound
+        u, v = self.quantise(flow, bound)
+
+        quantised_flow = quantise_flow(flow.copy(), bound=bound)
+        assert_array_equal(quantised_flow[..., 0], u)
+        assert_array_equal(quantised_flow[..., 1], v)
+
+    def test_nan_is_mapped_to_lower_bound(self):
+        flow = np.full((2, 2, 2), np.nan, dtype=np.float32)
+        u, v = self.quantise(flow, 20)
+        assert_array_equal(u, np.zeros((2, 2), dtype=np.uint8))
+
+    def test_planes_can_be_reused(self):
+        u = np.empty((3, 4), dtype=np.uint8)
+        v = np.empty((3, 4), dtype=np.uint8)
+        quantise_flow_uv(np.full((3, 4, 2), 20, dtype=np.float32), 20, u, v)
+        quantise_flow_uv(np.full((3, 4, 2), -20, dtype=np.float32), 20, u, v)
+        assert_array_equal(u, np.zeros((3, 4), dtype=np.uint8))
+        assert_array_equal(v, np.zeros((3, 4), dtype=np.uint8))
+
+    def test_throws_error_if_flow_not_2_channels(self):
+        flow = np.zeros((3, 4, 3), dtype=np.float32)
+        with pytest.raises(ValueError):
+            self.quantise(flow, 20)
+
+    def test_throws_error_if_planes_have_wrong_shape(self):
+        flow = np.zeros((3, 4, 2), dtype=np.float32)
+        u = np.empty((4, 3), dtype=np.uint8)
+        v = np.empty((3, 4), dtype=np.uint8)
+        with pytest.raises(ValueError):
+            quantise_flow_uv(flow, 20, u, v)
+
+    def quantise(self, flow, bound):
+        u = np.empty(flow.shape[:2], dtype=np.uint8)
+        v = np.empty(flow.shape[:2], dtype=np.uint8)
+        quantise_flow_uv(flow, bound, u, v)
+        return u, v
@@ -1,3 +1,6 @@
+import sys
+import threading
+import time
 from abc import ABC
 
 import numpy as np
@@ -5,10 +8,15 @@ from numpy.testing import assert_equal, assert_array_equal
 from pytest import approx
 
 from flowty.cv.optflow import TvL1OpticalFlow, FarnebackOpticalFlow, \
-    DenseInverseSearchOpticalFlow, VariationalRefinementOpticalFlow, read_flo, write_flo
+    DenseInverseSearchOpticalFlow, VariationalRefinementOpticalFlow, \
+    CascadeOpticalFlow, read_flo, write_flo
 from flowty.cv.core import Mat, CV_32FC2
+from flowty.cv.imgcodecs import imwrite
+from flowty.cv.videoio import VideoSource
 import pytest
 
+from ...resources import VIDEO_PATHS
+
 
 def make_random_uint8_mat(rows, cols, channels):
     return Mat.fromarray((np.random.rand(rows, cols, channels) * 255).astype(
@@ -59,11 +67,112 @@ class OpticalFlowAlgorithmTestBase(ABC):
 
         assert_equal(flow1.asarray(), flow1_original)
 
+    def test_preprocessed_frames_have_a_single_channel(self):
+        alg = self.get_flow_algorithm()
+        frame = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+
+        preprocessed_frame = alg.preprocess(frame)
+
+        assert preprocessed_frame.shape == (self.img_size[0], self.img_size[1], 1)
+
+    def test_preprocessing_is_idempotent(self):
+        alg = self.get_flow_algorithm()
+        frame = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        preprocessed_frame = alg.preprocess(frame)
+
+        assert alg.preprocess(preprocessed_frame) is preprocessed_frame
+
+    def test_flow_from_preprocessed_frames_matches_flow_from_bgr_frames(self):
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        alg = self.get_flow_algorithm()
+        expected_flow = alg(reference, target).asarray().copy()
+
+        alg = self.get_flow_algorithm()
+        flow = alg(alg.preprocess(reference), alg.preprocess(target))
+
+        assert_equal(flow.asarray(), expected_flow)
+
+    def test_flow_is_written_into_out_array(self):
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        expected_flow = self.get_flow_algorithm()(reference, target).asarray().copy()
+        out = np.zeros((2, *self.img_size, 2), dtype=np.float32)
+
+        flow = self.get_flow_algorithm()(reference, target, out=out[1])
+
+        assert np.shares_memory(flow.asarray(), out)
+        assert_equal(out[1], expected_flow)
+        assert_equal(out[0], 0)
+
+    def test_flow_is_written_into_out_mat(self):
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        out = Mat.fromarray(np.zeros((*self.img_size, 2), dtype=np.float32))
+
+        flow = self.get_flow_algorithm()(reference, target, out=out)
+
+        assert flow is out
+
+    @pytest.mark.parametrize("case", ["shape", "dtype", "layout"])
+    def test_out_of_wrong_shape_dtype_or_layout_is_rejected(self, case):
+        out = {
+            "shape": lambda: np.zeros((3, 3, 2), dtype=np.float32),
+            "dtype": lambda: np.zeros((*self.img_size, 2), dtype=np.float64),
+            "layout": lambda: np.zeros((*self.img_size, 4), dtype=np.float32)[..., :2],
+        }[case]()
+        alg = self.get_flow_algorithm()
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        with pytest.raises(ValueError):
+            alg(reference, target, out=out)
+
+
+class InitialFlowTestMixin:
+    img_size = (32, 48)
+
+    def get_warm_flow_algorithm(self):
+        raise NotImplementedError()
+
+    def test_initial_flow_requires_use_initial_flow(self):
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        initial_flow = np.zeros((*self.img_size, 2), dtype=np.float32)
+
+        with pytest.raises(ValueError):
+            self.get_flow_algorithm()(reference, target, initial_flow=initial_flow)
+
+    def test_initial_flow_is_used_and_not_modified(self):
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        alg = self.get_warm_flow_algorithm()
+        zero_initial_flow = np.zeros((*self.img_size, 2), dtype=np.float32)
+        initial_flow = np.full((*self.img_size, 2), 3, dtype=np.float32)
+
+        flow_from_zero = alg(reference, target).asarray().copy()
+        assert_equal(alg(reference, target, initial_flow=zero_initial_flow).asarray(),
+                     flow_from_zero)
+        flow = alg(reference, target, initial_flow=initial_flow).asarray()
+
+        assert_equal(initial_flow, 3)
+        assert not np.array_equal(flow, flow_from_zero)
+
+    def test_initial_flow_of_wrong_shape_is_rejected(self):
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        initial_flow = np.zeros((3, 3, 2), dtype=np.float32)
+
+        with pytest.raises(ValueError):
+            self.get_warm_flow_algorithm()(reference, target, initial_flow=initial_flow)
+
 
-class TestTvL1OpticalFlow(OpticalFlowAlgorithmTestBase):
+class TestTvL1OpticalFlow(InitialFlowTestMixin, OpticalFlowAlgorithmTestBase):
     def get_flow_algorithm(self):
         return TvL1OpticalFlow()
 
+    def get_warm_flow_algorithm(self):
+        return TvL1OpticalFlow(scale_count=1, warp_count=2, use_initial_flow=True)
+
     @pytest.mark.parametrize("property,expected_value", [
         ("tau", 0.25),
         ("lambda_", 0.15),
@@ -90,10 +199,13 @@ class TestTvL1OpticalFlow(OpticalFlowAlgorithmTestBase):
                 ")")
 
 
-class TestFarnebackOpticalFlow(OpticalFlowAlgorithmTestBase):
+class TestFarnebackOpticalFlow(InitialFlowTestMixin, OpticalFlowAlgorithmTestBase):
     def get_flow_algorithm(self):
         return FarnebackOpticalFlow()
 
+    def get_warm_flow_algorithm(self):
+        return FarnebackOpticalFlow(scale_count=1, iterations=2, use_initial_flow=True)
+
     @pytest.mark.parametrize("property,expected_value", [
         ("scale_count", 5),
         ("scale_factor", 0.5),
@@ -101,8 +213,8 @@ class TestFarnebackOpticalFlow(OpticalFlowAlgorithmTestBase):
         ("window_size", 13),
         ("iterations", 10),
         ("neighborhood_size", 5),
-        ("poly_sigma", 1.1)
-
+        ("poly_sigma", 1.1),
+        ("use_initial_flow", False),
     ])
     def test_property(self, property, expected_value):
         assert getattr(self.get_flow_algorithm(), property) == expected_value
@@ -147,6 +259,56 @@ class TestDenseInverseSearchOpticalFlow(OpticalFlowAlgorithmTestBase):
     def test_property(self, property, expected_value):
         assert getattr(self.get_flow_algorithm(), property) == expected_value
 
+    def test_flow_doesnt_depend_on_contents_of_out(self):
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        expected_flow = self.get_flow_algorithm()(reference, target).asarray().copy()
+        out = np.full((*self.img_size, 2), 5, dtype=np.float32)
+
+        self.get_flow_algorithm()(reference, target, out=out)
+
+        assert_equal(out, expected_flow)
+
+
+class TestCascadeOpticalFlow(OpticalFlowAlgorithmTestBase):
+    img_size = (128, 128)
+
+    def get_flow_algorithm(self):
+        return CascadeOpticalFlow(
+                DenseInverseSearchOpticalFlow(preset='ultrafast'),
+                TvL1OpticalFlow(scale_count=1, warp_count=2, use_initial_flow=True),
+        )
+
+    def test_refinement_algorithm_must_use_initial_flow(self):
+        with pytest.raises(ValueError):
+            CascadeOpticalFlow(DenseInverseSearchOpticalFlow(), TvL1OpticalFlow())
+
+    def test_flow_is_refined_from_initial_flow(self):
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        initial_flow_alg = DenseInverseSearchOpticalFlow(preset='ultrafast')
+        refinement_alg = VariationalRefinementOpticalFlow()
+        initial_flow = initial_flow_alg(reference, target)
+        expected_flow = refinement_alg(reference, target,
+                                       initial_flow=initial_flow).asarray().copy()
+
+        alg = CascadeOpticalFlow(DenseInverseSearchOpticalFlow(preset='ultrafast'),
+                                 VariationalRefinementOpticalFlow())
+        flow = alg(reference, target)
+
+        assert_equal(flow.asarray(), expected_flow)
+
+    def test_flow_doesnt_depend_on_previous_pair(self):
+        reference = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        target = make_random_uint8_mat(self.img_size[0], self.img_size[1], 3)
+        expected_flow = self.get_flow_algorithm()(reference, target).asarray().copy()
+
+        alg = self.get_flow_algorithm()
+        alg(target, reference)
+        flow = alg(reference, target)
+
+        assert_equal(flow.asarray(), expected_flow)
+
 
 def test_read_write_flo(tmpdir):
     flow_path = str(tmpdir / 'test.flo')
@@ -160,3 +322,82 @@ def test_read_write_flo(tmpdir):
     flow2 = np.array(read_flo(flow_path))
 
     assert_array_equal(flow2, flow)
+
+
+def test_read_flo_accepts_path(tmp_path):
+    flow_path = tmp_path / 'test.flo'
+    flow_np = (np.random.rand(20, 30, 2) * 20).astype(np.float32)
+    write_flo(flow_np, flow_path)
+
+    assert_array_equal(np.array(read_flo(flow_path)), flow_np)
+
+
+def count_ticks_while(fn) -> int:
+    """Number of times another thread ticks while ``fn`` is called."""
+    # With a switch interval far longer than the test the interpreter never
+    # forces the main thread to hand over the GIL, so the ticking thread can only
+    # run while fn runs if the GIL is released.
+    original_switch_interval = sys.getswitchinterval()
+    ticks = 0
+    stop = threading.Event()
+
+    def tick():
+        nonlocal ticks
+        while not stop.is_set():
+            ticks += 1
+            time.sleep(0.0001)
+
+    ticker = threading.Thread(target=tick)
+    ticker.start()
+    sys.setswitchinterval(1000)
+    try:
+        ticks_before = ticks
+        fn()
+        return ticks - ticks_before
+    finally:
+        sys.setswitchinterval(original_switch_interval)
+        stop.set()
+        ticker.join()
+
+
+@pytest.mark.parametrize("algorithm_class", [
+    TvL1OpticalFlow,
+    FarnebackOpticalFlow,
+    DenseInverseSearchOpticalFlow,
+    VariationalRefinementOpticalFlow,
+])
+def test_other_threads_run_while_computing_flow(algorithm_class):
+    reference = make_random_uint8_mat(240, 320, 3)
+    target = make_random_uint8_mat(240, 320, 3)
+    alg = algorithm_class()
+
+    def compute_flow():
+        for _ in range(5):
+            alg(reference, target)
+
+    assert count_ticks_while(compute_flow) > 0
+
+
+@pytest.mark.parametrize("grab", [False, True])
+def test_other_threads_run_while_decoding(grab):
+    src = VideoSource(VIDEO_PATHS['jpeg'], backend='images')
+
+    def decode():
+        for _ in range(100):
+            if grab:
+                assert src.grab()
+                src.retrieve()
+            else:
+                next(src)
+
+    assert count_ticks_while(decode) > 0
+
+
+def test_other_threads_run_while_writing_images(tmp_path):
+    img = np.random.randint(0, 256, size=(2000, 2000, 3), dtype=np.uint8)
+
+    def write():
+        for i in range(3):
+            imwrite(str(tmp_path / "{}.png".format(i)), img)
+
+    assert count_ticks_while(write) > 0
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from flowty.cv.core import Mat
+from flowty.cv.videoio import raw_frame_to_gray
+from numpy.testing import assert_allclose, assert_equal
+
+ROWS, COLS = 4, 6
+
+
+def make_luma():
+    # Span values outside of the limited range [16, 235] to check saturation.
+    return np.arange(ROWS * COLS, dtype=np.uint8).reshape(ROWS, COLS) * 11
+
+
+def expand_limited_range(luma):
+    return np.clip(np.rint((luma.astype(np.float64) - 16) * 255 / 219), 0, 255) \
+        .astype(np.uint8)
+
+
+def random_chroma(shape):
+    return np.random.randint(0, 256, size=shape, dtype=np.uint8)
+
+
+class TestRawFrameToGray:
+    def test_packed_yuyv_luma_is_expanded_to_full_range(self):
+        luma = make_luma()
+        frame = np.stack([luma, random_chroma(luma.shape)], axis=-1)
+
+        gray = raw_frame_to_gray(Mat.fromarray(frame), "YUYV", ROWS)
+
+        assert_equal(gray.asarray()[..., 0], expand_limited_range(luma))
+
+    def test_packed_uyvy_luma_is_expanded_to_full_range(self):
+        luma = make_luma()
+        frame = np.stack([random_chroma(luma.shape), luma], axis=-1)
+
+        gray = raw_frame_to_gray(Mat.fromarray(frame), "UYVY", ROWS)
+
+        assert_equal(gray.asarray()[..., 0], expand_limited_range(luma))
+
+    @pytest.mark.parametrize("fourcc", ["YU12", "NV12"])
+    def test_planar_yuv420_luma_plane_is_expanded_to_full_range(self, fourcc):
+        luma = make_luma()
+        frame = np.concatenate([luma, random_chroma((ROWS // 2, COLS))])[..., None]
+
+        gray = raw_frame_to_gray(Mat.fromarray(frame), fourcc, ROWS)
+
+        assert gray.shape == (ROWS, COLS, 1)
+        assert_equal(gray.asarray()[..., 0], expand_limited_range(luma))
+
+    def test_gray_frames_are_used_as_is(self):
+        frame = Mat.fromarray(make_luma()[..., None])
+
+        gray = raw_frame_to_gray(frame, "GREY", ROWS)
+
+        assert_equal(gray.asarray(), frame.asarray())
+
+    @pytest.mark.parametrize("fourcc,weights", [
+        ("BGR3", [0.114, 0.587, 0.299]),
+        ("RGB3", [0.299, 0.587, 0.114]),
+    ])
+    def test_rgb_frames_are_converted_in_their_channel_order(self, fourcc, weights):
+        frame = random_chroma((ROWS, COLS, 3))
+        # OpenCV rounds the BT.601 weights to fixed point, differently between
+        # versions and builds, so results can be off by one.
+        expected = frame @ np.array(weights)
+
+        gray = raw_frame_to_gray(Mat.fromarray(frame), fourcc, ROWS)
+
+        assert_allclose(gray.asarray()[..., 0], expected, atol=1)
+
+    def test_raises_error_on_unsupported_pixel_format(self):
+        with pytest.raises(ValueError):
+            raw_frame_to_gray(Mat.fromarray(make_luma()[..., None]), "MJPG", ROWS)
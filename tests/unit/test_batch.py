@@ -0,0 +1,115 @@
+import argparse
+
+import numpy as np
+import pytest
+
+import flowty.batch
+from flowty.algorithms.tvl1 import TvL1Command
+from flowty.batch import entry_to_argv, read_manifest, _flow_algorithm_key, \
+    _is_flow_complete, _parse_args
+
+
+class TestReadManifest:
+    def test_reads_jsonl_manifest(self, tmp_path):
+        manifest = tmp_path / "manifest.jsonl"
+        manifest.write_text('{"src": "a.mp4", "dest": "a/{index}.npy", "cuda": true}\n'
+                            '\n'
+                            '{"src": "b.mp4", "dest": "b/{index}.npy"}\n')
+        assert read_manifest(manifest) == [
+            {"src": "a.mp4", "dest": "a/{index}.npy", "cuda": True},
+            {"src": "b.mp4", "dest": "b/{index}.npy"},
+        ]
+
+    def test_reads_csv_manifest(self, tmp_path):
+        manifest = tmp_path / "manifest.csv"
+        manifest.write_text("src,dest,method,warp_count\n"
+                            "a.mp4,a/{index}.npy,tvl1,3\n")
+        assert read_manifest(manifest) == [
+            {"src": "a.mp4", "dest": "a/{index}.npy", "method": "tvl1",
+             "warp_count": "3"},
+        ]
+
+
+class TestEntryToArgv:
+    def test_src_and_dest_follow_method(self):
+        argv = entry_to_argv({"src": "a.mp4", "dest": "a/{index}.npy",
+                              "method": "tvl1"})
+        assert argv == ["tvl1", "a.mp4", "a/{index}.npy"]
+
+    def test_default_method_is_used_when_entry_has_none(self):
+        argv = entry_to_argv({"src": "a.mp4", "dest": "a/{index}.npy"},
+                             default_method="farneback")
+        assert argv[0] == "farneback"
+
+    def test_missing_method_raises_error(self):
+        with pytest.raises(ValueError):
+            entry_to_argv({"src": "a.mp4", "dest": "a/{index}.npy"})
+
+    def test_missing_dest_raises_error(self):
+        with pytest.raises(ValueError):
+            entry_to_argv({"src": "a.mp4", "method": "tvl1"})
+
+    def test_options_are_converted_to_command_line_options(self):
+        argv = entry_to_argv({"src": "a.mp4", "dest": "a/{index}.npy",
+                              "method": "tvl1", "warp_count": 3, "cuda": True})
+        assert argv[3:] == ["--warp-count", "3", "--cuda"]
+
+    @pytest.mark.parametrize("value", [False, "false", "", None])
+    def test_false_and_empty_options_are_omitted(self, value):
+        argv = entry_to_argv({"src": "a.mp4", "dest": "a/{index}.npy",
+                              "method": "tvl1", "cuda": value})
+        assert argv == ["tvl1", "a.mp4", "a/{index}.npy"]
+
+    def test_true_strings_are_flags(self):
+        argv = entry_to_argv({"src": "a.mp4", "dest": "a/{index}.npy",
+                              "method": "tvl1", "cuda": "True"})
+        assert argv[3:] == ["--cuda"]
+
+
+class TestFlowAlgorithmKey:
+    def test_entry_args_are_parsed_by_method_parser(self):
+        args = _parse_args(["tvl1", "a.mp4", "a/{index}.npy", "--warp-count", "3"])
+        assert args.command is TvL1Command
+        assert args.warp_count == 3
+
+    def test_key_is_independent_of_src_and_dest(self):
+        a = _parse_args(["tvl1", "a.mp4", "a/{index}.npy"])
+        b = _parse_args(["tvl1", "b.mp4", "b/{index}.npy"])
+        assert _flow_algorithm_key(a) == _flow_algorithm_key(b)
+
+    def test_key_is_independent_of_metrics_paths(self):
+        a = _parse_args(["tvl1", "a.mp4", "a/{index}.npy", "--metrics-summary", "a.json"])
+        b = _parse_args(["tvl1", "b.mp4", "b/{index}.npy", "--metrics-summary", "b.json"])
+        assert _flow_algorithm_key(a) == _flow_algorithm_key(b)
+
+    def test_key_depends_on_method_options(self):
+        a = _parse_args(["tvl1", "a.mp4", "a/{index}.npy", "--warp-count", "3"])
+        b = _parse_args(["tvl1", "a.mp4", "a/{index}.npy", "--warp-count", "4"])
+        assert _flow_algorithm_key(a) != _flow_algorithm_key(b)
+
+
+class TestIsFlowComplete:
+    def test_complete_once_every_pair_is_written(self, tmp_path):
+        args = argparse.Namespace(dest=str(tmp_path / "{index:05d}.npy"))
+        for index in [1, 2, 4]:
+            np.save(str(tmp_path / "{:05d}.npy".format(index)), np.zeros((4, 6, 2)))
+
+        assert _is_flow_complete(args, 2)
+        assert not _is_flow_complete(args, 4)
+
+    def test_writer_is_closed(self, tmp_path, monkeypatch):
+        closed = []
+
+        class RecordingWriter:
+            def exists_up_to(self, count):
+                raise OSError("Unable to probe flow")
+
+            def close(self):
+                closed.append(True)
+
+        monkeypatch.setattr(flowty.batch, "get_flow_writer",
+                            lambda args: RecordingWriter())
+
+        with pytest.raises(OSError):
+            _is_flow_complete(argparse.Namespace(), 2)
+        assert closed == [True]
@@ -1,4 +1,15 @@
+import random
+import threading
+import time
+
+import pytest
+
+from flowty.cv import Mat, mat_to_array
+from flowty.cv.core import get_mat_stats, track_live_mat_bytes
 from flowty.flow_pipe import FlowPipe
+from flowty.metrics import FlowPipeMetrics
+from flowty.trace import Tracer
+from flowty.videoio import FlowUVImageWriter
 import numpy as np
 
 
@@ -10,7 +21,65 @@ class RecordingDestination:
         self.flow.append(flow)
 
 
+class PreprocessingAlgorithm:
+    def __init__(self):
+        self.preprocessed_frames = []
+
+    def preprocess(self, frame):
+        self.preprocessed_frames.append(int(frame[0]))
+        return frame * 10
+
+    def __call__(self, reference, target):
+        return target - reference
+
+
+class GrabbingSource:
+    """Source decoding frames on ``retrieve`` and recording which were decoded."""
+    def __init__(self, frames):
+        self.frames = frames
+        self.position = -1
+        self.retrieved = []
+
+    def grab(self):
+        self.position += 1
+        return self.position < len(self.frames)
+
+    def retrieve(self):
+        self.retrieved.append(self.position)
+        return self.frames[self.position]
+
+    @property
+    def pos_ms(self):
+        return self.position * 40.0
+
+
+class TimestampRecordingDestination(RecordingDestination):
+    def __init__(self):
+        super().__init__()
+        self.frame_index = 1
+        self.pos_ms = {}
+
+    def record_pos_ms(self, index, pos_ms):
+        self.pos_ms[index] = pos_ms
+
+
+class RingBufferSource:
+    """Source decoding frames into a ring of ``buffer_count`` reused arrays."""
+    def __init__(self, frames):
+        self.frames = frames
+        self.buffer_count = 0
+
+    def __iter__(self):
+        buffers = [np.zeros(1, dtype=int) for _ in range(self.buffer_count)]
+        for i, frame in enumerate(self.frames):
+            buffer = buffers[i % self.buffer_count]
+            buffer[:] = frame
+            yield buffer
+
+
 class TestFlowPipe:
+    pipe_options = {}
+
     def difference(reference, target):
         print("target: {}, reference: {}".format(target ,reference))
         return target - reference
@@ -51,17 +120,322 @@ class TestFlowPipe:
                                  output_transforms=[lambda f: f+1])
         assert flow == [np.array([2]), np.array([2])]
 
+    def test_algorithm_preprocessing_is_applied_once_per_frame(self):
+        algorithm = PreprocessingAlgorithm()
+        flow = self.compute_flow([1, 2, 3, 4], flow_algorithm=algorithm, dilation=2)
+        assert flow == [np.array([20]), np.array([20])]
+        assert algorithm.preprocessed_frames == [1, 2, 3, 4]
+
+    def test_2_flow_fields_between_5_frames_when_stride_is_2(self):
+        flow = self.compute_flow([1, 2, 4, 8, 16], stride=2)
+        assert flow == [np.array([1]), np.array([4])]
+
+    def test_no_flow_fields_when_there_are_fewer_frames_than_dilation(self):
+        flow = self.compute_flow([1, 2], dilation=2)
+        assert flow == []
+
+    def test_frames_before_start_are_skipped(self):
+        flow = self.compute_flow([1, 2, 4, 8], start=1)
+        assert flow == [np.array([2]), np.array([4])]
+
+    def test_frames_from_end_are_not_read(self):
+        flow = self.compute_flow([1, 2, 4, 8], end=3)
+        assert flow == [np.array([1]), np.array([2])]
+
+    def test_seekable_sources_are_seeked_to_start(self):
+        class SeekableSource:
+            def __init__(self, frames):
+                self.frames = frames
+                self.pos_frames = 0
+
+            def __iter__(self):
+                return iter(self.frames[int(self.pos_frames):])
+
+        src = SeekableSource([np.array([f]) for f in [1, 2, 4, 8, 16]])
+        dest = RecordingDestination()
+        FlowPipe(src, TestFlowPipe.difference, dest, start=2, end=4,
+                 **self.get_pipe_options(TestFlowPipe.difference)).run()
+        assert src.pos_frames == 2
+        assert dest.flow == [np.array([4])]
+
+    def test_only_used_frames_are_retrieved_from_grabbing_sources(self):
+        src = GrabbingSource([np.array([f]) for f in [1, 2, 4, 8, 16, 32, 64]])
+        dest = RecordingDestination()
+        FlowPipe(src, TestFlowPipe.difference, dest, stride=3,
+                 **self.get_pipe_options(TestFlowPipe.difference)).run()
+        assert dest.flow == [np.array([1]), np.array([8])]
+        assert src.retrieved == [0, 1, 3, 4, 6]
+
+    def test_reference_frame_timestamps_are_recorded_by_dest(self):
+        src = GrabbingSource([np.array([f]) for f in [1, 2, 4, 8, 16, 32, 64]])
+        dest = TimestampRecordingDestination()
+        FlowPipe(src, TestFlowPipe.difference, dest, stride=3,
+                 **self.get_pipe_options(TestFlowPipe.difference)).run()
+        assert dest.flow == [np.array([1]), np.array([8])]
+        assert dest.pos_ms == {1: 0.0, 2: 120.0, 3: 240.0}
+
+    def test_unused_frames_are_not_preprocessed(self):
+        algorithm = PreprocessingAlgorithm()
+        flow = self.compute_flow([1, 2, 3, 4, 5, 6], flow_algorithm=algorithm,
+                                 stride=3, dilation=2)
+        assert flow == [np.array([20]), np.array([20])]
+        assert algorithm.preprocessed_frames == [1, 3, 4, 6]
+
+    def test_frames_in_ring_buffers_are_not_overwritten_while_in_use(self):
+        def jittery_difference(reference, target):
+            time.sleep(random.uniform(0, 0.001))
+            return target - reference
+
+        frames = [i * (i + 1) // 2 for i in range(40)]
+        src = RingBufferSource(frames)
+        dest = RecordingDestination()
+        pipe = FlowPipe(src, jittery_difference, dest, dilation=3, queue_size=2,
+                        **self.get_pipe_options(jittery_difference))
+        pipe.run()
+        assert src.buffer_count == pipe.frame_buffer_count
+        assert dest.flow == [np.array([frames[i] - frames[i - 3]])
+                             for i in range(3, len(frames))]
+
+    def test_end_must_not_precede_start(self):
+        with pytest.raises(ValueError):
+            FlowPipe([], TestFlowPipe.difference, RecordingDestination(),
+                     start=2, end=1)
+
+    def test_dest_is_closed_after_run(self):
+        class ClosingDestination(RecordingDestination):
+            closed = False
+
+            def close(self):
+                self.closed = True
+
+        dest = ClosingDestination()
+        FlowPipe([np.array([f]) for f in [1, 2, 3]], TestFlowPipe.difference, dest,
+                 **self.get_pipe_options(TestFlowPipe.difference)).run()
+        assert dest.closed
+        assert len(dest.flow) == 2
+
+    def test_metrics_record_each_stage(self):
+        class CountingDestination(RecordingDestination):
+            @property
+            def bytes_written(self):
+                return 8 * len(self.flow)
+
+        dest = CountingDestination()
+        metrics = FlowPipeMetrics()
+        FlowPipe([np.array([f]) for f in range(5)], TestFlowPipe.difference, dest,
+                 metrics=metrics,
+                 **self.get_pipe_options(TestFlowPipe.difference)).run()
+
+        snapshot = metrics.snapshot()
+        assert snapshot["flows_written"] == 4
+        for stage in ["read", "compute", "write"]:
+            assert snapshot["stage_latency"][stage]["count"] == 4
+        assert snapshot["bytes_written"] == 32
+        assert "live_mats" in snapshot["memory"]
+        assert "live_mat_bytes" in snapshot["memory"]
+
+    def test_tracer_records_span_per_frame_and_flow_field(self):
+        tracer = Tracer()
+        self.compute_flow([1, 2, 4, 8], tracer=tracer)
+
+        spans = [(name, index) for name, index, *_ in tracer.spans]
+        for name in ["decode", "preprocess"]:
+            assert sorted(index for span_name, index in spans if span_name == name) \
+                   == [0, 1, 2, 3]
+        for name in ["compute", "write"]:
+            assert sorted(index for span_name, index in spans if span_name == name) \
+                   == [0, 1, 2]
+
+    def test_pipe_and_writer_trace_the_same_sampled_flow_fields(self, tmp_path):
+        tracer = Tracer(sample_interval=2)
+        dest = FlowUVImageWriter(str(tmp_path / "{axis}" / "{index:05d}.jpg"))
+        dest.tracer = tracer
+        frames = [np.full((4, 6, 2), i, dtype=np.float32) for i in range(6)]
+
+        FlowPipe(frames, TestFlowPipe.difference, dest, tracer=tracer,
+                 **self.get_pipe_options(TestFlowPipe.difference)).run()
+
+        indices = {}
+        for name, index, *_ in tracer.spans:
+            indices.setdefault(name, []).append(index)
+        # The writer numbers the 5 flow fields from 1, only even ones are sampled.
+        for name in ["compute", "write", "quantise", "encode"]:
+            assert sorted(indices[name]) == [2, 4]
+        # Frames are traced with the flow field they're the reference of, the
+        # last frame would be the reference of flow field 6.
+        for name in ["decode", "preprocess"]:
+            assert sorted(indices[name]) == [2, 4, 6]
+
+    def test_flow_algorithm_errors_are_raised(self):
+        def failing_algorithm(reference, target):
+            raise RuntimeError("failed")
+
+        with pytest.raises(RuntimeError, match="failed"):
+            self.compute_flow([1, 2, 3], flow_algorithm=failing_algorithm)
+
+    def test_dest_errors_are_raised(self):
+        class FailingDestination:
+            def write(self, flow):
+                raise IOError("disk full")
+
+        pipe = FlowPipe([np.array([f]) for f in range(10)], TestFlowPipe.difference,
+                        FailingDestination(), queue_size=2,
+                        **self.get_pipe_options(TestFlowPipe.difference))
+        with pytest.raises(IOError, match="disk full"):
+            pipe.run()
+
     def compute_flow(self, frames, flow_algorithm=difference, dilation=1, stride=1,
-                     input_transforms=None, output_transforms=None):
+                     input_transforms=None, output_transforms=None, **kwargs):
         src = [np.array([f]) for f in frames]
 
         dest = RecordingDestination()
         pipe = FlowPipe(
                 src, flow_algorithm, dest, dilation=dilation, stride=stride,
-                input_transforms=input_transforms, output_transforms=output_transforms
+                input_transforms=input_transforms, output_transforms=output_transforms,
+                **self.get_pipe_options(flow_algorithm), **kwargs
         )
         pipe.run()
         return dest.flow
 
+    def get_pipe_options(self, flow_algorithm):
+        options = dict(self.pipe_options)
+        if options.get("workers", 1) > 1:
+            options["flow_algorithm_factory"] = lambda: flow_algorithm
+        return options
+
+
+class TestFlowPipeMemory:
+    def test_steady_state_run_does_not_grow_memory(self):
+        mat_stats = []
+
+        class SamplingDestination:
+            def write(self, flow):
+                mat_stats.append(get_mat_stats())
+
+        def allocating_algorithm(reference, target):
+            return Mat.fromarray(np.zeros((32, 48, 2), dtype=np.float32), copy=True)
+
+        frames = (Mat.fromarray(np.full((32, 48), i % 256, dtype=np.uint8), copy=True)
+                  for i in range(200))
+        track_live_mat_bytes(True)
+        try:
+            FlowPipe(frames, allocating_algorithm, SamplingDestination(),
+                     output_transforms=[mat_to_array]).run()
+        finally:
+            track_live_mat_bytes(False)
+
+        warm_up, steady_state = mat_stats[:20], mat_stats[20:]
+        for key in ["live_mats", "live_mat_bytes", "live_buffer_exports"]:
+            assert max(stats[key] for stats in steady_state) \
+                   <= max(stats[key] for stats in warm_up)
+
+
+class TestPipelinedFlowPipe(TestFlowPipe):
+    pipe_options = {"pipelined": True}
+
+    def test_flow_is_written_in_frame_order(self):
+        def jittery_difference(reference, target):
+            time.sleep(random.uniform(0, 0.002))
+            return target - reference
+
+        # Consecutive frame differences are 1, 2, 3, ...
+        frames = [i * (i + 1) // 2 for i in range(50)]
+        flow = self.compute_flow(frames, flow_algorithm=jittery_difference,
+                                 queue_size=3)
+        assert flow == [np.array([i]) for i in range(1, len(frames))]
+
+    def test_queue_size_must_be_positive(self):
+        with pytest.raises(ValueError):
+            FlowPipe([], TestFlowPipe.difference, RecordingDestination(),
+                     pipelined=True, queue_size=0)
+
+
+class TestFlowPipeWithWorkers(TestPipelinedFlowPipe):
+    pipe_options = {"workers": 3}
 
+    def test_each_worker_uses_its_own_flow_algorithm(self):
+        class ThreadRecordingAlgorithm:
+            def __init__(self):
+                self.thread_ids = set()
+
+            def __call__(self, reference, target):
+                self.thread_ids.add(threading.get_ident())
+                time.sleep(0.001)
+                return target - reference
+
+        algorithms = [ThreadRecordingAlgorithm()]
+
+        def create_algorithm():
+            algorithms.append(ThreadRecordingAlgorithm())
+            return algorithms[-1]
+
+        pipe = FlowPipe([np.array([f]) for f in range(30)], algorithms[0],
+                        RecordingDestination(), workers=3,
+                        flow_algorithm_factory=create_algorithm)
+        pipe.run()
+
+        assert len(algorithms) <= 3
+        for algorithm in algorithms:
+            assert len(algorithm.thread_ids) <= 1
+
+    def test_runs_reuse_the_flow_algorithms_of_earlier_runs(self):
+        algorithm_count = 0
+
+        def create_algorithm():
+            nonlocal algorithm_count
+            algorithm_count += 1
+            return TestFlowPipe.difference
+
+        pipe = FlowPipe([np.array([f]) for f in range(30)], TestFlowPipe.difference,
+                        RecordingDestination(), workers=3,
+                        flow_algorithm_factory=create_algorithm)
+        for _ in range(3):
+            pipe.run()
+
+        # Worker threads start lazily, so a run may add instances an earlier run
+        # didn't need, but never more than one per worker in total.
+        assert algorithm_count <= 2
+
+    def test_flow_algorithm_factory_is_required(self):
+        with pytest.raises(ValueError):
+            FlowPipe([], TestFlowPipe.difference, RecordingDestination(), workers=2)
+
+
+class WarmStartAlgorithm:
+    """Returns the target frame, offset by 100 + the initial flow it was passed."""
+    def __init__(self):
+        self.initial_flows = []
+
+    def __call__(self, reference, target, initial_flow):
+        self.initial_flows.append(initial_flow)
+        return target + 100 + initial_flow
+
+
+class TestWarmStartedFlowPipe:
+    @pytest.mark.parametrize("pipelined", [False, True])
+    def test_pairs_after_the_first_are_initialised_with_the_previous_flow(self, pipelined):
+        warm_algorithm = WarmStartAlgorithm()
+        dest = RecordingDestination()
+        FlowPipe([np.array([f]) for f in [1, 2, 3, 4]], TestFlowPipe.difference, dest,
+                 pipelined=pipelined, warm_flow_algorithm=warm_algorithm).run()
+        assert dest.flow == [np.array([1]), np.array([104]), np.array([208])]
+        assert warm_algorithm.initial_flows == [np.array([1]), np.array([104])]
+
+    @pytest.mark.parametrize("pipelined", [False, True])
+    def test_each_run_starts_cold(self, pipelined):
+        warm_algorithm = WarmStartAlgorithm()
+        dest = RecordingDestination()
+        pipe = FlowPipe([np.array([f]) for f in [1, 2, 3]], TestFlowPipe.difference,
+                        dest, pipelined=pipelined, warm_flow_algorithm=warm_algorithm)
+        pipe.run()
+        pipe.run()
+        assert len(warm_algorithm.initial_flows) == 2
+        assert dest.flow == [np.array([1]), np.array([104])] * 2
 
+    @pytest.mark.parametrize("options", [{"stride": 2}, {"dilation": 2}, {"workers": 2}])
+    def test_warm_start_requires_consecutive_pairs_computed_in_order(self, options):
+        with pytest.raises(ValueError):
+            FlowPipe([], TestFlowPipe.difference, RecordingDestination(),
+                     warm_flow_algorithm=WarmStartAlgorithm(),
+                     flow_algorithm_factory=lambda: TestFlowPipe.difference,
+                     **options)
@@ -1,9 +1,16 @@
+import os
+import subprocess
 import sys
 from io import StringIO
 
-from unittest.mock import Mock
+import pytest
 
-from flowty.flowty import main, command_parsers
+from flowty.flowty import COMMANDS, main, parse_args
+
+# Maximum seconds to import flowty and build its argument parser, excluding
+# interpreter startup. Importing an OpenCV extension or initialising CUDA
+# takes far longer than this.
+IMPORT_TIME_BUDGET = 0.5
 
 
 class IOCapture:
@@ -31,17 +38,90 @@ class IOCapture:
         return self._stderr.getvalue()
 
 
+class RecordingCommand:
+    instances = []
+
+    def __init__(self, args):
+        self.args = args
+        self.ran = False
+        RecordingCommand.instances.append(self)
+
+    def main(self):
+        self.ran = True
+
+    @staticmethod
+    def register_command(command_parsers):
+        parser = command_parsers.add_parser("record")
+        parser.add_argument("--value", type=int)
+        parser.set_defaults(command=RecordingCommand)
+
+
+def run_python(code: str) -> str:
+    # Run code with this interpreter's module search path and the pyximport
+    # hook set up by tests/__init__.py so flowty imports as it does in the tests.
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    code = "import pyximport; pyximport.install()\n" + code
+    return subprocess.run([sys.executable, "-c", code], check=True, env=env,
+                          stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+
+def skip_without_extensions():
+    # Parsing a flow command's arguments imports its OpenCV extension.
+    try:
+        import flowty.cv.optflow  # noqa: F401
+    except ImportError:
+        pytest.skip("flowty.cv extensions aren't built")
+
+
 class TestFlowtyCli:
     def test_prints_help_when_no_command_is_provided(self):
         with IOCapture() as capture:
             main([])
             assert 'usage: flowty' in capture.stdout
 
-    def test_invokes_registered_command(self):
-        tvl1_parser = command_parsers.add_parser('tvl1')
-        tvl1_command = Mock()
-        tvl1_parser.set_defaults(command=tvl1_command)
+    def test_invokes_registered_command(self, monkeypatch):
+        monkeypatch.setitem(COMMANDS, "record", (__name__, "RecordingCommand", ""))
+
+        main(['record', '--value', '3'])
+
+        command = RecordingCommand.instances[-1]
+        assert command.args.value == 3
+        assert command.ran
+
+    def test_only_chosen_command_module_is_imported(self):
+        skip_without_extensions()
+        modules = run_python(
+                "import sys\n"
+                "from flowty.flowty import parse_args\n"
+                "parse_args(['dis', 'video.mp4', 'flow.npy'])\n"
+                "print(' '.join(sys.modules))\n"
+        ).split()
+
+        assert "flowty.algorithms.dis" in modules
+        assert "flowty.algorithms.tvl1" not in modules
+        assert "flowty.cv.cuda" not in modules
+        assert "flowty.cv.cuda_optflow" not in modules
 
-        main(['tvl1'])
+    def test_help_is_within_import_time_budget(self):
+        output = run_python(
+                "import sys, time\n"
+                "t = time.perf_counter()\n"
+                "from flowty.flowty import create_parser\n"
+                "create_parser().format_help()\n"
+                "print(time.perf_counter() - t)\n"
+                "print(' '.join(sys.modules))\n"
+        ).split("\n")
+
+        assert float(output[0]) < IMPORT_TIME_BUDGET
+        assert "flowty.cv" not in output[1].split()
+
+    def test_every_command_is_listed_without_being_registered(self):
+        with IOCapture() as capture:
+            main([])
+        for name in COMMANDS:
+            assert name in capture.stdout
 
-        tvl1_command.assert_called_once()
\ No newline at end of file
+    def test_command_options_are_parsed(self):
+        skip_without_extensions()
+        args = parse_args(["dis", "video.mp4", "flow.npy", "--preset", "medium"])
+        assert args.preset == "medium"
@@ -1,7 +1,7 @@
 import numpy as np
 from numpy.testing import assert_array_equal
 
-from flowty.imgproc import quantise_flow
+from flowty.imgproc import dequantise_flow, quantise_flow
 
 
 class TestQuantiseFlow:
@@ -42,3 +42,18 @@ class TestQuantiseFlow:
         quantised_flow = quantise_flow(flow, bound=20)
         assert_array_equal(np.array([(255 / 4)], dtype=np.uint8), quantised_flow)
 
+
+
+class TestDequantiseFlow:
+    def test_bounds_are_recovered(self):
+        quantised_flow = np.array([0, 255], dtype=np.uint8)
+        flow = dequantise_flow(quantised_flow, bound=20)
+        assert_array_equal(np.array([-20, 20], dtype=np.float32), flow)
+
+    def test_dequantised_flow_is_within_a_quantisation_step(self):
+        bound = 20
+        flow = np.random.uniform(low=-bound, high=bound, size=(10, 10, 2))
+        dequantised_flow = dequantise_flow(quantise_flow(flow.copy(), bound=bound),
+                                           bound=bound)
+        assert dequantised_flow.dtype == np.float32
+        assert np.abs(dequantised_flow - flow).max() <= 2 * bound / 255
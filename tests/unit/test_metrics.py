@@ -0,0 +1,140 @@
+import json
+import time
+
+import pytest
+
+from flowty.metrics import FlowPipeMetrics, Histogram, MetricsExporter
+
+
+class TestHistogram:
+    def test_values_are_counted_in_first_bucket_they_fit(self):
+        histogram = Histogram(buckets=[1, 2, 4])
+        for value in [0.5, 1, 3, 10]:
+            histogram.observe(value)
+
+        assert histogram.bucket_counts == [2, 0, 1, 1]
+        assert histogram.cumulative_counts() == [2, 2, 3, 4]
+        assert histogram.count == 4
+        assert histogram.sum == 14.5
+
+    def test_quantile_interpolates_within_bucket(self):
+        histogram = Histogram(buckets=[10, 20])
+        for value in [12, 14, 16, 18]:
+            histogram.observe(value)
+
+        assert histogram.quantile(0.5) == pytest.approx(15)
+
+    def test_quantile_of_values_beyond_last_bucket_is_bounded_by_max(self):
+        histogram = Histogram(buckets=[1])
+        histogram.observe(5)
+
+        assert histogram.quantile(0.99) <= 5
+
+    def test_summary_of_empty_histogram_only_has_count(self):
+        assert Histogram().summary() == {"count": 0}
+
+
+class TestFlowPipeMetrics:
+    def test_snapshot_summarises_stages(self):
+        metrics = FlowPipeMetrics(labels={"video": "a.mp4"})
+        metrics.observe("compute", 0.02)
+        metrics.observe("write", 0.001)
+        metrics.set_queue_depth("flow", 3)
+        metrics.set_bytes_written(100)
+
+        snapshot = metrics.snapshot()
+
+        assert snapshot["labels"] == {"video": "a.mp4"}
+        assert snapshot["flows_written"] == 1
+        assert snapshot["stage_latency"]["compute"]["count"] == 1
+        assert snapshot["stage_latency"]["read"] == {"count": 0}
+        assert snapshot["queue_depth"] == {"flow": 3}
+        assert snapshot["bytes_written"] == 100
+        assert not snapshot["finished"]
+
+    def test_mat_allocation_rate_is_relative_to_first_update(self):
+        metrics = FlowPipeMetrics()
+        metrics.update_memory(mat_allocations=1000, live_mats=3)
+        metrics.update_memory(mat_allocations=1010, live_mats=4)
+        metrics.start_time -= 2
+        metrics.finish()
+
+        snapshot = metrics.snapshot()
+
+        assert snapshot["memory"] == {"mat_allocations": 1010, "live_mats": 4}
+        assert snapshot["mat_allocations_per_second"] == pytest.approx(5, rel=0.1)
+
+    def test_prometheus_includes_memory_metrics(self):
+        metrics = FlowPipeMetrics()
+        metrics.update_memory(live_mat_bytes=2048, mat_allocations=7)
+
+        text = metrics.to_prometheus()
+
+        assert "# TYPE flowty_live_mat_bytes gauge\nflowty_live_mat_bytes 2048\n" in text
+        assert "flowty_mat_allocations_total 7\n" in text
+
+    def test_prometheus_histograms_are_cumulative_and_labelled(self):
+        metrics = FlowPipeMetrics(labels={"video": 'a "b".mp4'})
+        metrics.observe("compute", 0.02)
+        metrics.observe("compute", 20)
+
+        text = metrics.to_prometheus()
+
+        assert 'flowty_stage_latency_seconds_bucket{video="a \\"b\\".mp4",' \
+               'stage="compute",le="0.025"} 1\n' in text
+        assert 'stage="compute",le="+Inf"} 2\n' in text
+        assert 'flowty_stage_latency_seconds_count{video="a \\"b\\".mp4",' \
+               'stage="compute"} 2\n' in text
+
+
+class TestMetricsExporter:
+    def test_close_writes_metrics_and_summary(self, tmp_path):
+        metrics = FlowPipeMetrics()
+        metrics.observe("write", 0.001)
+        exporter = MetricsExporter(
+                metrics,
+                json_path=tmp_path / "metrics.json",
+                prometheus_path=tmp_path / "metrics.prom",
+                summary_path=tmp_path / "summary.json",
+                summary_info={"video": "a.mp4"},
+        )
+
+        with exporter:
+            pass
+
+        assert json.loads((tmp_path / "metrics.json").read_text())["finished"]
+        assert "flowty_flows_written_total 1\n" in (tmp_path / "metrics.prom").read_text()
+        summary = json.loads((tmp_path / "summary.json").read_text())
+        assert summary["video"] == "a.mp4"
+        assert summary["flows_written"] == 1
+        assert not list(tmp_path.glob(".*.tmp"))
+
+    def test_metrics_are_exported_periodically(self, tmp_path):
+        metrics = FlowPipeMetrics()
+        exporter = MetricsExporter(metrics, json_path=tmp_path / "metrics.json",
+                                   interval=0.01)
+        with exporter:
+            metrics.observe("write", 0.001)
+            for _ in range(100):
+                path = tmp_path / "metrics.json"
+                if path.exists() and json.loads(path.read_text())["flows_written"]:
+                    break
+                time.sleep(0.01)
+            else:
+                pytest.fail("Metrics were not exported before closing")
+
+    def test_collectors_update_metrics_before_each_export(self, tmp_path):
+        metrics = FlowPipeMetrics()
+        live_mats = iter(range(10))
+        metrics.add_collector(lambda: metrics.update_memory(live_mats=next(live_mats)))
+        exporter = MetricsExporter(metrics, json_path=tmp_path / "metrics.json")
+
+        exporter.export()
+        exporter.export()
+
+        assert json.loads((tmp_path / "metrics.json").read_text())["memory"] == \
+               {"live_mats": 1}
+
+    def test_interval_must_be_positive(self):
+        with pytest.raises(ValueError):
+            MetricsExporter(FlowPipeMetrics(), interval=0)
@@ -0,0 +1,151 @@
+import argparse
+
+import numpy as np
+import pytest
+
+from flowty.flow_pipe import FlowPipe
+from flowty.segments import Segment, frame_range, plan_segments, resume_segment
+
+
+class IndexedRecordingDestination:
+    def __init__(self):
+        self.frame_index = 1
+        self.flow = {}
+
+    def exists(self, index):
+        return index in self.flow
+
+    def write(self, flow):
+        self.flow[self.frame_index] = flow
+        self.frame_index += 1
+
+
+def difference(reference, target):
+    return target - reference
+
+
+def compute_indexed_flow(frames, segment=None, stride=1, dilation=1, dest=None):
+    if dest is None:
+        dest = IndexedRecordingDestination()
+    start, end = 0, None
+    if segment is not None:
+        start, end = segment.start, segment.end
+        dest.frame_index = segment.first_index
+    FlowPipe([np.array([f]) for f in frames], difference, dest,
+             stride=stride, dilation=dilation, start=start, end=end).run()
+    return dest.flow
+
+
+class TestPlanSegments:
+    def test_single_segment_covers_whole_video(self):
+        assert plan_segments(10, 1) == [Segment(0, None, 1)]
+
+    def test_segments_overlap_by_dilation(self):
+        assert plan_segments(9, 2, dilation=2) == [
+            Segment(0, 5, 1),
+            Segment(3, None, 4),
+        ]
+
+    def test_segment_count_is_limited_by_pair_count(self):
+        assert len(plan_segments(3, 10)) == 2
+
+    def test_single_segment_when_frame_count_is_unknown(self):
+        assert plan_segments(0, 4) == [Segment(0, None, 1)]
+
+    def test_segments_are_offset_by_start(self):
+        assert plan_segments(100, 2, start=50, end=61) == [
+            Segment(50, 56, 1),
+            Segment(55, 61, 6),
+        ]
+
+    def test_segment_count_must_be_positive(self):
+        with pytest.raises(ValueError):
+            plan_segments(10, 0)
+
+    @pytest.mark.parametrize("frame_count", [2, 7, 20, 23])
+    @pytest.mark.parametrize("segment_count", [1, 2, 3, 8])
+    @pytest.mark.parametrize("stride", [1, 2, 3])
+    @pytest.mark.parametrize("dilation", [1, 2, 5])
+    def test_segmented_flow_is_identical_to_serial_flow(
+            self, frame_count, segment_count, stride, dilation):
+        frames = [i ** 2 for i in range(frame_count)]
+        expected_flow = compute_indexed_flow(frames, stride=stride, dilation=dilation)
+
+        segmented_flow = {}
+        for segment in plan_segments(frame_count, segment_count,
+                                     stride=stride, dilation=dilation):
+            segment_flow = compute_indexed_flow(frames, segment,
+                                                stride=stride, dilation=dilation)
+            assert segmented_flow.keys().isdisjoint(segment_flow.keys())
+            segmented_flow.update(segment_flow)
+
+        assert segmented_flow == expected_flow
+
+
+class TestResumeSegment:
+    def test_resumes_from_last_written_index(self):
+        segment = resume_segment(Segment(0, None, 1), lambda index: index <= 5)
+        assert segment == Segment(4, None, 5)
+
+    def test_start_accounts_for_stride(self):
+        segment = resume_segment(Segment(0, None, 1), lambda index: index <= 5,
+                                 stride=3, dilation=2)
+        assert segment == Segment(12, None, 5)
+
+    def test_resumes_from_segment_start_when_nothing_is_written(self):
+        segment = resume_segment(Segment(10, 21, 6), lambda index: False)
+        assert segment == Segment(10, 21, 6)
+
+    def test_only_searches_within_segment(self):
+        segment = resume_segment(Segment(10, 21, 11), lambda index: True)
+        assert segment == Segment(19, 21, 20)
+
+    @pytest.mark.parametrize("written_count", [0, 1, 4, 9])
+    @pytest.mark.parametrize("stride", [1, 2])
+    @pytest.mark.parametrize("dilation", [1, 3])
+    def test_resumed_flow_is_identical_to_uninterrupted_flow(
+            self, written_count, stride, dilation):
+        frames = [i ** 2 for i in range(20)]
+        expected_flow = compute_indexed_flow(frames, stride=stride, dilation=dilation)
+
+        dest = IndexedRecordingDestination()
+        dest.flow = {index: flow for index, flow in expected_flow.items()
+                     if index <= written_count}
+        segment = resume_segment(Segment(0, None, 1), dest.exists,
+                                 stride=stride, dilation=dilation)
+        resumed_flow = compute_indexed_flow(frames, segment, stride=stride,
+                                            dilation=dilation, dest=dest)
+
+        assert resumed_flow == expected_flow
+
+
+class TestFrameRange:
+    class Source:
+        fps = 25
+
+    def test_defaults_to_whole_video(self):
+        assert frame_range(self.create_args(), self.Source()) == (0, None)
+
+    def test_frames_are_used_as_is(self):
+        args = self.create_args(start_frame=10, end_frame=20)
+        assert frame_range(args, self.Source()) == (10, 20)
+
+    def test_times_are_converted_to_frames(self):
+        args = self.create_args(start_time=2, end_time=3.5)
+        assert frame_range(args, self.Source()) == (50, 88)
+
+    def test_end_must_not_precede_start(self):
+        with pytest.raises(ValueError):
+            frame_range(self.create_args(start_frame=10, end_frame=5), self.Source())
+
+    def test_times_require_frame_rate(self):
+        source = self.Source()
+        source.fps = 0
+        with pytest.raises(ValueError):
+            frame_range(self.create_args(start_time=2), source)
+
+    def create_args(self, **kwargs):
+        options = dict(start_frame=None, end_frame=None, start_time=None,
+                       end_time=None, src="video.mp4")
+        options.update(kwargs)
+        return argparse.Namespace(**options)
@@ -0,0 +1,75 @@
+import json
+import threading
+
+import pytest
+
+from flowty.trace import NULL_TRACER, Tracer, traced_frames
+
+
+class TestTracer:
+    def test_spans_are_written_as_complete_events(self, tmp_path):
+        tracer = Tracer()
+        with tracer.span("compute", 3, frame=7):
+            pass
+        tracer.write(tmp_path / "trace.json")
+
+        trace = json.loads((tmp_path / "trace.json").read_text())
+        events = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        assert len(events) == 1
+        assert events[0]["name"] == "compute"
+        assert events[0]["args"] == {"index": 3, "frame": 7}
+        assert events[0]["tid"] == threading.get_ident()
+        assert events[0]["dur"] >= 0
+
+    def test_threads_are_named(self):
+        tracer = Tracer()
+
+        def work():
+            with tracer.span("write", 0):
+                pass
+
+        thread = threading.Thread(target=work, name="writer")
+        thread.start()
+        thread.join()
+
+        names = [event["args"]["name"] for event in tracer.events()
+                 if event["ph"] == "M"]
+        assert names == ["writer"]
+
+    def test_only_sampled_indices_are_recorded(self):
+        tracer = Tracer(sample_interval=3)
+        for index in range(7):
+            with tracer.span("decode", index):
+                pass
+
+        assert [span[1] for span in tracer.spans] == [0, 3, 6]
+
+    def test_sample_interval_must_be_positive(self):
+        with pytest.raises(ValueError):
+            Tracer(sample_interval=0)
+
+    def test_null_tracer_records_nothing(self):
+        with NULL_TRACER.span("decode", 0):
+            pass
+        assert not NULL_TRACER.enabled
+
+
+class TestTracedFrames:
+    def test_frames_are_yielded_with_a_span_each(self):
+        tracer = Tracer()
+        frames = list(traced_frames(tracer, "decode", ["a", "b"],
+                                    flow_index=lambda frame: frame + 1, first_frame=5))
+
+        assert frames == ["a", "b"]
+        assert [(span[0], span[1], span[-1]) for span in tracer.spans] == [
+            ("decode", 6, {"frame": 5}), ("decode", 7, {"frame": 6}),
+        ]
+
+    def test_frames_without_a_sampled_flow_field_are_not_recorded(self):
+        tracer = Tracer(sample_interval=2)
+        frames = list(traced_frames(
+                tracer, "decode", ["a", "b", "c", "d"],
+                flow_index=lambda frame: None if frame == 2 else frame))
+
+        assert frames == ["a", "b", "c", "d"]
+        assert [span[1] for span in tracer.spans] == [0]